@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+import argparse
+import csv
+import os
+import struct
+
+import numpy as np
+
+
+# 固定長バイナリレコード形式（trades / l2book / mids / open_interest）
+#
+# CSV は1行ごとに ISO 文字列の時刻と10進文字列を持つので、データ量の5〜10倍のバイト数になる。
+# こちらは1レコードを固定長のリトルエンディアンで追記し、読み出し時は np.memmap で
+# 構造化配列としてそのまま参照する（パースしない）。
+#
+# ファイル構成: 64バイトのヘッダー（マジック・種類・銘柄・レコード長）+ レコードの連続
+# l2book の段数はレコード長から決まる（デフォルトは5段。コレクターの --book-view で変えられる）
+# ts はコレクターの CSV の timestamp 列と同じ時刻（ローカル時刻の datetime64[ns] を int64 にしたもの）。
+# クラッシュで最後のレコードが途中までしか書かれていない場合、読み出し時はその端数を無視する。
+#
+# 使用例:
+#     records = open_records("data/trades_20240501_120000.bin")
+#     records["px"].mean(), records["ts"].view("datetime64[ns]")
+#
+#     python binary_records.py to-csv data/trades_20240501_120000.bin
+#     python binary_records.py from-csv data/trades_20240501_120000.csv --coin BTC
+
+MAGIC = b"HLREC\x00\x01\x00"
+HEADER = struct.Struct("<8s16s16sI20x")  # マジック, 種類, 銘柄, レコード長（計64バイト）
+HEADER_SIZE = HEADER.size
+BOOK_LEVELS = 5
+
+# side の列挙値
+SIDE_UNKNOWN = 0
+SIDE_BID = 1  # "B"（買い）
+SIDE_ASK = 2  # "A"（売り）
+SIDE_CODES = {"B": SIDE_BID, "A": SIDE_ASK}
+SIDE_NAMES = {SIDE_BID: "B", SIDE_ASK: "A", SIDE_UNKNOWN: "unknown"}
+
+
+
+def book_dtype(levels=BOOK_LEVELS):
+    """levels 段の l2book レコード"""
+    return np.dtype([
+        ("ts", "<i8"), ("time", "<i8"),
+        ("bid_px", "<f8", (levels,)), ("bid_sz", "<f8", (levels,)),
+        ("ask_px", "<f8", (levels,)), ("ask_sz", "<f8", (levels,)),
+    ])
+
+
+def book_columns(levels=BOOK_LEVELS):
+    """levels 段の l2book の CSV の列"""
+    return (
+        ["timestamp"] +
+        [f"bid_px_{i}" for i in range(1, levels + 1)] +
+        [f"bid_sz_{i}" for i in range(1, levels + 1)] +
+        [f"ask_px_{i}" for i in range(1, levels + 1)] +
+        [f"ask_sz_{i}" for i in range(1, levels + 1)]
+    )
+
+
+DTYPES = {
+    "trades": np.dtype([
+        ("ts", "<i8"), ("time", "<i8"), ("px", "<f8"), ("sz", "<f8"), ("tid", "<i8"), ("side", "u1"),
+    ]),
+    "l2book": book_dtype(),
+    "mids": np.dtype([("ts", "<i8"), ("mid", "<f8")]),
+    "open_interest": np.dtype([("ts", "<i8"), ("open_interest", "<f8"), ("mark_price", "<f8")]),
+}
+
+# 書き込み用（DTYPES と同じレイアウト）
+_STRUCTS = {
+    "trades": struct.Struct("<qqddqB"),
+    "l2book": struct.Struct("<qq" + "d" * (BOOK_LEVELS * 4)),
+    "mids": struct.Struct("<qd"),
+    "open_interest": struct.Struct("<qdd"),
+}
+for _kind, _dtype in DTYPES.items():
+    assert _STRUCTS[_kind].size == _dtype.itemsize, _kind
+
+# CSV の列（コレクターが書き出すものと同じ）
+CSV_COLUMNS = {
+    "trades": ["timestamp", "coin", "side", "price", "size", "time", "tid"],
+    "l2book": book_columns(),
+    "mids": ["timestamp", "coin", "mid"],
+    "open_interest": ["timestamp", "coin", "open_interest", "mark_price"],
+}
+
+
+def book_levels_from_size(record_size):
+    """l2book のレコード長から段数を求める"""
+    return (record_size - 16) // 32
+
+
+def _dtype_for(header):
+    if header["kind"] == "l2book":
+        return book_dtype(book_levels_from_size(header["record_size"]))
+    return DTYPES[header["kind"]]
+
+
+def timestamp_to_ns(timestamp):
+    """ISO 形式の時刻文字列（コレクターの timestamp 列）を int64 ナノ秒にする"""
+    return int(np.datetime64(timestamp, "ns").astype(np.int64))
+
+
+def ns_to_timestamps(ts):
+    """int64 ナノ秒の配列を ISO 形式の文字列の配列にする"""
+    return np.datetime_as_string(np.asarray(ts, dtype=np.int64).view("datetime64[ns]").astype("datetime64[us]"))
+
+
+def _encode(text, size=16):
+    data = text.encode("utf-8")
+    if len(data) > size:
+        raise ValueError(f"{size}バイトを超える名前は保存できません: {text}")
+    return data
+
+
+def read_header(path):
+    """
+    ヘッダーを読む
+    Returns:
+        dict: {"kind": 種類, "coin": 銘柄, "record_size": レコード長}
+    """
+    with open(path, "rb") as f:
+        data = f.read(HEADER_SIZE)
+    if len(data) < HEADER_SIZE:
+        raise ValueError(f"ヘッダーが不完全です: {path}")
+    magic, kind, coin, record_size = HEADER.unpack(data)
+    if magic != MAGIC:
+        raise ValueError(f"バイナリレコードファイルではありません: {path}")
+    return {
+        "kind": kind.rstrip(b"\x00").decode(),
+        "coin": coin.rstrip(b"\x00").decode(),
+        "record_size": record_size,
+    }
+
+
+class RecordWriter:
+    """
+    固定長レコードの追記
+    Args:
+        path (str): 出力ファイル（既存のファイルなら末尾に追記する）
+        kind (str): "trades" / "l2book" / "mids" / "open_interest"
+        coin (str): 銘柄
+        levels (int): l2book の段数
+    """
+
+    def __init__(self, path, kind, coin, levels=BOOK_LEVELS):
+        self.path = path
+        self.kind = kind
+        self.coin = coin
+        if kind == "l2book":
+            self.dtype = book_dtype(levels)
+            self._pack = struct.Struct("<qq" + "d" * (levels * 4)).pack
+        else:
+            self.dtype = DTYPES[kind]
+            self._pack = _STRUCTS[kind].pack
+        exists = os.path.exists(path) and os.path.getsize(path) >= HEADER_SIZE
+        if exists:
+            header = read_header(path)
+            if header["kind"] != kind or header["record_size"] != self.dtype.itemsize:
+                raise ValueError(f"既存ファイルの形式が一致しません: {path} {header}")
+        self.file = open(path, "ab")
+        if not exists:
+            self.file.truncate(0)
+            self.file.write(HEADER.pack(MAGIC, _encode(kind), _encode(coin), self.dtype.itemsize))
+            self.file.flush()
+        else:
+            # 途中で切れたレコードがあれば、その先頭から書き直す
+            size = os.path.getsize(path)
+            remainder = (size - HEADER_SIZE) % self.dtype.itemsize
+            if remainder:
+                self.file.truncate(size - remainder)
+
+    def append(self, *values):
+        """1レコード追記する（値の順番は DTYPES の列の順。配列の列は展開して渡す）"""
+        self.file.write(self._pack(*values))
+
+    def append_array(self, records):
+        """構造化配列をまとめて追記する"""
+        self.file.write(np.ascontiguousarray(records, dtype=self.dtype).tobytes())
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_records(path, mode="r"):
+    """
+    ファイルを構造化配列として mmap する（コピーもパースもしない）
+    Args:
+        path (str): バイナリレコードファイル
+        mode (str): np.memmap のモード（"r" は読み取り専用）
+    Returns:
+        np.memmap: 構造化配列（レコードがなければ長さ0の配列）
+    """
+    header = read_header(path)
+    dtype = _dtype_for(header)
+    count = (os.path.getsize(path) - HEADER_SIZE) // dtype.itemsize
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode=mode, offset=HEADER_SIZE, shape=(count,))
+
+
+def _check_output(path, overwrite):
+    if os.path.exists(path) and not overwrite:
+        raise FileExistsError(f"出力先が既に存在します（上書きする場合は overwrite=True）: {path}")
+
+
+def read_csv_records(csv_path, kind=None):
+    """
+    コレクターの CSV（.zst / .lz4 で圧縮したものも可）を構造化配列として読む。
+    クラッシュで途中までしか書かれていない行や、途中に書き直されたヘッダー行は読み飛ばす
+    Args:
+        csv_path (str): 入力 CSV
+        kind (str): 種類（省略時はファイル名の接頭辞から判定）
+    Returns:
+        tuple: (構造化配列, coin 列の最初の値（coin 列がない l2book は None）)
+    """
+    import io
+    import pandas as pd
+    from compression import codec_from_path, iter_decompressed
+
+    kind = kind or kind_from_filename(csv_path)
+    source = csv_path
+    if codec_from_path(csv_path):
+        source = io.BytesIO(b"".join(iter_decompressed(csv_path)))
+    df = pd.read_csv(source, dtype={"timestamp": str, "coin": str, "side": str}, on_bad_lines="skip")
+    coin = str(df["coin"].iloc[0]) if "coin" in df.columns and not df.empty else None
+
+    ts = pd.to_datetime(df["timestamp"], format="ISO8601", errors="coerce")
+    # 数値の列は read_csv が変換する（壊れた行があって文字列のままになった列だけ変換し直す）
+    numeric = {column: df[column] if df[column].dtype.kind in "iuf" else pd.to_numeric(df[column], errors="coerce")
+               for column in df.columns if column not in ("timestamp", "coin", "side")}
+    valid = ts.notna().to_numpy().copy()
+    for values in numeric.values():
+        valid &= values.notna().to_numpy()
+
+    levels = sum(1 for column in df.columns if column.startswith("bid_px_")) or BOOK_LEVELS
+    records = np.zeros(int(valid.sum()), dtype=book_dtype(levels) if kind == "l2book" else DTYPES[kind])
+    records["ts"] = ts[valid].to_numpy("datetime64[ns]").astype(np.int64)
+    if kind == "trades":
+        records["time"] = numeric["time"][valid].to_numpy(np.int64)
+        records["px"] = numeric["price"][valid].to_numpy(np.float64)
+        records["sz"] = numeric["size"][valid].to_numpy(np.float64)
+        records["tid"] = numeric["tid"][valid].to_numpy(np.int64)
+        records["side"] = df["side"][valid].map(SIDE_CODES).fillna(SIDE_UNKNOWN).to_numpy(np.uint8)
+    elif kind == "l2book":
+        for field in ("bid_px", "bid_sz", "ask_px", "ask_sz"):
+            columns = [numeric[f"{field}_{i}"][valid].to_numpy(np.float64) for i in range(1, levels + 1)]
+            records[field] = np.column_stack(columns)
+    elif kind == "mids":
+        records["mid"] = numeric["mid"][valid].to_numpy(np.float64)
+    else:
+        records["open_interest"] = numeric["open_interest"][valid].to_numpy(np.float64)
+        records["mark_price"] = numeric["mark_price"][valid].to_numpy(np.float64)
+    return records, coin
+
+
+def csv_to_records(csv_path, out_path=None, kind=None, coin=None, overwrite=False):
+    """
+    コレクターの CSV をバイナリレコードに変換する
+    Args:
+        csv_path (str): 入力 CSV
+        out_path (str): 出力先（省略時は拡張子を .bin にしたもの）
+        kind (str): 種類（省略時はファイル名の接頭辞から判定）
+        coin (str): 銘柄（省略時は coin 列の最初の値。l2book では必須）
+        overwrite (bool): 出力先が既にあれば上書きする
+    Returns:
+        str: 出力先
+    """
+    kind = kind or kind_from_filename(csv_path)
+    out_path = out_path or os.path.splitext(csv_path)[0] + ".bin"
+    _check_output(out_path, overwrite)
+    records, csv_coin = read_csv_records(csv_path, kind)
+    coin = coin or csv_coin
+    if coin is None:
+        raise ValueError(f"銘柄を指定してください: {csv_path}")
+
+    if os.path.exists(out_path):
+        os.remove(out_path)
+    levels = records.dtype["bid_px"].shape[0] if kind == "l2book" else BOOK_LEVELS
+    with RecordWriter(out_path, kind, coin, levels) as writer:
+        writer.append_array(records)
+    return out_path
+
+
+def records_to_csv(path, csv_path=None, overwrite=False):
+    """
+    バイナリレコードをコレクターと同じ列の CSV に変換する
+    Args:
+        path (str): バイナリレコードファイル
+        csv_path (str): 出力先（省略時は拡張子を .csv にしたもの）
+        overwrite (bool): 出力先が既にあれば上書きする（"both" で収集した CSV を消さないよう既定では上書きしない）
+    Returns:
+        str: 出力先
+    """
+    header = read_header(path)
+    kind, coin = header["kind"], header["coin"]
+    csv_path = csv_path or os.path.splitext(path)[0] + ".csv"
+    _check_output(csv_path, overwrite)
+    records = open_records(path)
+    timestamps = ns_to_timestamps(records["ts"])
+
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        if kind == "l2book":
+            writer.writerow(book_columns(records.dtype["bid_px"].shape[0]))
+        else:
+            writer.writerow(CSV_COLUMNS[kind])
+        if kind == "trades":
+            sides = [SIDE_NAMES.get(code, "unknown") for code in records["side"].tolist()]
+            writer.writerows(zip(timestamps, [coin] * len(records), sides, records["px"].tolist(),
+                                 records["sz"].tolist(), records["time"].tolist(), records["tid"].tolist()))
+        elif kind == "l2book":
+            levels = np.concatenate([records[field] for field in ("bid_px", "bid_sz", "ask_px", "ask_sz")], axis=1)
+            writer.writerows([timestamp] + row for timestamp, row in zip(timestamps, levels.tolist()))
+        elif kind == "mids":
+            writer.writerows(zip(timestamps, [coin] * len(records), records["mid"].tolist()))
+        else:
+            writer.writerows(zip(timestamps, [coin] * len(records), records["open_interest"].tolist(),
+                                 records["mark_price"].tolist()))
+    return csv_path
+
+
+def kind_from_filename(path):
+    """ファイル名の接頭辞（trades_ / l2book_ / all_mids_ / open_interest_）から種類を判定する"""
+    name = os.path.basename(path)
+    for prefix, kind in (("trades", "trades"), ("l2book", "l2book"), ("all_mids", "mids"),
+                         ("mids", "mids"), ("open_interest", "open_interest")):
+        if name.startswith(prefix):
+            return kind
+    raise ValueError(f"ファイル名から種類を判定できません: {path}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="コレクター出力の CSV とバイナリレコードの相互変換")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    to_csv = subparsers.add_parser("to-csv", help="バイナリレコードを CSV に変換する")
+    to_csv.add_argument("paths", nargs="+")
+    to_csv.add_argument("--overwrite", action="store_true", help="既存の CSV を上書きする")
+
+    from_csv = subparsers.add_parser("from-csv", help="CSV をバイナリレコードに変換する")
+    from_csv.add_argument("paths", nargs="+")
+    from_csv.add_argument("--coin", help="銘柄（coin 列がない l2book では必須）")
+    from_csv.add_argument("--overwrite", action="store_true", help="既存のバイナリファイルを上書きする")
+
+    args = parser.parse_args(argv)
+    for path in args.paths:
+        if args.command == "to-csv":
+            out_path = records_to_csv(path, overwrite=args.overwrite)
+        else:
+            out_path = csv_to_records(path, coin=args.coin, overwrite=args.overwrite)
+        print(f"{path} -> {out_path} ({os.path.getsize(path)} -> {os.path.getsize(out_path)} bytes)")
+
+
+if __name__ == "__main__":
+    main()
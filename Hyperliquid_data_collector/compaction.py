@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+import argparse
+import csv
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from binary_records import open_records, read_csv_records, read_header
+
+
+# コレクター出力のコンパクション（日付ごとのパーティションへの統合と重複除去）
+#
+# 再起動や再接続のたびに data/ には trades_<日時>.csv のような断片的なファイルが増え、
+# 期間が重なったファイルには同じ約定が何度も入る。ここでは data/ の出力ファイルを
+# プロセスプールで並列に読み、銘柄・ストリームごとに日付で分けたパーティションにまとめる。
+#
+#   trades         tid で重複を除き、約定時刻（time）・tid の順に並べる。日付は約定時刻（UTC）で分ける
+#                  （受信時刻で分けると、日付をまたいで重複した約定が別のパーティションに入るため）
+#   l2book*        受信時刻（ts）順に並べ、直前と同じ板（全段の価格・数量が同じ）を除く
+#   mids / open_interest  受信時刻順に並べ、直前とまったく同じ行を除く
+#
+# 出力は <out>/<ストリーム>/<銘柄>/<YYYYMMDD>.npz（列ごとの配列を圧縮したもの。l2book の各列は
+# (行数 x 段数)）。--format parquet なら .parquet（pyarrow が必要）。
+# 読んだファイルのサイズと更新時刻を <out>/_state.json に記録し、次回は新しいファイルと
+# 追記されたファイルだけを読む（追記されたファイルは全体を読み直すが、重複は除かれる）。
+# 同じ日時の .csv と .bin がある（--format both で収集した）場合は .bin だけを読む。
+#
+# 使用例:
+#     python compaction.py data --out data/compacted
+#     trades = load_partitions("data/compacted", "trades", "BTC", "20240501", "20240507")
+
+STATE_FILE = "_state.json"
+STATE_VERSION = 1
+FORMATS = ("npz", "parquet")
+EXTENSIONS = {"npz": ".npz", "parquet": ".parquet"}
+# コレクターの出力ファイル名（<ストリーム>_<YYYYMMDD_HHMMSS>.<拡張子>）
+SOURCE_PATTERN = re.compile(
+    r"^(?P<stream>trades|l2book(?:-sig\w+)?|all_mids|open_interest)_(?P<run>\d{8}_\d{6})"
+    r"\.(?P<ext>csv(?:\.zst|\.lz4)?|bin)$"
+)
+# ファイル名の接頭辞と出力のストリーム名が違うもの
+STREAM_NAMES = {"all_mids": "mids"}
+BOOK_FIELDS = ("bid_px", "bid_sz", "ask_px", "ask_sz")
+DAY_MS = 86_400_000
+DAY_NS = DAY_MS * 1_000_000
+
+
+def _kind(stream):
+    return "l2book" if stream.startswith("l2book") else stream
+
+
+def scan_sources(data_dir):
+    """
+    data_dir 直下のコレクターの出力ファイル
+    Returns:
+        list: {"path", "name", "stream", "run"} のリスト（同じ日時の .csv と .bin があれば .bin だけ）
+    """
+    sources = {}
+    for name in sorted(os.listdir(data_dir)):
+        match = SOURCE_PATTERN.match(name)
+        if match is None:
+            continue
+        stream = STREAM_NAMES.get(match["stream"], match["stream"])
+        key = (stream, match["run"])
+        if key in sources and match["ext"] != "bin":
+            continue
+        sources[key] = {"path": os.path.join(data_dir, name), "name": name, "stream": stream, "run": match["run"]}
+    return list(sources.values())
+
+
+def _first_coin(path):
+    """ファイルの銘柄（.bin のヘッダー、CSV の coin 列の最初の値。わからなければ None）"""
+    if path.endswith(".bin"):
+        return read_header(path)["coin"] or None
+    if path.endswith(".csv"):
+        with open(path, newline="") as f:
+            rows = csv.reader(f)
+            header, row = next(rows, None), next(rows, None)
+    else:
+        from compression import iter_decompressed
+
+        chunk = next(iter_decompressed(path), b"")
+        lines = chunk.decode("utf-8", errors="replace").splitlines()
+        rows = list(csv.reader(lines[:2]))
+        header, row = (rows + [None, None])[:2]
+    if header and row and "coin" in header and len(row) == len(header):
+        return row[header.index("coin")]
+    return None
+
+
+def read_source(task):
+    """
+    1ファイルを構造化配列として読む（プロセスプールのワーカーで実行する）
+    Args:
+        task (tuple): (パス, ストリーム名, 銘柄（ファイルからわからないときに使う）)
+    Returns:
+        tuple: (ストリーム名, 銘柄, 構造化配列)
+    """
+    path, stream, coin = task
+    if path.endswith(".bin"):
+        header = read_header(path)
+        return stream, header["coin"] or coin, np.array(open_records(path))
+    records, csv_coin = read_csv_records(path, _kind(stream))
+    return stream, csv_coin or coin, records
+
+
+def _days(records, kind):
+    """行ごとの日付（エポックからの日数）"""
+    if kind == "trades":
+        return records["time"] // DAY_MS
+    return records["ts"] // DAY_NS
+
+
+def _day_name(day):
+    return str(np.datetime64(int(day), "D")).replace("-", "")
+
+
+def _pad_levels(records, levels):
+    """l2book を levels 段にする（足りない段はコレクターと同じく0で埋める）"""
+    current = records.dtype["bid_px"].shape[0]
+    if current == levels:
+        return records
+    from binary_records import book_dtype
+
+    padded = np.zeros(len(records), dtype=book_dtype(levels))
+    padded["ts"] = records["ts"]
+    padded["time"] = records["time"]
+    for field in BOOK_FIELDS:
+        padded[field][:, :current] = records[field]
+    return padded
+
+
+def compact_records(records, kind):
+    """
+    並べ替えて重複を除く
+    Args:
+        records (np.ndarray): 同じ種類の構造化配列（既存のパーティションを先に連結したもの）
+        kind (str): "trades" / "l2book" / "mids" / "open_interest"
+    Returns:
+        np.ndarray: 並べ替えて重複を除いた構造化配列
+    """
+    if len(records) == 0:
+        return records
+    if kind == "trades":
+        # tid ごとに最初に受信した行を残す
+        order = np.lexsort((records["ts"], records["tid"]))
+        records = records[order]
+        records = records[np.r_[True, records["tid"][1:] != records["tid"][:-1]]]
+        return records[np.lexsort((records["tid"], records["time"]))]
+
+    records = records[np.argsort(records["ts"], kind="stable")]
+    if kind == "l2book":
+        same = np.ones(len(records) - 1, dtype=bool)
+        for field in BOOK_FIELDS:
+            same &= np.all(records[field][1:] == records[field][:-1], axis=1)
+    else:
+        same = records[1:] == records[:-1]
+    return records[np.r_[True, ~same]]
+
+
+def _to_frame(records):
+    """構造化配列を DataFrame にする（l2book の各段は bid_px_1 のような列に展開する）"""
+    import pandas as pd
+
+    columns = {}
+    for name in records.dtype.names:
+        values = records[name]
+        if values.ndim == 2:
+            for i in range(values.shape[1]):
+                columns[f"{name}_{i + 1}"] = values[:, i]
+        else:
+            columns[name] = values
+    return pd.DataFrame(columns)
+
+
+def _from_frame(df):
+    fields, arrays = [], {}
+    for column in df.columns:
+        name, _, level = column.rpartition("_")
+        if name in BOOK_FIELDS and level.isdigit():
+            arrays.setdefault(name, []).append(df[column].to_numpy())
+            if len(arrays[name]) == 1:
+                fields.append(name)
+        else:
+            arrays[column] = df[column].to_numpy()
+            fields.append(column)
+    for name in BOOK_FIELDS:
+        if name in arrays:
+            arrays[name] = np.column_stack(arrays[name])
+    return _from_columns(fields, arrays)
+
+
+def _from_columns(fields, arrays):
+    dtype = np.dtype([(name, arrays[name].dtype, arrays[name].shape[1:]) for name in fields])
+    records = np.zeros(len(arrays[fields[0]]), dtype=dtype)
+    for name in fields:
+        records[name] = arrays[name]
+    return records
+
+
+def write_partition(path, records, fmt="npz"):
+    """パーティションを書き出す（一時ファイルからの置き換えなので、途中で止まっても壊れない）"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    if fmt == "parquet":
+        _to_frame(records).to_parquet(tmp_path, index=False)
+    else:
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(f, **{name: records[name] for name in records.dtype.names})
+    os.replace(tmp_path, path)
+
+
+def read_partition(path):
+    """
+    パーティションを読む
+    Returns:
+        np.ndarray: 構造化配列（binary_records と同じ列）
+    """
+    if path.endswith(".parquet"):
+        import pandas as pd
+
+        return _from_frame(pd.read_parquet(path))
+    with np.load(path, allow_pickle=False) as arrays:
+        return _from_columns(list(arrays.files), {name: arrays[name] for name in arrays.files})
+
+
+def load_partitions(out_dir, stream, coin, start=None, end=None):
+    """
+    パーティションを日付の範囲で読んで連結する
+    Args:
+        out_dir (str): compact の出力先
+        stream (str): "trades" / "l2book" / "l2book-sig3" / "mids" / "open_interest" など
+        coin (str): 銘柄
+        start (str): 最初の日付（YYYYMMDD、省略時は最初から）
+        end (str): 最後の日付（YYYYMMDD、この日を含む。省略時は最後まで）
+    Returns:
+        np.ndarray: 構造化配列（パーティションがなければ None）
+    """
+    directory = os.path.join(out_dir, stream, coin)
+    if not os.path.isdir(directory):
+        return None
+    parts = []
+    for name in sorted(os.listdir(directory)):
+        day, ext = os.path.splitext(name)
+        if ext not in EXTENSIONS.values() or (start and day < start) or (end and day > end):
+            continue
+        parts.append(read_partition(os.path.join(directory, name)))
+    if not parts:
+        return None
+    if _kind(stream) == "l2book":
+        levels = max(part.dtype["bid_px"].shape[0] for part in parts)
+        parts = [_pad_levels(part, levels) for part in parts]
+    return np.concatenate(parts)
+
+
+def merge_partition(task):
+    """
+    既存のパーティションに新しい行を加えて書き直す（プロセスプールのワーカーで実行する）
+    Args:
+        task (tuple): (パーティションのパス, 種類, 新しい行の構造化配列, 出力形式)
+    Returns:
+        tuple: (パス, 書き出した行数)
+    """
+    path, kind, records, fmt = task
+    if os.path.exists(path):
+        existing = read_partition(path)
+        if kind == "l2book":
+            levels = max(existing.dtype["bid_px"].shape[0], records.dtype["bid_px"].shape[0])
+            existing, records = _pad_levels(existing, levels), _pad_levels(records, levels)
+        records = np.concatenate([existing, records])
+    records = compact_records(records, kind)
+    write_partition(path, records, fmt)
+    return path, len(records)
+
+
+def load_state(out_dir):
+    path = os.path.join(out_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return {"version": STATE_VERSION, "format": None, "files": {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_state(out_dir, state):
+    path = os.path.join(out_dir, STATE_FILE)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _require_parquet():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as e:
+        raise ImportError("parquet での出力には pyarrow パッケージが必要です（pip install pyarrow）") from e
+
+
+def _map(executor, function, tasks):
+    if executor is None:
+        return [function(task) for task in tasks]
+    return list(executor.map(function, tasks))
+
+
+def compact(data_dir, out_dir=None, fmt="npz", max_workers=None, coin="BTC", full=False):
+    """
+    data_dir のコレクター出力を日付ごとのパーティションにまとめる
+    Args:
+        data_dir (str): コレクターの出力先
+        out_dir (str): パーティションの出力先（省略時は data_dir/compacted）
+        fmt (str): "npz" / "parquet"
+        max_workers (int): プロセス数（1ならプロセスプールを使わない、None なら CPU 数）
+        coin (str): ファイルから銘柄がわからないとき（coin 列のない l2book の CSV で、同じ日時の
+            ほかのファイルもないとき）の銘柄
+        full (bool): 前回の記録を無視してすべてのファイルを読み直す
+    Returns:
+        dict: {"files": 読んだファイル数, "rows_read": 読んだ行数, "partitions": {パス: 行数}}
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"fmt は {FORMATS} のいずれかです: {fmt}")
+    if fmt == "parquet":
+        _require_parquet()
+    out_dir = out_dir or os.path.join(data_dir, "compacted")
+    os.makedirs(out_dir, exist_ok=True)
+    state = load_state(out_dir)
+    if state["format"] not in (None, fmt):
+        raise ValueError(f"{out_dir} は {state['format']} で出力済みです（別の出力先を指定してください）")
+    state["format"] = fmt
+
+    # 前回から増えたファイル・追記されたファイルだけを読む
+    sources, signatures = [], {}
+    for source in scan_sources(data_dir):
+        stat = os.stat(source["path"])
+        signatures[source["name"]] = [stat.st_size, stat.st_mtime_ns]
+        if full or state["files"].get(source["name"]) != signatures[source["name"]]:
+            sources.append(source)
+    if not sources:
+        return {"files": 0, "rows_read": 0, "partitions": {}}
+
+    # coin 列のない l2book の CSV は、同じ日時のほかのファイルの銘柄を使う
+    needed = {source["run"] for source in sources
+              if _kind(source["stream"]) == "l2book" and not source["path"].endswith(".bin")}
+    run_coins = {}
+    for source in scan_sources(data_dir):
+        if source["run"] in needed and not run_coins.get(source["run"]) and _kind(source["stream"]) != "l2book":
+            run_coins[source["run"]] = _first_coin(source["path"])
+    tasks = [(source["path"], source["stream"], run_coins.get(source["run"]) or coin) for source in sources]
+
+    executor = None
+    if max_workers != 1 and len(tasks) > 1:
+        executor = ProcessPoolExecutor(max_workers=max_workers or os.cpu_count())
+    try:
+        # ストリーム・銘柄・日付ごとに新しい行を集める
+        groups = {}
+        rows_read = 0
+        for stream, source_coin, records in _map(executor, read_source, tasks):
+            rows_read += len(records)
+            if len(records) == 0:
+                continue
+            kind = _kind(stream)
+            days = _days(records, kind)
+            for day in np.unique(days):
+                groups.setdefault((stream, source_coin, int(day)), []).append(records[days == day])
+
+        merge_tasks = []
+        for (stream, source_coin, day), parts in sorted(groups.items()):
+            kind = _kind(stream)
+            if kind == "l2book":
+                levels = max(part.dtype["bid_px"].shape[0] for part in parts)
+                parts = [_pad_levels(part, levels) for part in parts]
+            path = os.path.join(out_dir, stream, source_coin, _day_name(day) + EXTENSIONS[fmt])
+            merge_tasks.append((path, kind, np.concatenate(parts), fmt))
+        partitions = dict(_map(executor, merge_partition, merge_tasks))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    # パーティションを書き終えてから記録する（途中で止まったら次回読み直す。重複は除かれる）
+    state["files"].update({source["name"]: signatures[source["name"]] for source in sources})
+    save_state(out_dir, state)
+    return {"files": len(sources), "rows_read": rows_read, "partitions": partitions}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="コレクター出力の日付ごとのパーティションへの統合と重複除去")
+    parser.add_argument("data_dir", nargs="?", default="data")
+    parser.add_argument("--out", default=None, help="出力先（省略時は <data_dir>/compacted）")
+    parser.add_argument("--format", choices=FORMATS, default="npz")
+    parser.add_argument("--workers", type=int, default=None, help="プロセス数（省略時は CPU 数）")
+    parser.add_argument("--coin", default="BTC", help="ファイルから銘柄がわからないときの銘柄")
+    parser.add_argument("--full", action="store_true", help="前回の記録を無視してすべてのファイルを読み直す")
+    args = parser.parse_args(argv)
+
+    result = compact(args.data_dir, args.out, args.format, args.workers, args.coin, args.full)
+    print(f"読んだファイル: {result['files']}（{result['rows_read']} 行）")
+    for path, rows in result["partitions"].items():
+        print(f"{path}: {rows} 行")
+
+
+if __name__ == "__main__":
+    main()
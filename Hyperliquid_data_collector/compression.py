@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import sys
+import time
+
+
+# 出力ストリームのストリーミング圧縮（zstd / lz4）
+#
+# 書き込んだデータはメモリに貯めておき、flush() のたびに独立したフレームとして圧縮して追記する。
+# フレームは単体で展開できるので、クラッシュしても失うのは最後の flush 以降のデータだけで、
+# 途中まで書かれた最後のフレームは読み出し時に捨てる。フレームを連結したファイルは
+# そのまま `zstd -d` / `lz4 -d` でも展開できる。
+#
+# zstandard / lz4 パッケージは圧縮を有効にしたときだけ必要になる。
+#
+# 使用例:
+#     sink = CompressedSink("data/trades.csv", "zstd", level=3)
+#     csv.writer(sink).writerow([...])   # sink は write(str) を持つのでそのまま渡せる
+#     sink.close()
+#     print(sink.stats)
+#
+#     python compression.py cat data/trades_20240501_120000.csv.zst
+
+CODECS = ("zstd", "lz4")
+EXTENSIONS = {"zstd": ".zst", "lz4": ".lz4"}
+DEFAULT_LEVELS = {"zstd": 3, "lz4": 0}
+DEFAULT_FRAME_BYTES = 1 << 20   # この大きさ（圧縮前）を超えたらフレームを区切る
+DEFAULT_FRAME_INTERVAL = 5.0    # 最後のフレームからこの秒数が経ったら区切る
+
+
+def _import_codec(codec):
+    try:
+        if codec == "zstd":
+            import zstandard
+            return zstandard
+        if codec == "lz4":
+            import lz4.frame
+            return lz4.frame
+    except ImportError as e:
+        package = "zstandard" if codec == "zstd" else "lz4"
+        raise ImportError(f"{codec} 圧縮には {package} パッケージが必要です（pip install {package}）") from e
+    raise ValueError(f"codec は {CODECS} のいずれかです: {codec}")
+
+
+def codec_from_path(path):
+    for codec, extension in EXTENSIONS.items():
+        if path.endswith(extension):
+            return codec
+    return None
+
+
+class CompressionStats:
+    """ストリームごとの圧縮前後のバイト数と圧縮にかかったCPU時間"""
+
+    def __init__(self):
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+        self.frames = 0
+        self.cpu_ns = 0
+
+    @property
+    def ratio(self):
+        return self.raw_bytes / self.compressed_bytes if self.compressed_bytes else 0.0
+
+    @property
+    def cpu_ms_per_mb(self):
+        """圧縮前 1MB あたりのCPU時間（ミリ秒）"""
+        return self.cpu_ns / 1e6 / (self.raw_bytes / 1e6) if self.raw_bytes else 0.0
+
+    def __repr__(self):
+        return (f"raw={self.raw_bytes / 1e6:.2f}MB compressed={self.compressed_bytes / 1e6:.2f}MB "
+                f"ratio={self.ratio:.2f} frames={self.frames} "
+                f"cpu={self.cpu_ns / 1e6:.1f}ms ({self.cpu_ms_per_mb:.2f}ms/MB)")
+
+
+class CompressedSink:
+    """
+    フレーム単位で圧縮して追記する出力先
+    Args:
+        path (str): 圧縮前のファイル名（実際のファイルは拡張子 .zst / .lz4 を付けたもの）
+        codec (str): "zstd" または "lz4"
+        level (int): 圧縮レベル（省略時は codec ごとのデフォルト）
+        frame_bytes (int): 圧縮前のデータがこの大きさを超えたらフレームを区切る
+        frame_interval (float): 最後のフレームからこの秒数が経ったら次の write でフレームを区切る
+        append (bool): 既存のファイルに追記する（False なら作り直す）
+    """
+
+    def __init__(self, path, codec, level=None, frame_bytes=DEFAULT_FRAME_BYTES,
+                 frame_interval=DEFAULT_FRAME_INTERVAL, append=False):
+        module = _import_codec(codec)
+        self.codec = codec
+        self.level = DEFAULT_LEVELS[codec] if level is None else level
+        self.path = path + EXTENSIONS[codec]
+        self.frame_bytes = frame_bytes
+        self.frame_interval = frame_interval
+        self.stats = CompressionStats()
+        if codec == "zstd":
+            compressor = module.ZstdCompressor(level=self.level)
+            self._compress = compressor.compress
+        else:
+            self._compress = lambda data: module.compress(data, compression_level=self.level)
+        self._buffer = []
+        self._buffered = 0
+        self._last_flush = time.monotonic()
+        self.file = open(self.path, "ab" if append else "wb")
+
+    def write(self, text):
+        """文字列を書き込む（csv.writer からもそのまま使える）"""
+        data = text.encode("utf-8")
+        self._buffer.append(data)
+        self._buffered += len(data)
+        if self._buffered >= self.frame_bytes or time.monotonic() - self._last_flush >= self.frame_interval:
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        """貯めているデータを1つのフレームとして圧縮して書き出す"""
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+        data = b"".join(self._buffer)
+        self._buffer = []
+        self._buffered = 0
+        start = time.thread_time_ns()
+        frame = self._compress(data)
+        self.stats.cpu_ns += time.thread_time_ns() - start
+        self.file.write(frame)
+        self.file.flush()
+        self.stats.raw_bytes += len(data)
+        self.stats.compressed_bytes += len(frame)
+        self.stats.frames += 1
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.flush()
+        self.file.close()
+
+
+def iter_decompressed(path, chunk_size=1 << 20):
+    """
+    圧縮ファイルをフレームごとに展開する（途中で切れた最後のフレームは捨てる）
+    Yields:
+        bytes: 展開した1フレーム分のデータ
+    """
+    codec = codec_from_path(path)
+    if codec is None:
+        raise ValueError(f"拡張子から圧縮形式を判定できません: {path}")
+    module = _import_codec(codec)
+    if codec == "zstd":
+        new_decompressor = module.ZstdDecompressor().decompressobj
+        errors = (module.ZstdError,)
+    else:
+        new_decompressor = module.LZ4FrameDecompressor
+        errors = (RuntimeError,)
+
+    with open(path, "rb") as f:
+        decompressor = new_decompressor()
+        frame = []
+        pending = b""
+        while True:
+            data = pending or f.read(chunk_size)
+            pending = b""
+            if not data:
+                # ここで終わっていないフレームはクラッシュで途中までしか書かれていないもの
+                return
+            try:
+                frame.append(decompressor.decompress(data))
+            except errors:
+                return
+            if decompressor.eof:
+                yield b"".join(frame)
+                frame = []
+                pending = decompressor.unused_data
+                decompressor = new_decompressor()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="圧縮されたコレクター出力の展開")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    cat = subparsers.add_parser("cat", help="展開して標準出力に書き出す")
+    cat.add_argument("paths", nargs="+")
+    decompress = subparsers.add_parser("decompress", help="拡張子を外したファイルに展開する")
+    decompress.add_argument("paths", nargs="+")
+
+    args = parser.parse_args(argv)
+    for path in args.paths:
+        if args.command == "cat":
+            for chunk in iter_decompressed(path):
+                sys.stdout.buffer.write(chunk)
+        else:
+            out_path = os.path.splitext(path)[0]
+            with open(out_path, "wb") as f:
+                for chunk in iter_decompressed(path):
+                    f.write(chunk)
+            print(f"{path} -> {out_path}")
+
+
+if __name__ == "__main__":
+    main()
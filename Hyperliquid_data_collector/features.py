@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+import argparse
+import csv
+import glob
+import heapq
+import json
+import math
+import os
+from collections import deque
+
+import numpy as np
+
+
+# 約定・板・Open Interest からのマイクロストラクチャー特徴量（固定時間グリッド）
+#
+# イベント（約定 / 板スナップショット / OI）を時刻順に1件ずつ受け取り、O(1) で
+# 現在のバケットの集計を更新する。バケットの時刻を過ぎたイベントが来たら、そのバケットの
+# 特徴量を1行として書き出す（イベントのないバケットも、状態を引き継いだ行として書き出す）。
+#
+# 特徴量（バケットごと）:
+#   mid, spread                 バケット最後の板の中値とスプレッド
+#   ofi                         Order Flow Imbalance（最良気配の変化から計算、Cont et al.）
+#   trade_count, volume, vwap   約定数・出来高・VWAP
+#   trade_sign_imbalance        (買い約定数 - 売り約定数) / 約定数
+#   volume_imbalance            (買い出来高 - 売り出来高) / 出来高
+#   book_imbalance_N            上位N段の (買い数量 - 売り数量) / (買い数量 + 売り数量)
+#   realized_vol                バケット内の中値の対数リターンの二乗和の平方根
+#   realized_vol_rolling        直近 rv_window バケットの realized_vol（二乗和で合算）
+#   open_interest, oi_change    バケット最後の OI と前のバケットからの変化
+#
+# 使用例（ファイルから作って保存し、2回目以降は保存したものを読む）:
+#     python features.py build --trades "data/trades_*.csv" --books "data/l2book_*.csv" \
+#         --oi "data/open_interest_*.csv" --interval 1 --out data/features_1s.csv
+#     df = load_features("data/features_1s.csv")
+#
+# 使用例（リアルタイム）:
+#     pipeline = FeaturePipeline(FeatureConfig(interval=1.0), sink=FeatureWriter("features.csv", config))
+#     pipeline.on_trade(ts_ns, px, sz, side)   # コレクターから呼ぶ（--features）
+
+NS = 1_000_000_000
+SIDE_SIGNS = {"B": 1, "A": -1}
+
+
+class FeatureConfig:
+    """
+    特徴量の設定
+    Args:
+        interval (float): グリッドの間隔（秒）
+        book_levels (tuple): 板の不均衡を計算する段数
+        rv_window (int): realized_vol_rolling に使うバケット数
+    """
+
+    def __init__(self, interval=1.0, book_levels=(1, 5), rv_window=60):
+        self.interval = interval
+        self.book_levels = tuple(book_levels)
+        self.rv_window = rv_window
+
+    def to_dict(self):
+        return {"interval": self.interval, "book_levels": list(self.book_levels), "rv_window": self.rv_window}
+
+    @property
+    def columns(self):
+        return (
+            ["timestamp", "mid", "spread", "ofi", "trade_count", "volume", "vwap",
+             "trade_sign_imbalance", "volume_imbalance"] +
+            [f"book_imbalance_{n}" for n in self.book_levels] +
+            ["realized_vol", "realized_vol_rolling", "open_interest", "oi_change"]
+        )
+
+
+class FeaturePipeline:
+    """
+    イベントを受け取って特徴量を逐次計算する
+    Args:
+        config (FeatureConfig): 設定
+        sink: 完成したバケットの行（list）を受け取る write_row(row) を持つオブジェクト、または関数
+    """
+
+    def __init__(self, config=None, sink=None):
+        self.config = config or FeatureConfig()
+        self.interval_ns = int(self.config.interval * NS)
+        if sink is None:
+            self.rows = []
+            self._emit = self.rows.append
+        else:
+            self._emit = sink.write_row if hasattr(sink, "write_row") else sink
+        self.bucket = None
+
+        # バケットをまたいで引き継ぐ状態
+        self.mid = math.nan
+        self.spread = math.nan
+        self.best = None  # (bid_px, bid_sz, ask_px, ask_sz)
+        self.imbalances = [math.nan] * len(self.config.book_levels)
+        self.open_interest = math.nan
+        self._prev_open_interest = math.nan
+        self._rv_window = deque()
+        self._rv_window_sum = 0.0
+        self._reset_bucket()
+
+    def _reset_bucket(self):
+        self.ofi = 0.0
+        self.trade_count = 0
+        self.buy_count = 0
+        self.buy_volume = 0.0
+        self.volume = 0.0
+        self.notional = 0.0
+        self.rv_sum = 0.0
+
+    def _advance(self, ts):
+        bucket = ts // self.interval_ns
+        if self.bucket is None:
+            self.bucket = bucket
+            return
+        while bucket > self.bucket:
+            self._emit_bucket()
+            self.bucket += 1
+
+    def _emit_bucket(self):
+        config = self.config
+        self._rv_window.append(self.rv_sum)
+        self._rv_window_sum += self.rv_sum
+        if len(self._rv_window) > config.rv_window:
+            self._rv_window_sum -= self._rv_window.popleft()
+
+        trades = self.trade_count
+        volume = self.volume
+        sell_count = trades - self.buy_count
+        sell_volume = volume - self.buy_volume
+        self._emit([
+            self.bucket * self.interval_ns,
+            self.mid,
+            self.spread,
+            self.ofi,
+            trades,
+            volume,
+            self.notional / volume if volume else math.nan,
+            (self.buy_count - sell_count) / trades if trades else 0.0,
+            (self.buy_volume - sell_volume) / volume if volume else 0.0,
+            *self.imbalances,
+            math.sqrt(self.rv_sum),
+            math.sqrt(max(self._rv_window_sum, 0.0)),
+            self.open_interest,
+            self.open_interest - self._prev_open_interest,
+        ])
+        self._prev_open_interest = self.open_interest
+        self._reset_bucket()
+
+    # --- イベント ---
+    def on_trade(self, ts, px, sz, side):
+        """
+        約定
+        Args:
+            ts (int): 受信時刻（ナノ秒）
+            px, sz (float): 価格と数量
+            side (str or int): "B" / "A" または +1 / -1（買いが +1）
+        """
+        self._advance(ts)
+        sign = SIDE_SIGNS.get(side, 0) if isinstance(side, str) else side
+        self.trade_count += 1
+        self.volume += sz
+        self.notional += px * sz
+        if sign > 0:
+            self.buy_count += 1
+            self.buy_volume += sz
+
+    def on_book(self, ts, bid_px, bid_sz, ask_px, ask_sz):
+        """
+        板スナップショット（各引数は上位から順の価格・数量のシーケンス）
+        """
+        self._advance(ts)
+        best = (bid_px[0], bid_sz[0], ask_px[0], ask_sz[0])
+        if best[0] <= 0 or best[2] <= 0:
+            return
+        if self.best is not None:
+            prev_bid_px, prev_bid_sz, prev_ask_px, prev_ask_sz = self.best
+            bid_px0, bid_sz0, ask_px0, ask_sz0 = best
+            # 最良気配の変化による注文フローの不均衡
+            self.ofi += ((bid_sz0 if bid_px0 >= prev_bid_px else 0.0)
+                         - (prev_bid_sz if bid_px0 <= prev_bid_px else 0.0)
+                         - (ask_sz0 if ask_px0 <= prev_ask_px else 0.0)
+                         + (prev_ask_sz if ask_px0 >= prev_ask_px else 0.0))
+        self.best = best
+
+        mid = (best[0] + best[2]) / 2
+        if self.mid == self.mid and self.mid > 0:
+            r = math.log(mid / self.mid)
+            self.rv_sum += r * r
+        self.mid = mid
+        self.spread = best[2] - best[0]
+
+        for i, n in enumerate(self.config.book_levels):
+            bids = sum(bid_sz[:n])
+            asks = sum(ask_sz[:n])
+            self.imbalances[i] = (bids - asks) / (bids + asks) if bids + asks else 0.0
+
+    def on_open_interest(self, ts, open_interest):
+        self._advance(ts)
+        if self._prev_open_interest != self._prev_open_interest:
+            # 最初の値は変化量の基準にする
+            self._prev_open_interest = open_interest
+        self.open_interest = open_interest
+
+    def flush(self):
+        """途中のバケットも書き出す（終了時に呼ぶ）"""
+        if self.bucket is not None:
+            self._emit_bucket()
+            self.bucket = None
+
+
+class FeatureWriter:
+    """
+    特徴量を CSV に追記する（timestamp 列は ISO 形式）
+    Args:
+        path (str): 出力先
+        config (FeatureConfig): 列名の決定に使う設定
+        autoflush (bool): 1行ごとにディスクへ書き出す（リアルタイムで使う場合）
+    """
+
+    def __init__(self, path, config, autoflush=False):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.autoflush = autoflush
+        self.file = open(path, "w", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(config.columns)
+
+    def write_row(self, row):
+        timestamp = np.datetime_as_string(np.datetime64(row[0], "ns"), unit="us")
+        self.writer.writerow([timestamp] + [_format(value) for value in row[1:]])
+        if self.autoflush:
+            self.file.flush()
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def _format(value):
+    if isinstance(value, float):
+        return "" if value != value else repr(value)
+    return value
+
+
+# --- ファイルからのイベント読み込み ---
+def _expand(paths):
+    if not paths:
+        return []
+    if isinstance(paths, str):
+        paths = [paths]
+    files = []
+    for pattern in paths:
+        files.extend(sorted(glob.glob(pattern)) or [pattern])
+    return files
+
+
+def _load_csv(path, usecols):
+    import pandas as pd
+
+    df = pd.read_csv(path, usecols=usecols, dtype={"side": str})
+    ts = pd.to_datetime(df["timestamp"], format="ISO8601").to_numpy("datetime64[ns]").astype(np.int64)
+    return ts, df
+
+
+def _trade_events(path):
+    if path.endswith(".bin"):
+        from binary_records import SIDE_ASK, SIDE_BID, open_records
+        records = open_records(path)
+        signs = np.where(records["side"] == SIDE_BID, 1, np.where(records["side"] == SIDE_ASK, -1, 0))
+        columns = (records["ts"], records["px"], records["sz"], signs)
+    else:
+        ts, df = _load_csv(path, ["timestamp", "side", "price", "size"])
+        signs = df["side"].map(SIDE_SIGNS).fillna(0).to_numpy(np.int64)
+        columns = (ts, df["price"].to_numpy(np.float64), df["size"].to_numpy(np.float64), signs)
+    for ts, px, sz, sign in zip(*(column.tolist() for column in columns)):
+        yield ts, 1, (px, sz, sign)
+
+
+def _book_events(path):
+    if path.endswith(".bin"):
+        from binary_records import open_records
+        records = open_records(path)
+        ts = records["ts"]
+        arrays = [records[field] for field in ("bid_px", "bid_sz", "ask_px", "ask_sz")]
+    else:
+        # 段数はコレクターの --book-view の設定で変わるのでヘッダーから数える
+        with open(path, newline="", encoding="utf-8") as f:
+            levels = sum(1 for column in next(csv.reader(f), []) if column.startswith("bid_px_"))
+        columns = [f"{field}_{i}" for field in ("bid_px", "bid_sz", "ask_px", "ask_sz") for i in range(1, levels + 1)]
+        ts, df = _load_csv(path, ["timestamp"] + columns)
+        values = df[columns].to_numpy(np.float64)
+        arrays = [values[:, i * levels:(i + 1) * levels] for i in range(4)]
+    for ts, bid_px, bid_sz, ask_px, ask_sz in zip(ts.tolist(), *(array.tolist() for array in arrays)):
+        yield ts, 0, (bid_px, bid_sz, ask_px, ask_sz)
+
+
+def _open_interest_events(path):
+    if path.endswith(".bin"):
+        from binary_records import open_records
+        records = open_records(path)
+        ts, values = records["ts"], records["open_interest"]
+    else:
+        ts, df = _load_csv(path, ["timestamp", "open_interest"])
+        values = df["open_interest"].to_numpy(np.float64)
+    for ts, value in zip(ts.tolist(), values.tolist()):
+        yield ts, 2, (value,)
+
+
+def iter_file_events(trades=None, books=None, open_interest=None):
+    """
+    ファイル（CSV / .bin、glob 可）からイベントを時刻順に読む
+    Yields:
+        tuple: (時刻ns, 種類 0=板 1=約定 2=OI, 値)
+    """
+    streams = [_book_events(path) for path in _expand(books)]
+    streams += [_trade_events(path) for path in _expand(trades)]
+    streams += [_open_interest_events(path) for path in _expand(open_interest)]
+    return heapq.merge(*streams, key=lambda event: (event[0], event[1]))
+
+
+def run_events(pipeline, events):
+    """イベントを順にパイプラインに渡し、最後のバケットまで書き出す"""
+    handlers = (
+        lambda ts, value: pipeline.on_book(ts, *value),
+        lambda ts, value: pipeline.on_trade(ts, *value),
+        lambda ts, value: pipeline.on_open_interest(ts, *value),
+    )
+    for ts, kind, value in events:
+        handlers[kind](ts, value)
+    pipeline.flush()
+
+
+def _meta_path(out_path):
+    return out_path + ".json"
+
+
+def _inputs_signature(files, config):
+    return {
+        "config": config.to_dict(),
+        "inputs": {path: [os.path.getsize(path), os.path.getmtime(path)] for path in files},
+    }
+
+
+def build_features(out_path, trades=None, books=None, open_interest=None, config=None, force=False):
+    """
+    ファイルから特徴量を計算して保存する（入力ファイルと設定が前回と同じなら計算しない）
+    Returns:
+        bool: 計算した場合 True、保存済みのものを使った場合 False
+    """
+    config = config or FeatureConfig()
+    files = _expand(trades) + _expand(books) + _expand(open_interest)
+    signature = _inputs_signature(files, config)
+    if not force and os.path.exists(out_path) and os.path.exists(_meta_path(out_path)):
+        with open(_meta_path(out_path), encoding="utf-8") as f:
+            if json.load(f) == json.loads(json.dumps(signature)):
+                return False
+
+    writer = FeatureWriter(out_path, config)
+    try:
+        run_events(FeaturePipeline(config, writer), iter_file_events(trades, books, open_interest))
+    finally:
+        writer.close()
+    with open(_meta_path(out_path), "w", encoding="utf-8") as f:
+        json.dump(signature, f)
+    return True
+
+
+def load_features(paths):
+    """保存した特徴量を DataFrame として読む（timestamp は datetime64）"""
+    import pandas as pd
+
+    frames = [pd.read_csv(path, parse_dates=["timestamp"]) for path in _expand(paths)]
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="マイクロストラクチャー特徴量の計算")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="収集したファイルから特徴量を計算して保存する")
+    build.add_argument("--trades", action="append", help="約定ファイル（CSV / .bin、glob 可）")
+    build.add_argument("--books", action="append", help="板ファイル（CSV / .bin、glob 可）")
+    build.add_argument("--oi", action="append", help="Open Interest ファイル（CSV / .bin、glob 可）")
+    build.add_argument("--interval", type=float, default=1.0, help="グリッドの間隔（秒）")
+    build.add_argument("--book-levels", default="1,5", help="板の不均衡を計算する段数（カンマ区切り）")
+    build.add_argument("--rv-window", type=int, default=60, help="realized_vol_rolling のバケット数")
+    build.add_argument("--out", required=True)
+    build.add_argument("--force", action="store_true", help="保存済みでも計算し直す")
+
+    args = parser.parse_args(argv)
+    config = FeatureConfig(args.interval, [int(n) for n in args.book_levels.split(",")], args.rv_window)
+    if build_features(args.out, args.trades, args.books, args.oi, config, force=args.force):
+        print(f"特徴量を保存しました: {args.out}")
+    else:
+        print(f"入力と設定が前回と同じなので保存済みの特徴量を使います: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
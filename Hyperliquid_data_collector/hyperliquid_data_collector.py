@@ -1,19 +1,22 @@
 #!/usr/bin/env python3
+import argparse
 import asyncio
 import json
 import os
 import time
 import websockets
-import aiohttp
-import pandas as pd
 from datetime import datetime
 import csv
 import signal
 from pathlib import Path
 
-# 定数定義
-WS_URL = "wss://api.hyperliquid.xyz/ws"
-HTTP_URL = "https://api.hyperliquid.xyz/info"
+from compression import CODECS, DEFAULT_FRAME_INTERVAL, EXTENSIONS
+from time_index import DEFAULT_INTERVAL, SparseIndexWriter
+
+# 定数定義（CollectorConfig のデフォルト値）
+# 環境変数で接続先を差し替えられる（負荷試験ではモックサーバーを指定する）
+WS_URL = os.getenv("HL_WS_URL", "wss://api.hyperliquid.xyz/ws")
+HTTP_URL = os.getenv("HL_INFO_URL", "https://api.hyperliquid.xyz/info")
 OUTPUT_DIR = "data"
 TARGET_COIN = "BTC"  # 情報収集の対象コイン
 OI_FETCH_INTERVAL = 5  # Open Interest取得間隔（秒）
@@ -21,43 +24,412 @@ OI_FETCH_INTERVAL = 5  # Open Interest取得間隔（秒）
 # デバッグモード
 DEBUG = True
 
-# 出力ディレクトリの作成
-Path(OUTPUT_DIR).mkdir(exist_ok=True)
+# 時刻インデックスを打つ間隔（行数、0で無効）
+INDEX_INTERVAL = DEFAULT_INTERVAL
+
+# 出力形式（"csv" / "binary" / "both"）。binary は binary_records.py の固定長レコード
+OUTPUT_FORMAT = "csv"
+OUTPUT_FORMATS = ("csv", "binary", "both")
+
+# CSV とデバッグログの圧縮（None / "zstd" / "lz4"）
+COMPRESSION = None
+
+# 銘柄ごとの l2Book の購読設定（"段数[:有効桁数[:mantissa]]" のリスト）。ここにない銘柄は DEFAULT_BOOK_VIEWS
+# 有効桁数を指定すると価格帯ごとに集約された板になり、同じ段数でより広い価格帯を受け取れる。
+# 2つ目以降の設定は別のストリーム（l2book-sig3_*.csv など）に保存する。
+# 例: "BTC": ["5", "20:3"]  → 集約なし5段と、有効桁数3で集約した20段
+BOOK_VIEWS = {}
+DEFAULT_BOOK_VIEWS = ["5"]
+MAX_BOOK_DEPTH = 20  # API が返す片側の最大段数
+N_SIG_FIGS = (2, 3, 4, 5)
+MANTISSAS = (1, 2, 5)  # n_sig_figs=5 のときだけ指定できる
+
+# 同じ購読を並列に受ける WebSocket 接続の数（2以上で先着のコピーだけを書き込む。redundancy.py）
+CONNECTIONS = 1
+DEDUP_WINDOW = 60.0  # 重複を判定するためにキーを覚えておく時間（秒）
+REDUNDANCY_REPORT_INTERVAL = 60.0  # 接続ごとの先着率と遅れをデバッグログに出す間隔（秒）
+
+
+class BookView:
+    """
+    l2Book の購読設定（1つの設定が1つのストリームになる）
+    Args:
+        depth (int): 保存する段数（片側、最大20）
+        n_sig_figs (int): 価格を集約する有効桁数（2〜5、None なら集約しない）
+        mantissa (int): n_sig_figs=5 のときの刻み（1 / 2 / 5）
+    """
+
+    def __init__(self, depth=5, n_sig_figs=None, mantissa=None):
+        if not 1 <= depth <= MAX_BOOK_DEPTH:
+            raise ValueError(f"depth は1〜{MAX_BOOK_DEPTH}です: {depth}")
+        if n_sig_figs is not None and n_sig_figs not in N_SIG_FIGS:
+            raise ValueError(f"n_sig_figs は {N_SIG_FIGS} のいずれかです: {n_sig_figs}")
+        if mantissa is not None and (n_sig_figs != 5 or mantissa not in MANTISSAS):
+            raise ValueError(f"mantissa は n_sig_figs=5 のときだけ {MANTISSAS} のいずれかを指定できます: {mantissa}")
+        self.depth = depth
+        self.n_sig_figs = n_sig_figs
+        self.mantissa = mantissa
+
+    @classmethod
+    def parse(cls, spec):
+        """"20:3" → BookView(depth=20, n_sig_figs=3)"""
+        values = [int(value) if value else None for value in str(spec).split(":")]
+        if len(values) > 3 or values[0] is None:
+            raise ValueError(f"板の設定は 段数[:有効桁数[:mantissa]] の形式です: {spec}")
+        return cls(*values)
+
+    @property
+    def name(self):
+        """ストリーム名（集約なしは従来どおり l2book）"""
+        if self.n_sig_figs is None:
+            return "l2book"
+        return f"l2book-sig{self.n_sig_figs}" + (f"m{self.mantissa}" if self.mantissa else "")
+
+    def subscription(self, coin):
+        subscription = {"type": "l2Book", "coin": coin}
+        if self.n_sig_figs is not None:
+            subscription["nSigFigs"] = self.n_sig_figs
+        if self.mantissa is not None:
+            subscription["mantissa"] = self.mantissa
+        return subscription
+
+    @property
+    def headers(self):
+        return (
+            ["timestamp"] +
+            [f"bid_px_{i}" for i in range(1, self.depth + 1)] +
+            [f"bid_sz_{i}" for i in range(1, self.depth + 1)] +
+            [f"ask_px_{i}" for i in range(1, self.depth + 1)] +
+            [f"ask_sz_{i}" for i in range(1, self.depth + 1)]
+        )
+
+    def __repr__(self):
+        return f"BookView(depth={self.depth}, n_sig_figs={self.n_sig_figs}, mantissa={self.mantissa})"
 
-# データ保存用のファイル名を生成（現在のタイムスタンプを使用）
-timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-TRADES_FILE = f"{OUTPUT_DIR}/trades_{timestamp}.csv"
-BOOK_FILE = f"{OUTPUT_DIR}/l2book_{timestamp}.csv"
-MIDS_FILE = f"{OUTPUT_DIR}/all_mids_{timestamp}.csv"
-OI_FILE = f"{OUTPUT_DIR}/open_interest_{timestamp}.csv"
-DEBUG_FILE = f"{OUTPUT_DIR}/debug_{timestamp}.log"
+
+class CollectorConfig:
+    """
+    コレクターの設定
+    Args:
+        output_dir (str): 出力ディレクトリ
+        target_coin (str): 情報収集の対象コイン
+        ws_url (str): WebSocket のURL
+        http_url (str): info API のURL
+        oi_fetch_interval (float): Open Interest取得間隔（秒）
+        debug (bool): デバッグログを出力するか
+        index_interval (int): 何行ごとに時刻インデックス（<CSV>.idx）を打つか（0で無効）
+        output_format (str): "csv" / "binary"（固定長レコードの .bin）/ "both"
+        compression (str): CSV とデバッグログを圧縮する形式（None / "zstd" / "lz4"）
+        compression_levels (dict): ストリーム名（trades / l2book / mids / open_interest / debug、"*" で全ストリーム）→ 圧縮レベル
+        frame_interval (float): 圧縮フレームを区切り、バイナリレコードをディスクに書き出す間隔（秒）。
+            クラッシュ時に失うのは最大でこの間のデータ
+        feature_interval (float): 受信しながらマイクロストラクチャー特徴量（features.py）を計算するグリッドの間隔（秒、None で無効）
+        book_views (list): l2Book の購読設定（BookView または "段数[:有効桁数[:mantissa]]"。省略時は BOOK_VIEWS の銘柄の設定）。
+            特徴量は最初の設定の板から計算する
+        connections (int): 同じ購読を並列に受ける接続の数。2以上なら約定は tid、板は取引所の時刻で
+            最初に届いたコピーだけを書き込み、接続ごとの先着率と遅れを集計する
+        dedup_window (float): 重複を判定するためにキーを覚えておく時間（秒）
+        timestamp (str): 出力ファイル名に付けるタイムスタンプ（省略時は現在時刻）
+    """
+
+    def __init__(self, output_dir=OUTPUT_DIR, target_coin=TARGET_COIN, ws_url=WS_URL, http_url=HTTP_URL,
+                 oi_fetch_interval=OI_FETCH_INTERVAL, debug=DEBUG, index_interval=INDEX_INTERVAL,
+                 output_format=OUTPUT_FORMAT, compression=COMPRESSION, compression_levels=None,
+                 frame_interval=DEFAULT_FRAME_INTERVAL, feature_interval=None, book_views=None,
+                 connections=CONNECTIONS, dedup_window=DEDUP_WINDOW, timestamp=None):
+        self.output_dir = output_dir
+        self.target_coin = target_coin
+        self.ws_url = ws_url
+        self.http_url = http_url
+        self.oi_fetch_interval = oi_fetch_interval
+        self.debug = debug
+        self.index_interval = index_interval
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"output_format は {OUTPUT_FORMATS} のいずれかです: {output_format}")
+        self.write_csv = output_format in ("csv", "both")
+        self.write_binary = output_format in ("binary", "both")
+        if compression is not None and compression not in CODECS:
+            raise ValueError(f"compression は {CODECS} のいずれかです: {compression}")
+        self.compression = compression
+        self.compression_levels = compression_levels or {}
+        self.frame_interval = frame_interval
+        self.feature_interval = feature_interval
+        if book_views is None:
+            book_views = BOOK_VIEWS.get(target_coin, DEFAULT_BOOK_VIEWS)
+        self.book_views = [view if isinstance(view, BookView) else BookView.parse(view) for view in book_views]
+        names = [view.name for view in self.book_views]
+        if not names or len(set(names)) != len(names):
+            raise ValueError(f"l2Book の集約設定は1つ以上、重複なしで指定してください: {self.book_views}")
+        if connections < 1:
+            raise ValueError(f"connections は1以上です: {connections}")
+        self.connections = connections
+        self.dedup_window = dedup_window
+
+        # データ保存用のファイル名を生成（現在のタイムスタンプを使用）
+        timestamp = timestamp or datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.trades_file = f"{output_dir}/trades_{timestamp}.csv"
+        # 板の設定ごとのファイル（book_file は最初の設定のもの）
+        self.book_files = {view.name: f"{output_dir}/{view.name}_{timestamp}.csv" for view in self.book_views}
+        self.book_file = self.book_files[self.book_views[0].name]
+        self.mids_file = f"{output_dir}/all_mids_{timestamp}.csv"
+        self.oi_file = f"{output_dir}/open_interest_{timestamp}.csv"
+        self.debug_file = f"{output_dir}/debug_{timestamp}.log"
+        self.features_file = f"{output_dir}/features_{timestamp}.csv"
+        # ストリーム名 → ファイル（圧縮レベルの指定と統計の表示に使う）
+        self.streams = {
+            "trades": self.trades_file,
+            **self.book_files,
+            "mids": self.mids_file,
+            "open_interest": self.oi_file,
+            "debug": self.debug_file,
+        }
+        # 固定長バイナリレコード（CSV と同じ名前で拡張子が .bin）
+        self.binary_files = {
+            "trades": f"{output_dir}/trades_{timestamp}.bin",
+            **{name: path[:-len(".csv")] + ".bin" for name, path in self.book_files.items()},
+            "mids": f"{output_dir}/all_mids_{timestamp}.bin",
+            "open_interest": f"{output_dir}/open_interest_{timestamp}.bin",
+        }
+
+
+# 現在の設定（configure() で設定する。import しただけではファイルやディレクトリを作らない）
+config = None
 
 # 実行終了用のフラグ
 running = True
 
+# CSVファイル → 時刻インデックス
+indexes = {}
+
+# ファイル → compression.CompressedSink（compression を指定したときだけ）
+sinks = {}
+
+# 特徴量パイプライン（feature_interval を指定したときだけ）
+feature_pipeline = None
+feature_writer = None
+
+# ストリーム名 → binary_records.RecordWriter（output_format が binary / both のときだけ）
+binary_writers = {}
+
+# 冗長接続の先着マージ（redundancy.FirstArrivalMerger、connections が2以上のときだけ）
+merger = None
+
+# 銘柄名 → metaAndAssetCtxs のuniverse内インデックス
+coin_index_cache = {}
+
+def configure(new_config):
+    """設定を反映し、出力ディレクトリを作成する"""
+    global config
+    config = new_config
+    indexes.clear()
+    Path(config.output_dir).mkdir(parents=True, exist_ok=True)
+    return config
+
 def handle_signal(sig, frame):
     """シグナルハンドラ（Ctrl+Cなど）"""
     global running
     print("シャットダウンシグナルを受信しました。クリーンアップ中...")
     running = False
 
-signal.signal(signal.SIGINT, handle_signal)
-signal.signal(signal.SIGTERM, handle_signal)
+def install_signal_handlers():
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
 
 def log_debug(message):
     """デバッグログを記録する"""
-    if DEBUG:
+    if config.debug:
         timestamp = datetime.now().isoformat()
-        with open(DEBUG_FILE, 'a', encoding='utf-8') as f:
-            f.write(f"[{timestamp}] {message}\n")
+        sink = sinks.get(config.debug_file)
+        if sink is not None:
+            sink.write(f"[{timestamp}] {message}\n")
+        else:
+            with open(config.debug_file, 'a', encoding='utf-8') as f:
+                f.write(f"[{timestamp}] {message}\n")
         print(f"[DEBUG] {message}")
 
+def open_sink(path):
+    """圧縮出力を作る（ファイル名は path に .zst / .lz4 を付けたもの）"""
+    from compression import CompressedSink
+    stream = next((name for name, stream_path in config.streams.items() if stream_path == path), None)
+    levels = config.compression_levels
+    sink = sinks[path] = CompressedSink(path, config.compression, level=levels.get(stream, levels.get("*")),
+                                        frame_interval=config.frame_interval)
+    return sink
+
+async def flush_sinks_periodically():
+    """
+    書き込みの少ないストリームも frame_interval ごとにフレームを区切ってディスクに出す
+    （バイナリレコードも1件ごとではなくここでまとめて書き出す）
+    """
+    while True:
+        await asyncio.sleep(config.frame_interval)
+        for sink in list(sinks.values()):
+            sink.flush()
+        for writer in list(binary_writers.values()):
+            writer.flush()
+
+def close_sinks():
+    """圧縮出力を閉じ、ストリームごとの圧縮率とCPU時間を表示する"""
+    for name, path in config.streams.items():
+        sink = sinks.pop(path, None)
+        if sink is None:
+            continue
+        sink.close()
+        print(f"圧縮 {name} ({sink.codec} level={sink.level}): {sink.stats}")
+
+def open_binary_writers():
+    """バイナリレコードの出力ファイルを開く（再接続しても同じファイルに追記し続ける）"""
+    if not config.write_binary:
+        return
+    from binary_records import RecordWriter, kind_from_filename
+    depths = {view.name: view.depth for view in config.book_views}
+    for name, path in config.binary_files.items():
+        kind = kind_from_filename(path)
+        if kind == "l2book":
+            binary_writers[name] = RecordWriter(path, kind, config.target_coin, levels=depths[name])
+        else:
+            binary_writers[name] = RecordWriter(path, kind, config.target_coin)
+
+def close_binary_writers():
+    """バッファに残っているレコードを書き出して閉じる"""
+    for writer in binary_writers.values():
+        writer.flush()
+        writer.close()
+    binary_writers.clear()
+
+def open_feature_pipeline():
+    """受信したイベントから特徴量を計算して features_*.csv に書き出す"""
+    global feature_pipeline, feature_writer
+    if config.feature_interval is None:
+        return
+    from features import FeatureConfig, FeaturePipeline, FeatureWriter
+    feature_config = FeatureConfig(interval=config.feature_interval)
+    feature_writer = FeatureWriter(config.features_file, feature_config, autoflush=True)
+    feature_pipeline = FeaturePipeline(feature_config, feature_writer)
+
+def close_feature_pipeline():
+    global feature_pipeline, feature_writer
+    if feature_pipeline is None:
+        return
+    feature_pipeline.flush()
+    feature_writer.close()
+    feature_pipeline = feature_writer = None
+
+def open_merger():
+    global merger
+    if config.connections < 2:
+        return
+    from redundancy import FirstArrivalMerger
+    merger = FirstArrivalMerger(window=config.dedup_window)
+
+def close_merger():
+    """接続ごとの先着率と遅れを表示する"""
+    global merger
+    if merger is None:
+        return
+    print(merger.summary())
+    log_debug(merger.summary())
+    merger = None
+
+async def report_redundancy_periodically():
+    while True:
+        await asyncio.sleep(REDUNDANCY_REPORT_INTERVAL)
+        log_debug(merger.summary())
+
+def _is_first(key, connection, received, repeatable=False):
+    """冗長接続のときに最初のコピーかどうか（単一接続なら常に True）"""
+    if merger is None:
+        return True
+    return merger.first(key, connection, received, repeatable)
+
+def _to_ns(now):
+    from binary_records import timestamp_to_ns
+    return timestamp_to_ns(now)
+
+def _side_code(side):
+    from binary_records import SIDE_CODES, SIDE_UNKNOWN
+    return SIDE_CODES.get(side, SIDE_UNKNOWN)
+
+def write_trade(now, coin, side, px, sz, trade_time, tid):
+    if config.write_csv:
+        append_row(config.trades_file, [now, coin, side, px, sz, trade_time, tid])
+    writer = binary_writers.get("trades")
+    if writer is not None:
+        writer.append(_to_ns(now), int(trade_time), float(px), float(sz), int(tid), _side_code(side))
+    if feature_pipeline is not None:
+        feature_pipeline.on_trade(_to_ns(now), float(px), float(sz), side)
+
+def write_book(now, book_time, bid_prices, bid_sizes, ask_prices, ask_sizes, view=None):
+    view = view or config.book_views[0]
+    if config.write_csv:
+        append_row(config.book_files[view.name], [now] + bid_prices + bid_sizes + ask_prices + ask_sizes)
+    writer = binary_writers.get(view.name)
+    if writer is not None:
+        levels = [float(value) for value in bid_prices + bid_sizes + ask_prices + ask_sizes]
+        writer.append(_to_ns(now), int(book_time), *levels)
+    # 特徴量は最初の設定の板だけから計算する
+    if feature_pipeline is not None and view is config.book_views[0]:
+        feature_pipeline.on_book(_to_ns(now), [float(px) for px in bid_prices], [float(sz) for sz in bid_sizes],
+                                 [float(px) for px in ask_prices], [float(sz) for sz in ask_sizes])
+
+def write_mid(now, coin, mid):
+    if config.write_csv:
+        append_row(config.mids_file, [now, coin, mid])
+    writer = binary_writers.get("mids")
+    if writer is not None:
+        writer.append(_to_ns(now), float(mid))
+
+def write_open_interest(now, coin, open_interest, mark_price):
+    if config.write_csv:
+        append_row(config.oi_file, [now, coin, open_interest, mark_price])
+    writer = binary_writers.get("open_interest")
+    if writer is not None:
+        writer.append(_to_ns(now), float(open_interest), float(mark_price))
+    if feature_pipeline is not None:
+        feature_pipeline.on_open_interest(_to_ns(now), float(open_interest))
+
+def write_header(path, headers):
+    """CSVファイルを作り直してヘッダーを書き込む（時刻インデックスも作り直す）"""
+    if not config.write_csv:
+        return
+    if config.compression:
+        # 圧縮時は再接続してもファイルを作り直さず、フレームだけ区切って追記を続ける
+        # （時刻インデックスは圧縮前のバイト位置なので作らない）
+        sink = sinks.get(path)
+        if sink is not None:
+            sink.flush()
+        else:
+            csv.writer(open_sink(path)).writerow(headers)
+        return
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(headers)
+    if config.index_interval > 0:
+        index = indexes[path] = SparseIndexWriter(path, config.index_interval)
+        index.reset()
+
+def append_row(path, row):
+    """CSVファイルに1行追記する（先頭列の timestamp とバイト位置を時刻インデックスに記録する）"""
+    sink = sinks.get(path)
+    if sink is not None:
+        csv.writer(sink).writerow(row)
+        return
+    with open(path, 'a', newline='') as f:
+        offset = f.tell()
+        writer = csv.writer(f)
+        writer.writerow(row)
+    index = indexes.get(path)
+    if index is not None:
+        index.add(row[0], offset)
+
 async def get_btc_open_interest():
     """HTTP APIを使用してBTCのOpen Interestデータを取得する"""
+    # aiohttp は import に時間がかかるので、実際に取得するときに読み込む
+    import aiohttp
     try:
         async with aiohttp.ClientSession() as session:
             async with session.post(
-                HTTP_URL,
+                config.http_url,
                 json={"type": "metaAndAssetCtxs"},
                 headers={"Content-Type": "application/json"}
             ) as response:
@@ -70,13 +442,20 @@ async def get_btc_open_interest():
                         asset_ctx_data = data[1]
                         
                         # metaデータから銘柄インデックスを取得
+                        # （前回のインデックスが有効ならuniverseを走査しない）
                         btc_index = -1
                         if isinstance(meta_data, dict) and "universe" in meta_data:
                             universe = meta_data.get("universe", [])
-                            for i, item in enumerate(universe):
-                                if isinstance(item, dict) and item.get("name") == TARGET_COIN:
-                                    btc_index = i
-                                    break
+                            cached = coin_index_cache.get(config.target_coin, -1)
+                            if 0 <= cached < len(universe) and isinstance(universe[cached], dict) \
+                                    and universe[cached].get("name") == config.target_coin:
+                                btc_index = cached
+                            else:
+                                for i, item in enumerate(universe):
+                                    if isinstance(item, dict) and item.get("name") == config.target_coin:
+                                        btc_index = i
+                                        coin_index_cache[config.target_coin] = i
+                                        break
                         
                         if btc_index >= 0 and btc_index < len(asset_ctx_data):
                             # BTCのデータを取得
@@ -85,18 +464,18 @@ async def get_btc_open_interest():
                                 open_interest = asset_ctx.get("openInterest", "0")
                                 mark_price = asset_ctx.get("markPx", "0")
                                 return {
-                                    "coin": TARGET_COIN,
+                                    "coin": config.target_coin,
                                     "openInterest": open_interest,
                                     "markPrice": mark_price
                                 }
                         
                         # インデックスが見つからない場合はすべての資産を検索
                         for asset_ctx in asset_ctx_data:
-                            if isinstance(asset_ctx, dict) and asset_ctx.get("coin") == TARGET_COIN:
+                            if isinstance(asset_ctx, dict) and asset_ctx.get("coin") == config.target_coin:
                                 open_interest = asset_ctx.get("openInterest", "0")
                                 mark_price = asset_ctx.get("markPx", "0")
                                 return {
-                                    "coin": TARGET_COIN,
+                                    "coin": config.target_coin,
                                     "openInterest": open_interest,
                                     "markPrice": mark_price
                                 }
@@ -113,67 +492,172 @@ async def get_btc_open_interest():
         log_debug(f"API Request Error: {str(e)}")
         return None
 
-async def subscribe_to_websocket():
-    """ウェブソケットに接続し、必要なトピックをサブスクライブする"""
+def process_message(data, now, view=None, connection="main#0", received=None):
+    """
+    受信したWebSocketメッセージ（json.loads 済み）をチャンネルごとにCSVへ書き込む
+    Args:
+        view (BookView): l2Book をどの設定のストリームに書くか（省略時は最初の設定）
+        connection (str): 受信した接続の名前（冗長接続の集計に使う）
+        received (float): 受信時刻（time.monotonic()、省略時は現在。冗長接続の遅れの計算に使う）
+    """
+    if isinstance(data, dict) and "channel" in data:
+        channel = data.get("channel")
+        channel_data = data.get("data", {})
+
+        if channel == "trades":
+            # トレード情報の処理
+            if isinstance(channel_data, list):
+                log_debug(f"受信したトレード数: {len(channel_data)}")
+                for trade in channel_data:
+                    if isinstance(trade, dict):
+                        coin = trade.get("coin", "unknown")
+                        if coin != config.target_coin:
+                            continue
+
+                        side = trade.get("side", "unknown")
+                        px = trade.get("px", "0")
+                        sz = trade.get("sz", "0")
+                        trade_time = trade.get("time", 0)
+                        tid = trade.get("tid", 0)
+                        # tid 0 も有効な tid なので、tid がないときだけマージしない
+                        if "tid" in trade and not _is_first(("trades", tid), connection, received):
+                            continue
+
+                        log_debug(f"トレード記録: {coin} {side} {px} {sz}")
+                        write_trade(now, coin, side, px, sz, trade_time, tid)
+
+        elif channel == "l2Book":
+            # オーダーブック情報の処理
+            if isinstance(channel_data, dict):
+                coin = channel_data.get("coin", "unknown")
+                if coin != config.target_coin:
+                    return
+
+                levels = channel_data.get("levels", {})
+                view = view or config.book_views[0]
+                depth = view.depth
+                book_time = channel_data.get("time", 0)
+                if book_time and not _is_first((view.name, book_time), connection, received):
+                    return
+
+                if isinstance(levels, list) and len(levels) == 2:
+                    bids = levels[0]  # bidsは最初の配列
+                    asks = levels[1]  # asksは2番目の配列
+
+                    log_debug(f"オーダーブック: {len(bids)}件の買い注文と{len(asks)}件の売り注文")
+
+                    # 上位 depth レベルの情報を取得（存在しない場合は0で埋める）
+                    bid_prices = []
+                    bid_sizes = []
+                    ask_prices = []
+                    ask_sizes = []
+
+                    for i in range(min(depth, len(bids))):
+                        if isinstance(bids[i], dict):
+                            bid_prices.append(bids[i].get("px", "0"))
+                            bid_sizes.append(bids[i].get("sz", "0"))
+                        elif isinstance(bids[i], list) and len(bids[i]) >= 2:
+                            bid_prices.append(bids[i][0])
+                            bid_sizes.append(bids[i][1])
+
+                    for i in range(min(depth, len(asks))):
+                        if isinstance(asks[i], dict):
+                            ask_prices.append(asks[i].get("px", "0"))
+                            ask_sizes.append(asks[i].get("sz", "0"))
+                        elif isinstance(asks[i], list) and len(asks[i]) >= 2:
+                            ask_prices.append(asks[i][0])
+                            ask_sizes.append(asks[i][1])
+
+                    # 不足している場合は0で埋める
+                    bid_prices.extend(["0"] * (depth - len(bid_prices)))
+                    bid_sizes.extend(["0"] * (depth - len(bid_sizes)))
+                    ask_prices.extend(["0"] * (depth - len(ask_prices)))
+                    ask_sizes.extend(["0"] * (depth - len(ask_sizes)))
+
+                    # CSV / バイナリに書き込み
+                    write_book(now, book_time, bid_prices, bid_sizes, ask_prices, ask_sizes, view)
+
+        elif channel == "mids":
+            # 中値情報の処理
+            if isinstance(channel_data, dict):
+                coin = channel_data.get("coin", "unknown")
+                if coin != config.target_coin:
+                    return
+
+                mid = channel_data.get("mid", "0")
+                if not _is_first(("mids", coin, mid), connection, received, repeatable=True):
+                    return
+                log_debug(f"中値記録: {coin} {mid}")
+                write_mid(now, coin, mid)
+
+        elif channel == "allMids":
+            # 全ての中値情報から対象コインだけを処理
+            if isinstance(channel_data, dict) and "mids" in channel_data:
+                mids_dict = channel_data.get("mids", {})
+
+                if config.target_coin in mids_dict:
+                    mid = mids_dict[config.target_coin]
+                    if not _is_first(("mids", config.target_coin, mid), connection, received, repeatable=True):
+                        return
+                    log_debug(f"中値記録: {config.target_coin} {mid}")
+                    write_mid(now, config.target_coin, mid)
+
+def write_headers():
+    """各データファイルのヘッダーを書き込む"""
+    trades_headers = ["timestamp", "coin", "side", "price", "size", "time", "tid"]
+    write_header(config.trades_file, trades_headers)
+
+    write_header(config.book_file, config.book_views[0].headers)
+
+    mids_headers = ["timestamp", "coin", "mid"]
+    write_header(config.mids_file, mids_headers)
+
+    oi_headers = ["timestamp", "coin", "open_interest", "mark_price"]
+    write_header(config.oi_file, oi_headers)
+
+async def subscribe_to_websocket(connection=0):
+    """
+    ウェブソケットに接続し、必要なトピックをサブスクライブする
+    Args:
+        connection (int): 冗長接続の番号（connections が2以上のとき。ヘッダーと Open Interest は main() で扱う）
+    """
+    name = f"main#{connection}"
+    redundant = config.connections > 1
     try:
-        log_debug(f"WebSocket接続開始: {WS_URL}")
+        log_debug(f"WebSocket接続開始: {config.ws_url}" + (f"（{name}）" if redundant else ""))
 
-        # 各データファイルのヘッダーを書き込む
-        trades_headers = ["timestamp", "coin", "side", "price", "size", "time", "tid"]
-        with open(TRADES_FILE, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(trades_headers)
-        
-        book_headers = (
-            ["timestamp"] + 
-            [f"bid_px_{i}" for i in range(1, 6)] + 
-            [f"bid_sz_{i}" for i in range(1, 6)] + 
-            [f"ask_px_{i}" for i in range(1, 6)] + 
-            [f"ask_sz_{i}" for i in range(1, 6)]
-        )
-        with open(BOOK_FILE, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(book_headers)
+        # 各データファイルのヘッダーを書き込む（冗長接続では1つの接続が切れてもファイルを作り直さない）
+        if not redundant:
+            write_headers()
         
-        mids_headers = ["timestamp", "coin", "mid"]
-        with open(MIDS_FILE, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(mids_headers)
-            
-        oi_headers = ["timestamp", "coin", "open_interest", "mark_price"]
-        with open(OI_FILE, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(oi_headers)
+        book_view = config.book_views[0]
 
         # ウェブソケット接続
-        async with websockets.connect(WS_URL) as websocket:
+        async with websockets.connect(config.ws_url) as websocket:
             # トレード情報のサブスクライブ
-            log_debug(f"{TARGET_COIN}トレード情報をサブスクライブ中")
+            log_debug(f"{config.target_coin}トレード情報をサブスクライブ中")
             await websocket.send(json.dumps({
                 "method": "subscribe", 
                 "subscription": {
                     "type": "trades", 
-                    "coin": TARGET_COIN
+                    "coin": config.target_coin
                 }
             }))
             
             # オーダーブック（L2）情報のサブスクライブ
-            log_debug(f"{TARGET_COIN}オーダーブック情報をサブスクライブ中")
+            log_debug(f"{config.target_coin}オーダーブック情報をサブスクライブ中")
             await websocket.send(json.dumps({
                 "method": "subscribe", 
-                "subscription": {
-                    "type": "l2Book", 
-                    "coin": TARGET_COIN
-                }
+                "subscription": book_view.subscription(config.target_coin)
             }))
             
             # BTCの中値情報のサブスクライブ（allMidsの代わりに単一コインの中値を取得）
-            log_debug(f"{TARGET_COIN}中値情報をサブスクライブ中")
+            log_debug(f"{config.target_coin}中値情報をサブスクライブ中")
             await websocket.send(json.dumps({
                 "method": "subscribe", 
                 "subscription": {
                     "type": "mids", 
-                    "coin": TARGET_COIN
+                    "coin": config.target_coin
                 }
             }))
 
@@ -185,13 +669,14 @@ async def subscribe_to_websocket():
             log_debug("WebSocketの受信待機を開始")
             
             # Open Interest情報の初期取得と定期的な更新
-            oi_task = asyncio.create_task(fetch_open_interest_periodically())
+            oi_task = None if redundant else asyncio.create_task(fetch_open_interest_periodically())
             
             global running
             message_count = 0
             while running:
                 try:
                     message = await asyncio.wait_for(websocket.recv(), timeout=10.0)
+                    received = time.monotonic()
                     data = json.loads(message)
                     now = datetime.now().isoformat()
                     message_count += 1
@@ -214,109 +699,13 @@ async def subscribe_to_websocket():
                             log_debug(f"WS Message #{message_count} Type: {type(data)}")
                     
                     # メッセージの形式に応じて処理
-                    if isinstance(data, dict) and "channel" in data:
-                        channel = data.get("channel")
-                        channel_data = data.get("data", {})
-                        
-                        if channel == "trades":
-                            # トレード情報の処理
-                            if isinstance(channel_data, list):
-                                log_debug(f"受信したトレード数: {len(channel_data)}")
-                                for trade in channel_data:
-                                    if isinstance(trade, dict):
-                                        coin = trade.get("coin", "unknown")
-                                        if coin != TARGET_COIN:
-                                            continue
-                                            
-                                        side = trade.get("side", "unknown")
-                                        px = trade.get("px", "0")
-                                        sz = trade.get("sz", "0")
-                                        trade_time = trade.get("time", 0)
-                                        tid = trade.get("tid", 0)
-                                        
-                                        log_debug(f"トレード記録: {coin} {side} {px} {sz}")
-                                        with open(TRADES_FILE, 'a', newline='') as f:
-                                            writer = csv.writer(f)
-                                            writer.writerow([now, coin, side, px, sz, trade_time, tid])
-                        
-                        elif channel == "l2Book":
-                            # オーダーブック情報の処理
-                            if isinstance(channel_data, dict):
-                                coin = channel_data.get("coin", "unknown")
-                                if coin != TARGET_COIN:
-                                    continue
-                                    
-                                levels = channel_data.get("levels", {})
-                                
-                                if isinstance(levels, list) and len(levels) == 2:
-                                    bids = levels[0]  # bidsは最初の配列
-                                    asks = levels[1]  # asksは2番目の配列
-                                    
-                                    log_debug(f"オーダーブック: {len(bids)}件の買い注文と{len(asks)}件の売り注文")
-                                    
-                                    # 上位5レベルの情報を取得（存在しない場合は0で埋める）
-                                    bid_prices = []
-                                    bid_sizes = []
-                                    ask_prices = []
-                                    ask_sizes = []
-                                    
-                                    for i in range(min(5, len(bids))):
-                                        if isinstance(bids[i], dict):
-                                            bid_prices.append(bids[i].get("px", "0"))
-                                            bid_sizes.append(bids[i].get("sz", "0"))
-                                        elif isinstance(bids[i], list) and len(bids[i]) >= 2:
-                                            bid_prices.append(bids[i][0])
-                                            bid_sizes.append(bids[i][1])
-                                    
-                                    for i in range(min(5, len(asks))):
-                                        if isinstance(asks[i], dict):
-                                            ask_prices.append(asks[i].get("px", "0"))
-                                            ask_sizes.append(asks[i].get("sz", "0"))
-                                        elif isinstance(asks[i], list) and len(asks[i]) >= 2:
-                                            ask_prices.append(asks[i][0])
-                                            ask_sizes.append(asks[i][1])
-                                    
-                                    # 不足している場合は0で埋める
-                                    bid_prices.extend(["0"] * (5 - len(bid_prices)))
-                                    bid_sizes.extend(["0"] * (5 - len(bid_sizes)))
-                                    ask_prices.extend(["0"] * (5 - len(ask_prices)))
-                                    ask_sizes.extend(["0"] * (5 - len(ask_sizes)))
-                                    
-                                    # CSVに書き込み
-                                    with open(BOOK_FILE, 'a', newline='') as f:
-                                        writer = csv.writer(f)
-                                        writer.writerow([now] + bid_prices + bid_sizes + ask_prices + ask_sizes)
-                        
-                        elif channel == "mids":
-                            # 中値情報の処理
-                            if isinstance(channel_data, dict):
-                                coin = channel_data.get("coin", "unknown")
-                                if coin != TARGET_COIN:
-                                    continue
-                                    
-                                mid = channel_data.get("mid", "0")
-                                log_debug(f"中値記録: {coin} {mid}")
-                                with open(MIDS_FILE, 'a', newline='') as f:
-                                    writer = csv.writer(f)
-                                    writer.writerow([now, coin, mid])
-                                    
-                        elif channel == "allMids":
-                            # 全ての中値情報から対象コインだけを処理
-                            if isinstance(channel_data, dict) and "mids" in channel_data:
-                                mids_dict = channel_data.get("mids", {})
-                                
-                                if TARGET_COIN in mids_dict:
-                                    mid = mids_dict[TARGET_COIN]
-                                    log_debug(f"中値記録: {TARGET_COIN} {mid}")
-                                    with open(MIDS_FILE, 'a', newline='') as f:
-                                        writer = csv.writer(f)
-                                        writer.writerow([now, TARGET_COIN, mid])
+                    process_message(data, now, connection=name, received=received)
                 
                 except asyncio.TimeoutError:
                     log_debug("WebSocketからの応答タイムアウト。再試行中...")
                     continue
                 except websockets.exceptions.ConnectionClosed:
-                    log_debug("WebSocket接続が閉じられました。再接続します...")
+                    log_debug(f"WebSocket接続が閉じられました（{name}）。再接続します...")
                     break
                 except Exception as e:
                     log_debug(f"ウェブソケット処理中にエラーが発生しました: {str(e)}")
@@ -325,15 +714,53 @@ async def subscribe_to_websocket():
                     await asyncio.sleep(1)  # 再接続前に少し待機
             
             # クリーンアップ
-            oi_task.cancel()
-            try:
-                await oi_task
-            except asyncio.CancelledError:
-                log_debug("Open Interest取得タスクをキャンセルしました")
+            if oi_task is not None:
+                oi_task.cancel()
+                try:
+                    await oi_task
+                except asyncio.CancelledError:
+                    log_debug("Open Interest取得タスクをキャンセルしました")
                 
     except Exception as conn_error:
         log_debug(f"WebSocketへの接続中にエラーが発生しました: {str(conn_error)}")
 
+async def subscribe_book_view(view, connection=0):
+    """
+    2つ目以降の l2Book の設定を別の接続で購読する
+    （l2Book のメッセージには集約の設定が含まれず、同じ接続では設定ごとに区別できないため）
+    """
+    name = f"{view.name}#{connection}"
+    try:
+        if config.connections == 1:
+            write_header(config.book_files[view.name], view.headers)
+        async with websockets.connect(config.ws_url) as websocket:
+            log_debug(f"{config.target_coin}オーダーブック情報をサブスクライブ中: {view}")
+            await websocket.send(json.dumps({
+                "method": "subscribe",
+                "subscription": view.subscription(config.target_coin)
+            }))
+            response = await websocket.recv()
+            log_debug(f"Subscription Response ({view.name}): {response[:200]}")
+
+            while running:
+                try:
+                    message = await asyncio.wait_for(websocket.recv(), timeout=10.0)
+                    received = time.monotonic()
+                    process_message(json.loads(message), datetime.now().isoformat(), view, name, received)
+                except asyncio.TimeoutError:
+                    continue
+                except websockets.exceptions.ConnectionClosed:
+                    log_debug(f"WebSocket接続が閉じられました（{name}）。再接続します...")
+                    break
+                except Exception as e:
+                    log_debug(f"ウェブソケット処理中にエラーが発生しました（{name}）: {str(e)}")
+                    if not running:
+                        break
+                    await asyncio.sleep(1)
+
+    except Exception as conn_error:
+        log_debug(f"WebSocketへの接続中にエラーが発生しました（{name}）: {str(conn_error)}")
+
 async def fetch_open_interest_periodically():
     """定期的にBTCのOpen Interestデータを取得する"""
     try:
@@ -347,17 +774,15 @@ async def fetch_open_interest_periodically():
                 btc_data = await get_btc_open_interest()
                 
                 if btc_data:
-                    coin = btc_data.get("coin", TARGET_COIN)
+                    coin = btc_data.get("coin", config.target_coin)
                     open_interest = btc_data.get("openInterest", "0")
                     mark_price = btc_data.get("markPrice", "0")
                     
                     log_debug(f"Open Interest記録: {coin} {open_interest} {mark_price}")
-                    with open(OI_FILE, 'a', newline='') as f:
-                        writer = csv.writer(f)
-                        writer.writerow([now, coin, open_interest, mark_price])
+                    write_open_interest(now, coin, open_interest, mark_price)
                 
                 # 次の取得までOI_FETCH_INTERVAL秒待機
-                await asyncio.sleep(OI_FETCH_INTERVAL)
+                await asyncio.sleep(config.oi_fetch_interval)
             
             except Exception as e:
                 log_debug(f"Open Interest取得中にエラーが発生しました: {str(e)}")
@@ -371,24 +796,70 @@ async def fetch_open_interest_periodically():
     except Exception as e:
         log_debug(f"BTC Open Interest定期取得タスクでエラーが発生しました: {str(e)}")
 
-async def main():
-    """メイン関数"""
-    print(f"Hyperliquid {TARGET_COIN}データ収集開始: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"トレードデータ: {TRADES_FILE}")
-    print(f"オーダーブックデータ: {BOOK_FILE}")
-    print(f"中値データ: {MIDS_FILE}")
-    print(f"オープンインタレストデータ: {OI_FILE}")
-    print(f"デバッグログ: {DEBUG_FILE}")
-    print("終了するには Ctrl+C を押してください...")
-    
-    # デバッグヘッダーを書き込む
-    with open(DEBUG_FILE, 'w', encoding='utf-8') as f:
-        f.write(f"[{datetime.now().isoformat()}] Hyperliquid {TARGET_COIN}データコレクターデバッグログ開始\n")
-    
+def start_profiler(args):
+    """--profile 指定時のみプロファイラを開始する（profiling.py）"""
+    if args is None or not args.profile:
+        return None
+    from profiling import profiler_from_args
+    if args.profile_dir is None:
+        args.profile_dir = f"{config.output_dir}/profile"
+    profiler = profiler_from_args("collector", args)
+    profiler.watch_event_loop()
+    return profiler
+
+def parse_args(argv=None):
+    from profiling import add_profile_arguments
+
+    parser = argparse.ArgumentParser(description="Hyperliquid データコレクター")
+    parser.add_argument("--coin", default=TARGET_COIN, help="情報収集の対象コイン")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR, help="出力ディレクトリ")
+    parser.add_argument("--oi-interval", type=float, default=OI_FETCH_INTERVAL, help="Open Interest取得間隔（秒）")
+    parser.add_argument("--no-debug", action="store_true", help="デバッグログを出力しない")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default=OUTPUT_FORMAT,
+                        help="出力形式（binary は固定長レコードの .bin ファイル）")
+    parser.add_argument("--compression", choices=CODECS, default=COMPRESSION,
+                        help="CSV とデバッグログを圧縮する（zstd は圧縮率、lz4 はCPU負荷の低さ重視）")
+    parser.add_argument("--compression-level", action="append", default=[], metavar="[STREAM=]LEVEL",
+                        help="圧縮レベル（例: 3 で全ストリーム、l2book=9 でストリームごと。複数指定可）")
+    parser.add_argument("--frame-interval", type=float, default=DEFAULT_FRAME_INTERVAL,
+                        help="圧縮フレームを区切り、バイナリレコードをディスクに書き出す間隔（秒）")
+    parser.add_argument("--book-view", action="append", default=None, metavar="DEPTH[:NSIGFIGS[:MANTISSA]]",
+                        help="l2Book の段数と価格の集約（例: 5、20:3。複数指定すると2つ目以降は別のストリームに保存する）")
+    parser.add_argument("--features", type=float, default=None, metavar="INTERVAL",
+                        help="受信しながら INTERVAL 秒グリッドのマイクロストラクチャー特徴量を計算する")
+    parser.add_argument("--connections", type=int, default=CONNECTIONS,
+                        help="同じ購読を並列に受ける接続の数（2以上で先着のコピーだけを書き込み、接続ごとの先着率と遅れを表示する）")
+    parser.add_argument("--dedup-window", type=float, default=DEDUP_WINDOW,
+                        help="冗長接続の重複を判定するためにキーを覚えておく時間（秒）")
+    add_profile_arguments(parser, profile_dir=None, profile_dir_help="プロファイル結果の出力先（省略時は <output-dir>/profile）")
+    return parser.parse_args(argv)
+
+def parse_compression_levels(values):
+    """["3", "l2book=9"] → {"*": 3, "l2book": 9}（"*" はストリームごとの指定がないもの全て）"""
+    levels = {}
+    for value in values:
+        if "=" in value:
+            stream, level = value.split("=", 1)
+            levels[stream] = int(level)
+        else:
+            levels["*"] = int(value)
+    return levels
+
+def config_from_args(args):
+    return CollectorConfig(output_dir=args.output_dir, target_coin=args.coin,
+                           oi_fetch_interval=args.oi_interval, debug=not args.no_debug,
+                           output_format=args.format, compression=args.compression,
+                           compression_levels=parse_compression_levels(args.compression_level),
+                           frame_interval=args.frame_interval, feature_interval=args.features,
+                           book_views=args.book_view, connections=args.connections,
+                           dedup_window=args.dedup_window)
+
+async def run_with_reconnect(subscribe, *args):
+    """接続が切れたら3秒待って再接続する（running が False になるまで）"""
     while running:
         try:
             # WebSocketタスクを実行
-            await subscribe_to_websocket()
+            await subscribe(*args)
             
             if running:
                 log_debug("接続が切断されました。3秒後に再接続します...")
@@ -398,8 +869,76 @@ async def main():
             if running:
                 log_debug("3秒後に再試行します...")
                 await asyncio.sleep(3)
+
+async def main(collector_config=None, args=None):
+    """
+    メイン関数
+    Args:
+        collector_config (CollectorConfig): 設定（省略時はデフォルト）
+        args (argparse.Namespace): コマンドライン引数（プロファイリングの設定に使う）
+    """
+    configure(collector_config or CollectorConfig())
+    install_signal_handlers()
+    profiler = start_profiler(args)
+    print(f"Hyperliquid {config.target_coin}データ収集開始: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"トレードデータ: {config.trades_file}")
+    for view in config.book_views:
+        print(f"オーダーブックデータ: {config.book_files[view.name]}（{view}）")
+    print(f"中値データ: {config.mids_file}")
+    print(f"オープンインタレストデータ: {config.oi_file}")
+    print(f"デバッグログ: {config.debug_file}")
+    if config.compression:
+        print(f"圧縮: {config.compression}（CSV とデバッグログは拡張子 {EXTENSIONS[config.compression]} を付けて保存）")
+    if config.feature_interval is not None:
+        print(f"特徴量: {config.features_file}（{config.feature_interval}秒グリッド）")
+    if config.write_binary:
+        print(f"バイナリレコード: {', '.join(config.binary_files.values())}")
+    if config.connections > 1:
+        print(f"冗長接続: {config.connections}本（最初に届いたコピーだけを書き込む）")
+    print("終了するには Ctrl+C を押してください...")
+    
+    # デバッグヘッダーを書き込む
+    header = f"[{datetime.now().isoformat()}] Hyperliquid {config.target_coin}データコレクターデバッグログ開始\n"
+    if config.compression:
+        open_sink(config.debug_file).write(header)
+    else:
+        with open(config.debug_file, 'w', encoding='utf-8') as f:
+            f.write(header)
+    
+    open_binary_writers()
+    open_feature_pipeline()
+    open_merger()
+    flush_task = (asyncio.create_task(flush_sinks_periodically())
+                  if config.compression or config.write_binary else None)
+    background = []
+    if config.connections > 1:
+        # 冗長接続ではヘッダーと Open Interest を接続ごとではなく1回だけ扱う
+        write_headers()
+        for view in config.book_views[1:]:
+            write_header(config.book_files[view.name], view.headers)
+        background += [asyncio.create_task(fetch_open_interest_periodically()),
+                       asyncio.create_task(report_redundancy_periodically())]
+    # 2つ目以降の板の設定はそれぞれ別の接続で購読する（冗長接続では設定ごとに connections 本）
+    await asyncio.gather(*(run_with_reconnect(subscribe_to_websocket, i) for i in range(config.connections)),
+                         *(run_with_reconnect(subscribe_book_view, view, i)
+                           for view in config.book_views[1:] for i in range(config.connections)))
     
+    for task in background:
+        task.cancel()
+    close_merger()
+    close_binary_writers()
+    close_feature_pipeline()
+    if flush_task is not None:
+        flush_task.cancel()
+    close_sinks()
+    if profiler is not None:
+        profiler.stop()
     print("データ収集が完了しました。")
 
+def cli(argv=None):
+    """コマンドラインのエントリーポイント"""
+    args = parse_args(argv)
+    asyncio.run(main(config_from_args(args), args))
+
 if __name__ == "__main__":
-    asyncio.run(main()) 
\ No newline at end of file
+    cli()
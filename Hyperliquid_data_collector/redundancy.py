@@ -0,0 +1,175 @@
+import time
+from collections import Counter, deque
+
+import numpy as np
+
+
+# 冗長な WebSocket 接続の先着マージ
+#
+# 同じ購読を複数の接続で受け、同じイベントのうち最初に届いたコピーだけを書き込む。
+# どれか1つの接続が切れたり遅れたりしても、他の接続のコピーで埋まる。
+#
+#   trades   tid をキーにする（再接続直後のスナップショットで同じ接続から再送された約定も除く）
+#   l2Book   板の設定と取引所の時刻（time）をキーにする
+#   mids     時刻がないので銘柄と値をキーにする。値は戻ることがあるので、接続ごとに同じ値の何回目かを
+#            数え、各接続の n 回目どうしを同じイベントとして扱う（repeatable=True）
+#
+# キーは最初のコピーの受信から window 秒で忘れる（それより遅れて届いたコピーは新しいイベントとして書き込まれる）。
+# 接続ごとに「先着した割合」と「最初のコピーからの遅れ」を集計する。
+#
+# 使用例:
+#     merger = FirstArrivalMerger(window=60)
+#     if merger.first(("trades", tid), "main#1"):
+#         write_trade(...)
+#     print(merger.summary())
+
+DEFAULT_WINDOW = 60.0  # 秒
+LAG_SAMPLES = 10_000  # 遅れの分位点を計算する直近のサンプル数
+
+
+class ConnectionStats:
+    """
+    1つの接続の集計
+    Attributes:
+        received (int): 受け取ったイベント数（重複を含む）
+        wins (int): 最初に届いたイベント数
+        late (int): 他の接続より後に届いたイベント数
+        only (int): この接続にしか届かなかったイベント数（忘れたキーの分）
+        lag_sum (float): late の遅れの合計（秒）
+        lags (deque): 直近の遅れ（秒）
+    """
+
+    def __init__(self, samples=LAG_SAMPLES):
+        self.received = 0
+        self.wins = 0
+        self.late = 0
+        self.only = 0
+        self.lag_sum = 0.0
+        self.lags = deque(maxlen=samples)
+
+    def lag_ms(self, q):
+        """直近の遅れの分位点（ミリ秒、遅れて届いたことがなければ None）"""
+        if not self.lags:
+            return None
+        return float(np.percentile(np.fromiter(self.lags, float, len(self.lags)), q)) * 1000
+
+
+class FirstArrivalMerger:
+    """
+    複数の接続から届くイベントの先着マージ
+    Args:
+        window (float): キーを覚えておく時間（秒）
+        samples (int): 接続ごとに遅れの分位点を計算するサンプル数
+    """
+
+    def __init__(self, window=DEFAULT_WINDOW, samples=LAG_SAMPLES):
+        self.window = window
+        self.samples = samples
+        self.connections = {}
+        self.unique = 0
+        self.duplicates = 0
+        # キー → [最初の受信時刻, 最初に届いた接続, 届いた接続の集合]（最初の受信時刻の順）
+        self._seen = {}
+        # (接続, repeatable なキー) → [届いた回数, 最後の受信時刻]（最後の受信時刻の順）
+        self._occurrences = {}
+
+    def stats(self, connection):
+        stats = self.connections.get(connection)
+        if stats is None:
+            stats = self.connections[connection] = ConnectionStats(self.samples)
+        return stats
+
+    def first(self, key, connection, received=None, repeatable=False):
+        """
+        イベントが最初のコピーかどうか
+        Args:
+            key: イベントのキー（("trades", tid) など）
+            connection: 受信した接続の名前
+            received (float): 受信時刻（time.monotonic()、省略時は現在）
+            repeatable (bool): 同じ接続から同じキーが何度も届きうる。接続ごとに何回目かを数え、
+                (キー, 回数) を他の接続の同じ回数のコピーと突き合わせる
+        Returns:
+            bool: 最初のコピーなら True（書き込む）、重複なら False
+        """
+        now = time.monotonic() if received is None else received
+        self._forget(now - self.window)
+        stats = self.stats(connection)
+        stats.received += 1
+        if repeatable:
+            occurrence = self._occurrences.pop((connection, key), None)
+            count = occurrence[0] + 1 if occurrence is not None else 1
+            self._occurrences[(connection, key)] = [count, now]
+            key = (key, count)
+        entry = self._seen.get(key)
+        if entry is None:
+            self._seen[key] = [now, connection, {connection}]
+            stats.wins += 1
+            self.unique += 1
+            return True
+        self.duplicates += 1
+        if connection not in entry[2]:
+            entry[2].add(connection)
+            lag = now - entry[0]
+            stats.late += 1
+            stats.lag_sum += lag
+            stats.lags.append(lag)
+        return False
+
+    def _forget(self, limit):
+        seen = self._seen
+        while seen:
+            key = next(iter(seen))
+            if seen[key][0] >= limit:
+                break
+            self._retire(seen.pop(key))
+        occurrences = self._occurrences
+        while occurrences:
+            key = next(iter(occurrences))
+            if occurrences[key][1] >= limit:
+                break
+            del occurrences[key]
+
+    def _retire(self, entry):
+        if len(entry[2]) == 1:
+            self.stats(entry[1]).only += 1
+
+    def report(self):
+        """
+        接続ごとの集計
+        Returns:
+            list: 接続ごとの dict（connection, received, wins, win_rate: 届いたイベントのうち先着した割合,
+                late, mean_lag_ms / p50_lag_ms / p99_lag_ms: 遅れて届いたときの最初のコピーからの遅れ,
+                mean_delta_ms: 届いたイベント全体での平均の遅れ（先着は0）, only）
+        """
+        # まだ覚えているキーのうち1つの接続にしか届いていないもの
+        pending = Counter(entry[1] for entry in self._seen.values() if len(entry[2]) == 1)
+        rows = []
+        for connection, stats in sorted(self.connections.items()):
+            delivered = stats.wins + stats.late
+            rows.append({
+                "connection": connection,
+                "received": stats.received,
+                "wins": stats.wins,
+                "win_rate": stats.wins / delivered if delivered else 0.0,
+                "late": stats.late,
+                "mean_lag_ms": stats.lag_sum / stats.late * 1000 if stats.late else None,
+                "p50_lag_ms": stats.lag_ms(50),
+                "p99_lag_ms": stats.lag_ms(99),
+                "mean_delta_ms": stats.lag_sum / delivered * 1000 if delivered else None,
+                "only": stats.only + pending[connection],
+            })
+        return rows
+
+    def summary(self):
+        """report() を表示用の文字列にする"""
+        def ms(value):
+            return "-" if value is None else f"+{value:.1f}ms"
+
+        lines = [f"冗長接続: イベント {self.unique}, 除いた重複 {self.duplicates}"]
+        for row in self.report():
+            lines.append(
+                f"  {row['connection']}: 受信 {row['received']}, 先着 {row['wins']} ({row['win_rate']:.1%}), "
+                f"遅着 {row['late']} (平均 {ms(row['mean_lag_ms'])}, p50 {ms(row['p50_lag_ms'])}, "
+                f"p99 {ms(row['p99_lag_ms'])}), 平均の遅れ {ms(row['mean_delta_ms'])}, 単独 {row['only']}"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+import argparse
+import bisect
+import csv
+import glob
+import heapq
+import sys
+from datetime import datetime
+
+
+# CSV の疎な時刻インデックス（サイドカーファイル）と時間範囲の読み出し
+#
+# コレクターは N 行ごとに「その行の timestamp と、行の先頭のバイト位置」を
+# <CSVファイル名>.idx に追記する。読み出し時はインデックスを二分探索して
+# 範囲の直前の位置まで seek し、範囲内の行だけを読む（ファイルサイズに関係なく
+# 読む量は「範囲内の行 + 最大 N 行」）。
+#
+# timestamp 列は datetime.isoformat() の文字列なので、文字列のまま大小比較する。
+#
+# 使用例:
+#     from time_index import read_range, load_range
+#     for row in read_range("data/l2book_*.csv", "2024-05-01T12:00", "2024-05-01T12:10"):
+#         ...
+#     df = load_range("data/trades_*.csv", start, end, coin="BTC")
+#
+# 既存の CSV にインデックスを作る:
+#     python time_index.py build data/*.csv
+
+INDEX_SUFFIX = ".idx"
+DEFAULT_INTERVAL = 1000  # 何行ごとにインデックスを打つか
+INDEX_HEADER = "timestamp,offset,row\n"
+
+
+def index_path(path):
+    return path + INDEX_SUFFIX
+
+
+def _to_key(value):
+    """datetime / pandas.Timestamp / 文字列を timestamp 列と比較できる文字列にする"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return value
+    if isinstance(value, datetime) or hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"時刻として扱えない値です: {value!r}")
+
+
+class SparseIndexWriter:
+    """
+    CSV への追記に合わせて疎なインデックスを書き出す
+    Args:
+        path (str): インデックス対象の CSV ファイル
+        interval (int): 何行ごとにインデックスを打つか
+    """
+
+    def __init__(self, path, interval=DEFAULT_INTERVAL):
+        self.path = index_path(path)
+        self.interval = interval
+        self.rows = 0
+
+    def reset(self):
+        """CSV を作り直したときに呼ぶ（インデックスも空にする）"""
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(INDEX_HEADER)
+        self.rows = 0
+
+    def add(self, timestamp, offset):
+        """
+        1行追記するたびに呼ぶ
+        Args:
+            timestamp (str): 追記した行の timestamp 列
+            offset (int): 追記した行の先頭のバイト位置
+        """
+        if self.rows % self.interval == 0:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(f"{timestamp},{offset},{self.rows}\n")
+        self.rows += 1
+
+
+def build_index(path, interval=DEFAULT_INTERVAL):
+    """
+    既存の CSV を1回走査してインデックスを作る
+    Returns:
+        int: CSV のデータ行数
+    """
+    writer = SparseIndexWriter(path, interval)
+    writer.reset()
+    with open(path, "rb") as f:
+        f.readline()  # ヘッダー
+        offset = f.tell()
+        for line in f:
+            writer.add(line.split(b",", 1)[0].decode(), offset)
+            offset += len(line)
+    return writer.rows
+
+
+def load_index(path):
+    """
+    インデックスを読み込む（なければ空）
+    Returns:
+        tuple: (timestamp のリスト, バイト位置のリスト)
+    """
+    timestamps, offsets = [], []
+    try:
+        with open(index_path(path), encoding="utf-8") as f:
+            f.readline()
+            for line in f:
+                timestamp, offset, _ = line.rstrip("\n").split(",")
+                timestamps.append(timestamp)
+                offsets.append(int(offset))
+    except FileNotFoundError:
+        pass
+    return timestamps, offsets
+
+
+def _expand(paths):
+    if isinstance(paths, str):
+        paths = [paths]
+    files = []
+    for pattern in paths:
+        matched = sorted(glob.glob(pattern))
+        files.extend(matched if matched else [pattern])
+    return [path for path in files if not path.endswith(INDEX_SUFFIX)]
+
+
+def _first_timestamp(path, timestamps):
+    if timestamps:
+        return timestamps[0]
+    with open(path, "rb") as f:
+        f.readline()
+        line = f.readline()
+    return line.split(b",", 1)[0].decode() if line else ""
+
+
+def iter_file_range(path, start=None, end=None, timestamps=None, offsets=None):
+    """
+    1ファイルから start <= timestamp < end の行を読む
+    Args:
+        path (str): CSV ファイル
+        start, end: 範囲（None なら先頭 / 末尾まで）
+        timestamps, offsets: load_index の結果（省略時は読み込む）
+    Yields:
+        list: CSV の1行
+    """
+    start, end = _to_key(start), _to_key(end)
+    if timestamps is None:
+        timestamps, offsets = load_index(path)
+    with open(path, "rb") as f:
+        f.readline()  # ヘッダー
+        if start is not None:
+            # start より前のインデックスのうち最後のもの（同じ timestamp の行がそれより前にないことが保証される）
+            i = bisect.bisect_left(timestamps, start) - 1
+            if i >= 0:
+                f.seek(offsets[i])
+        for line in f:
+            timestamp = line.split(b",", 1)[0].decode()
+            if start is not None and timestamp < start:
+                continue
+            if end is not None and timestamp >= end:
+                break
+            yield next(csv.reader([line.decode("utf-8")]))
+
+
+def read_header(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return next(csv.reader(f), [])
+
+
+def read_range(paths, start=None, end=None, coin=None):
+    """
+    複数ファイル（ローテーションされたファイルや銘柄ごとのファイル）から時間範囲の行を読む
+    Args:
+        paths (str or list): ファイルパスまたは glob パターン
+        start, end: 範囲（start <= timestamp < end）
+        coin (str): coin 列があるファイルではこの銘柄の行だけを返す
+    Yields:
+        list: CSV の1行（ファイルをまたいで timestamp の順。同じ timestamp は先頭が古いファイルから）
+    """
+    end_key = _to_key(end)
+    files = []
+    for path in _expand(paths):
+        timestamps, offsets = load_index(path)
+        first = _first_timestamp(path, timestamps)
+        # 範囲より後に始まるファイルは開かない
+        if end_key is not None and first and first >= end_key:
+            continue
+        files.append((first, path, timestamps, offsets))
+    files.sort()
+
+    def file_rows(path, timestamps, offsets):
+        coin_column = None
+        if coin is not None:
+            header = read_header(path)
+            coin_column = header.index("coin") if "coin" in header else None
+        for row in iter_file_range(path, start, end, timestamps, offsets):
+            if coin_column is not None and row[coin_column] != coin:
+                continue
+            yield row
+
+    # 銘柄ごとのファイルや期間が重なるファイルがあるので、ファイルごとの行を timestamp で併合する
+    yield from heapq.merge(*(file_rows(path, timestamps, offsets) for _, path, timestamps, offsets in files),
+                           key=lambda row: row[0])
+
+
+def load_range(paths, start=None, end=None, coin=None):
+    """
+    read_range の結果を DataFrame にする（列名は最初のファイルのヘッダー）
+    Returns:
+        pd.DataFrame: 範囲内の行（timestamp 以外は文字列のまま）
+    """
+    import pandas as pd
+
+    files = _expand(paths)
+    columns = read_header(files[0]) if files else []
+    return pd.DataFrame(list(read_range(files, start, end, coin)), columns=columns or None)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="コレクター出力の時刻インデックス")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="既存の CSV にインデックスを作る")
+    build.add_argument("paths", nargs="+")
+    build.add_argument("--interval", type=int, default=DEFAULT_INTERVAL)
+
+    query = subparsers.add_parser("query", help="時間範囲の行を CSV で出力する")
+    query.add_argument("paths", nargs="+")
+    query.add_argument("--start")
+    query.add_argument("--end")
+    query.add_argument("--coin")
+
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        for path in _expand(args.paths):
+            rows = build_index(path, args.interval)
+            print(f"{index_path(path)}: {rows} 行")
+    else:
+        files = _expand(args.paths)
+        writer = csv.writer(sys.stdout)
+        if files:
+            writer.writerow(read_header(files[0]))
+        for row in read_range(files, args.start, args.end, args.coin):
+            writer.writerow(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,482 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+
+from aiohttp import web, WSMsgType
+
+
+# Hyperliquid API のローカル代替サーバー（負荷試験用）
+#
+# /info, /exchange, /ws を1プロセスで提供する。価格はランダムウォークで生成し、
+# 各 WebSocket チャンネルは指定したメッセージレートで配信する。
+# 署名は検証しないので、本番の秘密鍵を使う必要はない。
+
+DEFAULT_COINS = ["BTC", "ETH", "XRP"]
+INITIAL_PRICES = {"BTC": 60000.0, "ETH": 3000.0, "XRP": 2.7}
+SZ_DECIMALS = {"BTC": 5, "ETH": 4, "XRP": 0}
+BOOK_LEVELS = 20
+SPREAD_BPS = 1.0
+# 署名からアドレスを復元しないので、ユーザーチャンネルはすべて同じ口座として扱う
+USER_CHANNELS = {"orderUpdates", "userFills", "userEvents"}
+INTERVAL_MS = {
+    "1m": 60_000, "3m": 180_000, "5m": 300_000, "15m": 900_000, "30m": 1_800_000,
+    "1h": 3_600_000, "2h": 7_200_000, "4h": 14_400_000, "8h": 28_800_000,
+    "12h": 43_200_000, "1d": 86_400_000,
+}
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def fmt(value, decimals=6):
+    return f"{value:.{decimals}f}".rstrip("0").rstrip(".")
+
+
+class Market:
+    """1銘柄の価格（ランダムウォーク）と合成オーダーブック"""
+
+    def __init__(self, coin, price):
+        self.coin = coin
+        self.mid = price
+        self.open_interest = 1000.0
+        self.volatility = price * 0.0002
+        self.candle = None
+
+    def step(self):
+        self.mid = max(self.mid + random.gauss(0, self.volatility), self.mid * 0.5)
+        self.open_interest = max(self.open_interest + random.gauss(0, 1.0), 0.0)
+        return self.mid
+
+    @property
+    def best_bid(self):
+        return self.mid * (1 - SPREAD_BPS / 20000)
+
+    @property
+    def best_ask(self):
+        return self.mid * (1 + SPREAD_BPS / 20000)
+
+    def levels(self, n=BOOK_LEVELS, n_sig_figs=None, mantissa=None):
+        """nSigFigs / mantissa を指定すると、価格を有効桁数で丸めた刻みに集約した板を返す"""
+        tick = self.mid * SPREAD_BPS / 10000
+        best_bid, best_ask = self.best_bid, self.best_ask
+        scale = 1.0
+        if n_sig_figs is not None:
+            bucket = 10 ** (math.floor(math.log10(self.mid)) - n_sig_figs + 1) * (mantissa or 1)
+            if bucket > tick:
+                # 1段に集約される元の段数の分だけ数量を大きくする
+                scale = bucket / tick
+                tick = bucket
+                best_bid = math.floor(best_bid / bucket) * bucket
+                best_ask = math.ceil(best_ask / bucket) * bucket
+        bids = [{"px": fmt(best_bid - i * tick), "sz": fmt(random.uniform(0.1, 5) * scale, 4),
+                 "n": random.randint(1, 10)} for i in range(n)]
+        asks = [{"px": fmt(best_ask + i * tick), "sz": fmt(random.uniform(0.1, 5) * scale, 4),
+                 "n": random.randint(1, 10)} for i in range(n)]
+        return [bids, asks]
+
+    def update_candle(self, interval, px, sz):
+        start = now_ms() // INTERVAL_MS[interval] * INTERVAL_MS[interval]
+        if self.candle is None or self.candle["t"] != start:
+            self.candle = {"t": start, "T": start + INTERVAL_MS[interval] - 1, "s": self.coin, "i": interval,
+                           "o": px, "h": px, "l": px, "c": px, "v": 0.0, "n": 0}
+        candle = self.candle
+        candle["h"] = max(candle["h"], px)
+        candle["l"] = min(candle["l"], px)
+        candle["c"] = px
+        candle["v"] += sz
+        candle["n"] += 1
+        return {k: fmt(v) if isinstance(v, float) else v for k, v in candle.items()}
+
+
+class MatchingEngine:
+    """
+    ユーザー注文の簡易マッチングエンジン
+    合成オーダーブックの最良気配と交差すれば即時約定、しなければ板に残す（Gtc / Alo）か
+    キャンセル（Ioc）する。板に残った注文は価格が到達した時点で約定する。
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self.next_oid = 1
+        self.next_tid = 1
+        self.resting = {}    # oid -> order
+        self.positions = {}  # coin -> (szi, entry_px)
+        self.fills = []
+
+    def _fill(self, user, order, px):
+        coin = order["coin"]
+        signed = order["sz"] if order["is_buy"] else -order["sz"]
+        szi, entry_px = self.positions.get(coin, (0.0, 0.0))
+        new_szi = szi + signed
+        if szi == 0 or (szi > 0) == (signed > 0):
+            entry_px = (abs(szi) * entry_px + abs(signed) * px) / abs(new_szi) if new_szi else 0.0
+        elif (new_szi > 0) != (szi > 0) and new_szi != 0:
+            entry_px = px
+        self.positions[coin] = (new_szi, entry_px if new_szi else 0.0)
+
+        fill = {
+            "coin": coin, "px": fmt(px), "sz": fmt(order["sz"]), "side": "B" if order["is_buy"] else "A",
+            "time": now_ms(), "startPosition": fmt(szi), "dir": "Open Long" if order["is_buy"] else "Open Short",
+            "closedPnl": "0.0", "hash": f"0x{self.next_tid:064x}", "oid": order["oid"], "crossed": True,
+            "fee": "0.0", "tid": self.next_tid, "feeToken": "USDC",
+        }
+        self.next_tid += 1
+        self.fills.append(fill)
+        self.server.publish_user(user, "userFills", {"isSnapshot": False, "user": user, "fills": [fill]})
+        self.server.publish_user(user, "orderUpdates", [self._order_update(order, "filled")])
+        self.server.publish_trade(coin, px, order["sz"], order["is_buy"], fill["tid"])
+        return fill
+
+    def _order_update(self, order, status):
+        return {
+            "order": {"coin": order["coin"], "side": "B" if order["is_buy"] else "A",
+                      "limitPx": fmt(order["limit_px"]), "sz": fmt(order["sz"]), "oid": order["oid"],
+                      "timestamp": order["timestamp"], "origSz": fmt(order["sz"])},
+            "status": status,
+            "statusTimestamp": now_ms(),
+        }
+
+    def place(self, user, wire):
+        coin = self.server.asset_to_coin.get(wire["a"])
+        if coin is None:
+            return {"error": f"Unknown asset {wire['a']}"}
+        order = {
+            "coin": coin, "is_buy": wire["b"], "limit_px": float(wire["p"]), "sz": float(wire["s"]),
+            "tif": wire.get("t", {}).get("limit", {}).get("tif", "Gtc"), "oid": self.next_oid,
+            "timestamp": now_ms(), "user": user,
+        }
+        self.next_oid += 1
+        market = self.server.markets[coin]
+        touch = market.best_ask if order["is_buy"] else market.best_bid
+        crosses = order["limit_px"] >= touch if order["is_buy"] else order["limit_px"] <= touch
+
+        if crosses:
+            if order["tif"] == "Alo":
+                return {"error": "Post only order would have immediately matched"}
+            self._fill(user, order, touch)
+            return {"filled": {"totalSz": fmt(order["sz"]), "avgPx": fmt(touch), "oid": order["oid"]}}
+        if order["tif"] == "Ioc":
+            return {"error": "Order could not immediately match against any resting orders."}
+        self.resting[order["oid"]] = order
+        self.server.publish_user(user, "orderUpdates", [self._order_update(order, "open")])
+        return {"resting": {"oid": order["oid"]}}
+
+    def cancel(self, user, cancel):
+        order = self.resting.pop(cancel["o"], None)
+        if order is None:
+            return {"error": "Order was never placed, already canceled, or filled."}
+        self.server.publish_user(user, "orderUpdates", [self._order_update(order, "canceled")])
+        return "success"
+
+    def on_price(self, coin, market):
+        """価格更新時に、到達した板上の注文を約定させる"""
+        for oid, order in list(self.resting.items()):
+            if order["coin"] != coin:
+                continue
+            if (order["is_buy"] and market.best_ask <= order["limit_px"]) or \
+                    (not order["is_buy"] and market.best_bid >= order["limit_px"]):
+                del self.resting[oid]
+                self._fill(order["user"], order, order["limit_px"])
+
+
+class MockServer:
+    """
+    /info, /exchange, /ws を提供するモックサーバー
+    Args:
+        coins (list[str]): 扱う銘柄
+        rates (dict): チャンネルごとの1秒あたりのメッセージ数（trades, l2Book, allMids, candle）
+        speed (float): 全レートに掛ける倍率（10なら本番の10倍）
+        candle_interval (str): candle チャンネルの足の間隔
+    """
+
+    def __init__(self, coins, rates, speed=1.0, candle_interval="1m"):
+        self.coins = coins
+        self.rates = {channel: rate * speed for channel, rate in rates.items()}
+        self.candle_interval = candle_interval
+        self.markets = {coin: Market(coin, INITIAL_PRICES.get(coin, 100.0)) for coin in coins}
+        self.asset_to_coin = dict(enumerate(coins))
+        self.engine = MatchingEngine(self)
+        self.subscribers = {}  # (type, coin) -> set of websockets（l2Book は (type, coin, nSigFigs, mantissa)）
+        self.queues = {}       # websocket -> 送信待ちのメッセージ（接続ごとに1つの送信タスクが順に送る）
+        self.stats = {"messages_sent": 0, "messages_dropped": 0, "info_requests": 0,
+                      "exchange_requests": 0, "connections": 0}
+        self.max_queue = 10000  # 接続ごとの送信待ちの上限（超えた分は捨てる）
+
+    # --- WebSocket 配信 ---
+    def _send(self, key, channel, data):
+        clients = self.subscribers.get(key)
+        if not clients:
+            return
+        message = json.dumps({"channel": channel, "data": data})
+        for ws in list(clients):
+            queue = self.queues.get(ws)
+            # 受信側が追いつかない場合は送信待ちが溢れる前に捨てて数える
+            if queue is None or queue.qsize() >= self.max_queue:
+                self.stats["messages_dropped"] += 1
+                continue
+            queue.put_nowait(message)
+            self.stats["messages_sent"] += 1
+
+    async def _writer(self, ws, queue):
+        """接続の送信待ちを順に送る（送信に失敗したら接続が閉じたものとして終わる）"""
+        while True:
+            message = await queue.get()
+            try:
+                await ws.send_str(message)
+            except (ConnectionError, RuntimeError):
+                return
+
+    def publish_user(self, user, channel, data):
+        self._send((channel, None), channel, data)
+
+    def publish_trade(self, coin, px, sz, is_buy, tid):
+        trade = {"coin": coin, "side": "B" if is_buy else "A", "px": fmt(px), "sz": fmt(sz, 5),
+                 "hash": f"0x{tid:064x}", "time": now_ms(), "tid": tid, "users": ["0x0", "0x0"]}
+        self._send(("trades", coin), "trades", [trade])
+        candle = self.markets[coin].update_candle(self.candle_interval, px, sz)
+        self._send(("candle", coin), "candle", candle)
+
+    def _tick_trades(self):
+        for coin, market in self.markets.items():
+            px = market.step()
+            sz = round(random.expovariate(10), SZ_DECIMALS.get(coin, 2)) or 10 ** -SZ_DECIMALS.get(coin, 2)
+            tid = self.engine.next_tid
+            self.engine.next_tid += 1
+            self.publish_trade(coin, px, sz, random.random() < 0.5, tid)
+            self.engine.on_price(coin, market)
+
+    def _tick_book(self):
+        # 集約の設定（nSigFigs, mantissa）ごとに購読者がいる分だけ板を作る
+        for key in [key for key in self.subscribers if key[0] == "l2Book"]:
+            _, coin, n_sig_figs, mantissa = key
+            market = self.markets.get(coin)
+            if market is not None:
+                self._send(key, "l2Book", {"coin": coin, "time": now_ms(),
+                                           "levels": market.levels(n_sig_figs=n_sig_figs, mantissa=mantissa)})
+
+    def _tick_mids(self):
+        mids = {coin: fmt(market.mid) for coin, market in self.markets.items()}
+        self._send(("allMids", None), "allMids", {"mids": mids})
+
+    def _tick_candle(self):
+        for coin, market in self.markets.items():
+            if market.candle is not None:
+                candle = {k: fmt(v) if isinstance(v, float) else v for k, v in market.candle.items()}
+                self._send(("candle", coin), "candle", candle)
+
+    async def _publisher(self, rate, tick):
+        """rate 回/秒で tick を呼ぶ（1ms 未満の間隔は1回のループでまとめて呼ぶ）"""
+        if rate <= 0:
+            return
+        interval = 1.0 / rate
+        next_time = time.monotonic()
+        while True:
+            now = time.monotonic()
+            while next_time <= now:
+                tick()
+                next_time += interval
+            await asyncio.sleep(max(next_time - time.monotonic(), 0.001))
+
+    async def _report_stats(self):
+        last = dict(self.stats)
+        while True:
+            await asyncio.sleep(1)
+            sent = self.stats["messages_sent"] - last["messages_sent"]
+            dropped = self.stats["messages_dropped"] - last["messages_dropped"]
+            print(f"[mock] {sent} msg/s sent, {dropped} dropped, {self.stats['connections']} connections")
+            last = dict(self.stats)
+
+    # --- HTTP ハンドラ ---
+    def _meta(self):
+        return {"universe": [{"name": coin, "szDecimals": SZ_DECIMALS.get(coin, 2), "maxLeverage": 50}
+                             for coin in self.coins]}
+
+    def _spot_meta(self):
+        return {"tokens": [{"name": "USDC", "szDecimals": 8, "weiDecimals": 8, "index": 0}],
+                "universe": []}
+
+    def _asset_ctxs(self):
+        return [{"coin": coin, "openInterest": fmt(m.open_interest), "markPx": fmt(m.mid),
+                 "midPx": fmt(m.mid), "oraclePx": fmt(m.mid), "funding": "0.0000125"}
+                for coin, m in self.markets.items()]
+
+    def _candle_snapshot(self, req):
+        coin, interval = req["coin"], req["interval"]
+        step = INTERVAL_MS[interval]
+        start = req["startTime"] // step * step
+        end = min(req.get("endTime") or now_ms(), now_ms())
+        # 同じリクエストには同じデータを返す
+        rng = random.Random(f"{coin}-{interval}-{start}")
+        px = INITIAL_PRICES.get(coin, 100.0)
+        candles = []
+        for t in range(start, end, step):
+            o = px
+            c = max(o + rng.gauss(0, o * 0.002), o * 0.5)
+            h = max(o, c) * (1 + abs(rng.gauss(0, 0.001)))
+            low = min(o, c) * (1 - abs(rng.gauss(0, 0.001)))
+            candles.append({"t": t, "T": t + step - 1, "s": coin, "i": interval, "o": fmt(o), "c": fmt(c),
+                            "h": fmt(h), "l": fmt(low), "v": fmt(rng.uniform(1, 100)), "n": rng.randint(10, 1000)})
+            px = c
+        return candles[-5000:]
+
+    def _clearinghouse_state(self):
+        positions = []
+        for coin, (szi, entry_px) in self.engine.positions.items():
+            if szi == 0:
+                continue
+            mid = self.markets[coin].mid
+            positions.append({"type": "oneWay", "position": {
+                "coin": coin, "szi": fmt(szi), "entryPx": fmt(entry_px),
+                "positionValue": fmt(abs(szi) * mid), "unrealizedPnl": fmt((mid - entry_px) * szi),
+                "leverage": {"type": "cross", "value": 20}, "marginUsed": fmt(abs(szi) * mid / 20)}})
+        return {"assetPositions": positions,
+                "marginSummary": {"accountValue": "100000.0", "totalNtlPos": "0.0", "totalRawUsd": "100000.0",
+                                  "totalMarginUsed": "0.0"},
+                "crossMarginSummary": {"accountValue": "100000.0", "totalNtlPos": "0.0",
+                                       "totalRawUsd": "100000.0", "totalMarginUsed": "0.0"},
+                "withdrawable": "100000.0", "time": now_ms()}
+
+    def _open_orders(self):
+        return [{"coin": o["coin"], "side": "B" if o["is_buy"] else "A", "limitPx": fmt(o["limit_px"]),
+                 "sz": fmt(o["sz"]), "oid": o["oid"], "timestamp": o["timestamp"], "origSz": fmt(o["sz"])}
+                for o in self.engine.resting.values()]
+
+    async def handle_info(self, request):
+        self.stats["info_requests"] += 1
+        payload = await request.json()
+        kind = payload.get("type")
+        if kind == "metaAndAssetCtxs":
+            result = [self._meta(), self._asset_ctxs()]
+        elif kind == "meta":
+            result = self._meta()
+        elif kind == "spotMeta":
+            result = self._spot_meta()
+        elif kind == "allMids":
+            result = {coin: fmt(m.mid) for coin, m in self.markets.items()}
+        elif kind == "l2Book":
+            market = self.markets[payload["coin"]]
+            result = {"coin": market.coin, "time": now_ms(),
+                      "levels": market.levels(n_sig_figs=payload.get("nSigFigs"), mantissa=payload.get("mantissa"))}
+        elif kind == "candleSnapshot":
+            result = self._candle_snapshot(payload["req"])
+        elif kind == "clearinghouseState":
+            result = self._clearinghouse_state()
+        elif kind == "spotClearinghouseState":
+            result = {"balances": [{"coin": "USDC", "token": 0, "hold": "0.0", "total": "100000.0"}]}
+        elif kind in ("openOrders", "frontendOpenOrders"):
+            result = self._open_orders()
+        elif kind == "orderStatus":
+            order = self.engine.resting.get(payload["oid"])
+            result = {"status": "order", "order": {"status": "open"}} if order else {"status": "unknownOid"}
+        else:
+            return web.json_response({"error": f"unsupported info type {kind}"}, status=422)
+        return web.json_response(result)
+
+    async def handle_exchange(self, request):
+        self.stats["exchange_requests"] += 1
+        payload = await request.json()
+        action = payload.get("action", {})
+        user = payload.get("vaultAddress")
+        if action.get("type") == "order":
+            statuses = [self.engine.place(user, wire) for wire in action.get("orders", [])]
+            return web.json_response({"status": "ok", "response": {"type": "order", "data": {"statuses": statuses}}})
+        if action.get("type") == "cancel":
+            statuses = [self.engine.cancel(user, cancel) for cancel in action.get("cancels", [])]
+            return web.json_response({"status": "ok", "response": {"type": "cancel", "data": {"statuses": statuses}}})
+        return web.json_response({"status": "err", "response": f"unsupported action {action.get('type')}"})
+
+    async def handle_stats(self, request):
+        return web.json_response(self.stats)
+
+    async def handle_ws(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.stats["connections"] += 1
+        queue = self.queues[ws] = asyncio.Queue()
+        writer = asyncio.create_task(self._writer(ws, queue))
+        keys = set()
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                data = json.loads(msg.data)
+                method = data.get("method")
+                if method == "ping":
+                    queue.put_nowait(json.dumps({"channel": "pong"}))
+                    continue
+                subscription = data.get("subscription", {})
+                kind = subscription.get("type")
+                key = (kind, None if kind in USER_CHANNELS else subscription.get("coin"))
+                if kind == "l2Book":
+                    key += (subscription.get("nSigFigs"), subscription.get("mantissa"))
+                if method == "subscribe":
+                    self.subscribers.setdefault(key, set()).add(ws)
+                    keys.add(key)
+                elif method == "unsubscribe":
+                    self.subscribers.get(key, set()).discard(ws)
+                    keys.discard(key)
+                queue.put_nowait(json.dumps({"channel": "subscriptionResponse", "data": data}))
+        finally:
+            for key in keys:
+                self.subscribers.get(key, set()).discard(ws)
+            self.queues.pop(ws, None)
+            writer.cancel()
+            await asyncio.gather(writer, return_exceptions=True)
+            self.stats["connections"] -= 1
+        return ws
+
+    async def start_background(self, app):
+        app["tasks"] = [
+            asyncio.create_task(self._publisher(self.rates.get("trades", 0), self._tick_trades)),
+            asyncio.create_task(self._publisher(self.rates.get("l2Book", 0), self._tick_book)),
+            asyncio.create_task(self._publisher(self.rates.get("allMids", 0), self._tick_mids)),
+            asyncio.create_task(self._publisher(self.rates.get("candle", 0), self._tick_candle)),
+            asyncio.create_task(self._report_stats()),
+        ]
+
+    async def stop_background(self, app):
+        for task in app["tasks"]:
+            task.cancel()
+
+    def make_app(self):
+        app = web.Application()
+        app.router.add_post("/info", self.handle_info)
+        app.router.add_post("/exchange", self.handle_exchange)
+        app.router.add_get("/ws", self.handle_ws)
+        app.router.add_get("/stats", self.handle_stats)
+        app.on_startup.append(self.start_background)
+        app.on_cleanup.append(self.stop_background)
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hyperliquid API のローカルモックサーバー")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--coins", default=",".join(DEFAULT_COINS), help="カンマ区切りの銘柄")
+    parser.add_argument("--trades-rate", type=float, default=10.0, help="trades の配信回数/秒（銘柄ごと）")
+    parser.add_argument("--book-rate", type=float, default=2.0, help="l2Book の配信回数/秒（銘柄ごと）")
+    parser.add_argument("--mids-rate", type=float, default=1.0, help="allMids の配信回数/秒")
+    parser.add_argument("--candle-rate", type=float, default=1.0, help="candle の配信回数/秒（銘柄ごと）")
+    parser.add_argument("--speed", type=float, default=1.0, help="全レートに掛ける倍率（10〜100倍で負荷試験）")
+    parser.add_argument("--candle-interval", default="1m")
+    args = parser.parse_args()
+
+    server = MockServer(
+        coins=args.coins.split(","),
+        rates={"trades": args.trades_rate, "l2Book": args.book_rate,
+               "allMids": args.mids_rate, "candle": args.candle_rate},
+        speed=args.speed,
+        candle_interval=args.candle_interval,
+    )
+    print(f"Mock server: http://{args.host}:{args.port}  ws://{args.host}:{args.port}/ws")
+    web.run_app(server.make_app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import backtest
+import rsi_only_backtest
+
+
+# バックテスト全体（指標計算 + シグナル生成 + 売買ループ）
+# 10,000本は15分足でおよそ100日分
+
+SIZES = [2_000, 10_000]
+
+
+def _run(module, df):
+    config = module.BacktestConfig()
+    return module.run_backtest(module.add_indicators(df.copy(), config), config)
+
+
+def _check_trades(trades):
+    """エントリーと決済が交互に時刻順に並び、決済の損益がエントリーとの価格差になっていること"""
+    assert len(trades) and trades["time"].is_monotonic_increasing
+    rows = trades.to_dict("records")
+    for entry, exit_ in zip(rows[::2], rows[1::2]):
+        side = entry["action"].removeprefix("enter_")
+        assert exit_["action"] == f"exit_{side}"
+        move = exit_["price"] - entry["price"]
+        assert exit_["profit"] == pytest.approx(move if side == "long" else -move)
+
+
+@pytest.mark.parametrize("n_bars", SIZES)
+def test_backtest_ma_rsi(benchmark, candles_df_factory, n_bars):
+    df = candles_df_factory(n_bars, "15m")
+    _check_trades(benchmark.pedantic(_run, args=(backtest, df), rounds=3, iterations=1))
+
+
+@pytest.mark.parametrize("n_bars", SIZES)
+def test_backtest_rsi_only(benchmark, candles_df_factory, n_bars):
+    df = candles_df_factory(n_bars, "30m")
+    _check_trades(benchmark.pedantic(_run, args=(rsi_only_backtest, df), rounds=3, iterations=1))
+
+
+@pytest.mark.parametrize("n_bars", SIZES)
+def test_backtest_cache_hit(benchmark, candles_df_factory, tmp_path, n_bars):
+    # データ・パラメータ・コードが同じ2回目以降（キーの計算 + .npz の読み込み + 指標の列の追加）
+    from result_cache import BacktestCache, evaluate
+
+    df = candles_df_factory(n_bars, "15m")
+    config = backtest.BacktestConfig()
+    cache = BacktestCache(str(tmp_path))
+    miss_df = df.copy()
+    miss = evaluate(backtest, miss_df, config, cache)
+    hit_df = df.copy()
+    result = benchmark(lambda: evaluate(backtest, hit_df, config, cache))
+    assert result.cached and not miss.cached
+    # キャッシュから読んだ結果は実行した結果と同じ
+    pd.testing.assert_frame_equal(result.trades, miss.trades)
+    np.testing.assert_array_equal(result.equity, miss.equity)
+    assert result.stats == pytest.approx(miss.stats, nan_ok=True)
+    pd.testing.assert_frame_equal(hit_df, miss_df)
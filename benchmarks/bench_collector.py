@@ -0,0 +1,142 @@
+import csv
+import io
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+# コレクターのメッセージ処理と書き込みスループット
+
+CHANNELS = ["trades", "l2Book", "mids", "allMids"]
+LAG = 5  # 冗長接続の確認で後の接続が遅れるメッセージ数
+
+
+@pytest.mark.parametrize("channel", CHANNELS)
+def test_process_message(benchmark, collector, messages, channel):
+    channel_messages = messages.get(channel)
+    if not channel_messages:
+        pytest.skip(f"{channel} のメッセージがデータセットにありません")
+    now = "2024-01-01T00:00:00.000000"
+
+    def run():
+        for data in channel_messages:
+            collector.process_message(data, now)
+
+    benchmark.extra_info["messages"] = len(channel_messages)
+    benchmark(run)
+
+
+@pytest.mark.parametrize("connections", [2])
+def test_process_message_redundant(benchmark, collector, messages, connections):
+    """同じメッセージが connections 本の接続から届いたときの先着マージ（2本目以降は重複として捨てる）"""
+    from redundancy import FirstArrivalMerger
+
+    channel_messages = [data for channel in ("trades", "l2Book") for data in messages.get(channel, [])]
+    if not channel_messages:
+        pytest.skip("trades / l2Book のメッセージがデータセットにありません")
+    now = "2024-01-01T00:00:00.000000"
+
+    def run():
+        collector.merger = FirstArrivalMerger()
+        for data in channel_messages:
+            for i in range(connections):
+                collector.process_message(data, now, connection=f"main#{i}")
+
+    benchmark.extra_info["messages"] = len(channel_messages) * connections
+    benchmark(run)
+
+    # 1回分を書き込み直して、各約定（tid）・各板（time）・各中値の更新が1回ずつ書かれたことを確かめる。
+    # 後の接続ほど LAG メッセージずつ遅れて届き、中値には行き来する値も混ぜる
+    config = collector.config
+    coin = config.target_coin
+    mids_messages = messages.get("mids", []) + [
+        {"channel": "mids", "data": {"coin": coin, "mid": mid}} for mid in ("100.0", "100.5") * 3
+    ]
+    arrivals = sorted(
+        ((k + i * LAG, i), data)
+        for k, data in enumerate(channel_messages + mids_messages) for i in range(connections)
+    )
+    for path in (config.trades_file, config.book_file, config.mids_file):
+        if os.path.exists(path):
+            os.remove(path)
+    collector.merger = FirstArrivalMerger()
+    for (_, i), data in arrivals:
+        collector.process_message(data, now, connection=f"main#{i}")
+    collector.merger = None
+
+    tids = [trade["tid"] for data in messages.get("trades", []) for trade in data["data"] if trade["coin"] == coin]
+    book_times = {data["data"]["time"] for data in messages.get("l2Book", []) if data["data"]["coin"] == coin}
+    mids = [data["data"]["mid"] for data in mids_messages if data["data"]["coin"] == coin]
+    assert sorted(int(row[6]) for row in _read_rows(config.trades_file)) == sorted(set(tids))
+    assert len(_read_rows(config.book_file)) == len(book_times)
+    assert [row[2] for row in _read_rows(config.mids_file)] == mids
+
+
+def _read_rows(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, newline="") as f:
+        return list(csv.reader(f))
+
+
+def _trade_rows(n_rows):
+    rng = np.random.default_rng(0)
+    px = 60000 + np.cumsum(rng.normal(0, 5, n_rows))
+    return [["2024-01-01T00:00:00.000000", "BTC", "B", f"{p:.1f}", "0.01000", 1_700_000_000_000 + i, i]
+            for i, p in enumerate(px)]
+
+
+@pytest.mark.parametrize("n_rows", [10_000])
+def test_csv_write_per_row_open(benchmark, tmp_path, n_rows):
+    """現在のコレクターと同じく1行ごとにファイルを開いて書き込む"""
+    rows = _trade_rows(n_rows)
+    path = tmp_path / "trades.csv"
+
+    def run():
+        for row in rows:
+            with open(path, "a", newline="") as f:
+                csv.writer(f).writerow(row)
+
+    benchmark.extra_info["rows"] = len(rows)
+    benchmark(run)
+
+
+@pytest.mark.parametrize("n_rows", [100_000])
+def test_csv_write_buffered(benchmark, tmp_path, n_rows):
+    """ファイルを開いたまま csv.writer でまとめて書き込む"""
+    rows = _trade_rows(n_rows)
+    path = tmp_path / "trades.csv"
+
+    def run():
+        with open(path, "w", newline="") as f:
+            csv.writer(f).writerows(rows)
+
+    benchmark.extra_info["rows"] = len(rows)
+    benchmark(run)
+
+
+@pytest.mark.parametrize("n_rows", [100_000])
+def test_columnar_write(benchmark, tmp_path, n_rows):
+    """同じデータを列ごとの NumPy 配列として書き込む"""
+    rows = _trade_rows(n_rows)
+    df = pd.DataFrame(rows, columns=["timestamp", "coin", "side", "price", "size", "time", "tid"])
+    columns = {
+        "price": df["price"].astype(float).to_numpy(),
+        "size": df["size"].astype(float).to_numpy(),
+        "time": df["time"].to_numpy(np.int64),
+        "tid": df["tid"].to_numpy(np.int64),
+    }
+    path = tmp_path / "trades.npz"
+
+    benchmark.extra_info["rows"] = n_rows
+    benchmark(np.savez, path, **columns)
+
+
+def test_csv_parse(benchmark, n_rows=100_000):
+    """書き込んだ CSV を pandas で読み戻す"""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(_trade_rows(n_rows))
+    text = buffer.getvalue()
+    benchmark(lambda: pd.read_csv(io.StringIO(text), header=None))
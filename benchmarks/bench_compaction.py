@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from binary_records import DTYPES, RecordWriter, book_dtype, records_to_csv
+from compaction import compact, load_partitions
+
+
+# 重なりのあるコレクター出力（再起動を模した trades / l2book の CSV 4セッション分）のコンパクション
+
+N_ROWS = 100_000
+N_SESSIONS = 4
+START_NS = 1_714_521_600 * 10**9  # 2024-05-01
+
+
+def _write_session(directory, run, start, n_rows):
+    rng = np.random.default_rng(start)
+    trades = np.zeros(n_rows, dtype=DTYPES["trades"])
+    trades["ts"] = START_NS + (start + np.arange(n_rows)) * 10**8
+    trades["time"] = trades["ts"] // 10**6
+    trades["px"] = 60000 + rng.normal(size=n_rows).cumsum()
+    trades["sz"] = rng.exponential(0.1, n_rows)
+    trades["tid"] = start + np.arange(n_rows)
+    trades["side"] = rng.integers(1, 3, n_rows)
+    books = np.zeros(n_rows, dtype=book_dtype())
+    books["ts"] = trades["ts"]
+    # 3回に1回は直前と同じ板
+    mid = np.repeat(60000 + rng.normal(size=n_rows // 3 + 1).cumsum(), 3)[:n_rows]
+    books["bid_px"] = mid[:, None] - np.arange(1, 6)
+    books["ask_px"] = mid[:, None] + np.arange(1, 6)
+    books["bid_sz"] = books["ask_sz"] = 1.0
+    for kind, records in (("trades", trades), ("l2book", books)):
+        path = directory / f"{kind}_{run}.bin"
+        with RecordWriter(str(path), kind, "BTC") as writer:
+            writer.append_array(records)
+        records_to_csv(str(path))
+        path.unlink()
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    # 各セッションは前のセッションと半分重なる（同じ tid の約定が2回ずつ入る）
+    for i in range(N_SESSIONS):
+        _write_session(tmp_path, f"20240501_{i:06d}", i * N_ROWS // 2, N_ROWS)
+    return tmp_path
+
+
+def _check_partitions(out_dir):
+    """約定は tid が1回ずつ約定時刻の順に、板は受信時刻の順に直前と同じ板を除いて入っていること"""
+    trades = load_partitions(str(out_dir), "trades", "BTC")
+    n_unique = (N_SESSIONS - 1) * N_ROWS // 2 + N_ROWS
+    assert np.array_equal(trades["tid"], np.arange(n_unique))
+    assert np.all(np.diff(trades["time"]) >= 0)
+    books = load_partitions(str(out_dir), "l2book", "BTC")
+    assert np.all(np.diff(books["ts"]) >= 0)
+    levels = np.hstack([books[field] for field in ("bid_px", "bid_sz", "ask_px", "ask_sz")])
+    assert not np.any(np.all(levels[1:] == levels[:-1], axis=1))
+    return trades, books
+
+
+def test_compaction_full(benchmark, data_dir, tmp_path_factory):
+    out_dirs = []
+
+    def run():
+        out_dirs.append(tmp_path_factory.mktemp("out"))
+        return compact(str(data_dir), str(out_dirs[-1]), max_workers=1)
+
+    result = benchmark.pedantic(run, rounds=3, iterations=1)
+    assert result["partitions"]
+    _check_partitions(out_dirs[-1])
+
+
+def test_compaction_incremental_noop(benchmark, data_dir, tmp_path):
+    compact(str(data_dir), str(tmp_path / "out"), max_workers=1)
+    trades, books = _check_partitions(tmp_path / "out")
+    result = benchmark(compact, str(data_dir), str(tmp_path / "out"), max_workers=1)
+    # 新しいファイルがなければ何も読まず、パーティションも変わらない
+    assert result["files"] == 0 and not result["partitions"]
+    after_trades, after_books = _check_partitions(tmp_path / "out")
+    assert np.array_equal(after_trades, trades) and np.array_equal(after_books, books)
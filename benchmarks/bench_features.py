@@ -0,0 +1,77 @@
+import math
+
+import numpy as np
+import pytest
+
+from features import NS, FeatureConfig, FeaturePipeline, run_events
+
+
+# 特徴量パイプラインのイベントあたりの処理（板と約定が交互に来る10万イベント）
+
+N_EVENTS = 100_000
+
+
+@pytest.fixture(scope="module")
+def events():
+    rng = np.random.default_rng(0)
+    ts = 1_700_000_000_000_000_000 + np.cumsum(rng.integers(1_000_000, 50_000_000, N_EVENTS))
+    mid = 60000 * np.exp(np.cumsum(rng.normal(0, 1e-5, N_EVENTS)))
+    sizes = rng.uniform(0.01, 2, (N_EVENTS, 10)).tolist()
+    result = []
+    for i, (t, m) in enumerate(zip(ts.tolist(), mid.tolist())):
+        if i % 2:
+            result.append((t, 1, (m, sizes[i][0], 1 if sizes[i][1] > 1 else -1)))
+        else:
+            bids = [m - 0.5 - level for level in range(5)]
+            asks = [m + 0.5 + level for level in range(5)]
+            result.append((t, 0, (bids, sizes[i][:5], asks, sizes[i][5:])))
+    return result
+
+
+@pytest.mark.parametrize("interval", [0.1, 1.0])
+def test_feature_pipeline(benchmark, events, interval):
+    def run():
+        pipeline = FeaturePipeline(FeatureConfig(interval=interval))
+        run_events(pipeline, events)
+        return pipeline.rows
+
+    benchmark.extra_info["events"] = len(events)
+    rows = benchmark.pedantic(run, rounds=3, iterations=1)
+    # 最初から最後のイベントまでのすべてのバケットが1行ずつ（イベントのないバケットも）
+    interval_ns = int(interval * NS)
+    assert [row[0] for row in rows] == list(range(events[0][0] // interval_ns * interval_ns,
+                                                   events[-1][0] + 1, interval_ns))
+
+
+def test_feature_values():
+    """手で計算した値との突き合わせ（2つの板・4つの約定・OI、イベントのないバケットを1つ挟む）"""
+    t0 = 1_700_000_000 * NS
+    events = [
+        (t0 + NS // 10, 2, (100.0,)),
+        (t0 + NS // 5, 0, ([99.0, 98.0], [2.0, 3.0], [101.0, 102.0], [1.0, 4.0])),
+        (t0 + NS * 3 // 10, 1, (100.0, 1.0, 1)),
+        (t0 + NS * 4 // 10, 1, (101.0, 3.0, -1)),
+        # 最良買いが上がり（+1）、最良売りは同じ価格で数量が 1 → 3（-3 + 1）
+        (t0 + NS * 12 // 10, 0, ([100.0, 99.0], [1.0, 2.0], [101.0, 102.0], [3.0, 4.0])),
+        (t0 + NS * 15 // 10, 1, (100.5, 2.0, 1)),
+        (t0 + NS * 16 // 10, 2, (103.0,)),
+        # t0 + 2秒のバケットはイベントなし
+        (t0 + NS * 31 // 10, 1, (102.0, 1.0, -1)),
+    ]
+    config = FeatureConfig(interval=1.0, book_levels=(1, 2), rv_window=60)
+    pipeline = FeaturePipeline(config)
+    run_events(pipeline, events)
+    rv = abs(math.log(100.5 / 100.0))
+    nan = math.nan
+    # timestamp, mid, spread, ofi, trade_count, volume, vwap, trade_sign_imbalance, volume_imbalance,
+    # book_imbalance_1, book_imbalance_2, realized_vol, realized_vol_rolling, open_interest, oi_change
+    expected = [
+        [t0, 100.0, 2.0, 0.0, 2, 4.0, 403.0 / 4, 0.0, -0.5, 1 / 3, 0.0, 0.0, 0.0, 100.0, 0.0],
+        [t0 + NS, 100.5, 1.0, -1.0, 1, 2.0, 100.5, 1.0, 1.0, -0.5, -0.4, rv, rv, 103.0, 3.0],
+        [t0 + 2 * NS, 100.5, 1.0, 0.0, 0, 0.0, nan, 0.0, 0.0, -0.5, -0.4, 0.0, rv, 103.0, 0.0],
+        [t0 + 3 * NS, 100.5, 1.0, 0.0, 1, 1.0, 102.0, -1.0, -1.0, -0.5, -0.4, 0.0, rv, 103.0, 0.0],
+    ]
+    assert len(pipeline.rows) == len(expected)
+    for row, want in zip(pipeline.rows, expected):
+        assert len(row) == len(config.columns)
+        assert row == pytest.approx(want, nan_ok=True)
@@ -0,0 +1,21 @@
+import pytest
+
+import fetch_candles
+from datasets import synthetic_candles
+
+
+# fetch_candles の DataFrame 構築（HTTP 部分は固定データを返す Info に置き換える）
+
+@pytest.mark.parametrize("n_bars", [5_000, 100_000])
+def test_fetch_candles_dataframe(benchmark, monkeypatch, n_bars):
+    candles = synthetic_candles(n_bars, "5m")
+
+    class RecordedInfo:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def candles_snapshot(self, *args, **kwargs):
+            return candles
+
+    monkeypatch.setattr(fetch_candles, "Info", RecordedInfo)
+    benchmark(fetch_candles.fetch_candles, "BTC", "5m", 3)
@@ -0,0 +1,26 @@
+import pytest
+
+from datasets import synthetic_ohlc
+from rsi_only_backtest import calculate_atr, calculate_rsi
+
+
+# RSI / ATR の計算（100万本）
+
+N_BARS = 1_000_000
+
+
+@pytest.fixture(scope="module")
+def ohlc():
+    return synthetic_ohlc(N_BARS)
+
+
+def test_calculate_rsi(benchmark, ohlc):
+    rsi = benchmark(calculate_rsi, ohlc["c"], 14)
+    # ウォームアップ（13本）だけが NaN で、残りは 0〜100
+    assert rsi[:13].isna().all() and rsi[13:].between(0, 100).all()
+
+
+def test_calculate_atr(benchmark, ohlc):
+    df = ohlc.copy()
+    atr = benchmark(calculate_atr, df, 14)
+    assert atr[:13].isna().all() and (atr[13:] > 0).all()
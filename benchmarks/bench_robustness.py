@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+
+import rsi_only_backtest
+from analytics import bar_returns, closed_profits, positions_from_trades
+from result_cache import compute
+from robustness import METHODS, analyze
+
+
+# 15分足1年分（35,040本）の rsi_only_backtest の結果に対する頑健性分析（手法ごとに1万サンプル、1プロセス）
+
+N_BARS = 35_040
+N_SAMPLES = 10_000
+# バーごとのエクイティカーブで計算し直して突き合わせる小さいケース
+CHECK_BARS = 2_000
+CHECK_SAMPLES = 50
+
+
+def _backtest(df):
+    result = compute(rsi_only_backtest, df, rsi_only_backtest.BacktestConfig())
+    return result.apply(df), result.trades
+
+
+@pytest.fixture(scope="module")
+def backtest_result(candles_df_factory):
+    return _backtest(candles_df_factory(N_BARS, "15m"))
+
+
+def _check_shape(results, methods, n_samples):
+    assert set(results) == set(methods)
+    for method, result in results.items():
+        assert len(result.total_profit) == len(result.max_drawdown) == n_samples
+        assert (result.max_drawdown >= 0).all()
+        assert (result.expected_value is not None) == (method == "trades")
+        assert result.summary()["samples"] == n_samples
+
+
+@pytest.mark.parametrize("method", METHODS)
+def test_robustness(benchmark, backtest_result, method):
+    df, trades = backtest_result
+
+    def run():
+        return analyze(df, trades, n_samples=N_SAMPLES, methods=(method,), max_workers=1)
+
+    _check_shape(benchmark.pedantic(run, rounds=3, iterations=1), (method,), N_SAMPLES)
+
+
+def _drawdown(equity):
+    peak = np.maximum(np.maximum.accumulate(equity), 0.0)
+    return (peak - equity).max()
+
+
+def _per_bar(df, trades, method, k, seed, block_length, max_delay, max_slippage_bps):
+    """analyze と同じ乱数でサンプルごとにバーごとのエクイティカーブを作り、総損益と最大ドローダウンを返す"""
+    close = df["c"].to_numpy(dtype=float)
+    positions = positions_from_trades(df["datetime"], trades)
+    pnl, _ = bar_returns(close, positions)
+    n = len(close)
+    # 手法を1つだけ・1バッチで実行したときのバッチの乱数
+    rng = np.random.default_rng(np.random.SeedSequence(seed).spawn(1)[0])
+    curves = []
+    if method == "trades":
+        profits = closed_profits(trades)
+        curves = np.cumsum(profits[rng.integers(0, len(profits), size=(k, len(profits)))], axis=1)
+    elif method == "blocks":
+        n_blocks = -(-n // block_length)
+        lengths = [block_length] * (n_blocks - 1) + [n - (n_blocks - 1) * block_length]
+        starts = rng.integers(0, n - block_length + 1, size=(n_blocks, k))
+        for i in range(k):
+            curves.append(np.cumsum(np.concatenate(
+                [pnl[start:start + length] for start, length in zip(starts[:, i], lengths)])))
+    else:
+        changes = np.flatnonzero(np.diff(positions, prepend=0.0))
+        deltas = np.diff(positions[changes], prepend=0.0)
+        effective = np.maximum.accumulate(changes + rng.integers(0, max_delay + 1, size=(k, len(deltas))), axis=1)
+        slippage = rng.uniform(0, max_slippage_bps / 10000, size=effective.shape)
+        for i in range(k):
+            delayed = np.zeros(n)
+            costs = np.zeros(n)
+            for bar, delta, rate in zip(effective[i], deltas, slippage[i]):
+                if bar < n:
+                    delayed[bar:] += delta
+                    costs[bar] += abs(delta) * close[bar] * rate
+            held = np.r_[0.0, delayed[:-1]]
+            curves.append(np.cumsum(held * np.diff(close, prepend=close[0]) - costs))
+    return np.array([curve[-1] for curve in curves]), np.array([_drawdown(curve) for curve in curves])
+
+
+@pytest.mark.parametrize("method,block_length", [(method, 13) for method in METHODS] + [("blocks", 1000)])
+def test_robustness_matches_per_bar(candles_df_factory, method, block_length):
+    """区間の統計を合成した結果がバーごとに計算した結果と同じ（長いブロックはブロック内のドローダウンも確かめる）"""
+    df, trades = _backtest(candles_df_factory(CHECK_BARS, "15m").copy())
+    params = {"block_length": block_length, "max_delay": 3, "max_slippage_bps": 5.0}
+    results = analyze(df, trades, n_samples=CHECK_SAMPLES, methods=(method,), seed=7, max_workers=1, **params)
+    _check_shape(results, (method,), CHECK_SAMPLES)
+    total_profit, max_drawdown = _per_bar(df, trades, method, CHECK_SAMPLES, 7, **params)
+    np.testing.assert_allclose(results[method].total_profit, total_profit, rtol=0, atol=1e-8)
+    np.testing.assert_allclose(results[method].max_drawdown, max_drawdown, rtol=0, atol=1e-8)
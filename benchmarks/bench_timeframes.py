@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from timeframes import MultiTimeframe, interval_ms
+
+
+# 5分足（およそ1年分）からの上位足の集約と、基準の足への揃え
+
+N_BARS = 100_000
+INTERVALS = ["15m", "1h", "4h", "1d"]
+
+
+@pytest.fixture(scope="module")
+def base(candles_df_factory):
+    return MultiTimeframe(candles_df_factory(N_BARS, "5m"), "5m").base
+
+
+@pytest.mark.parametrize("interval", INTERVALS)
+def test_resample(benchmark, base, interval):
+    def run():
+        return MultiTimeframe(base, "5m").get(interval)
+
+    benchmark(run)
+
+
+def test_aligned_all_timeframes(benchmark, base):
+    def run():
+        mtf = MultiTimeframe(base, "5m")
+        return [mtf.aligned(interval, ["c"]) for interval in INTERVALS]
+
+    benchmark(run)
+
+
+def _last_complete_closes(base, base_interval, interval):
+    """基準の足ごとに、その足の確定時刻までに終わった確定済み（最初と最後の足がある）粗い足の終値を1本ずつ数えて求める"""
+    base_step, step = interval_ms(base_interval), interval_ms(interval)
+    bars = {}
+    for t, c in zip(base["t"], base["c"]):
+        bars.setdefault(t // step * step, []).append((t, c))
+    complete = {start: rows[-1][1] for start, rows in bars.items()
+                if rows[0][0] == start and rows[-1][0] + base_step == start + step}
+    expected = []
+    for t in base["t"]:
+        ended = [start for start in complete if start + step <= t + base_step]
+        expected.append(complete[max(ended)] if ended else np.nan)
+    return np.array(expected)
+
+
+@pytest.mark.parametrize("interval", ["15m", "1h"])
+def test_aligned_no_lookahead(candles_df_factory, interval):
+    """先頭・末尾が粗い足の途中で欠損もあるデータで、確定した粗い足の終値だけを参照する"""
+    df = candles_df_factory(2_000, "5m")
+    # 先頭を粗い足の途中から始め、途中の足（粗い足の最初・最後・中の足）を抜き、末尾も途中で終える
+    start = int(np.flatnonzero(df["t"].to_numpy() % interval_ms("1h") == interval_ms("5m") * 5)[0])
+    base = df.iloc[start:start + 500].drop(df.index[start + np.array([7, 30, 31, 95, 200, 311])])
+    base = base.iloc[:-4]
+    mtf = MultiTimeframe(base, "5m")
+    aligned = mtf.aligned(interval, ["c", "complete"])
+    expected = _last_complete_closes(mtf.base, "5m", interval)
+    np.testing.assert_array_equal(aligned[f"c_{interval}"].to_numpy(float), expected)
+    assert np.isnan(expected[0]) and not np.isnan(expected).all()
+    assert aligned[f"complete_{interval}"][~np.isnan(expected)].eq(True).all()
+    assert aligned[f"complete_{interval}"][np.isnan(expected)].isna().all()
@@ -0,0 +1,72 @@
+import importlib
+
+import pandas as pd
+import pytest
+
+from walk_forward import walk_forward
+
+
+# 15分足1年分（35,040本）、学習30日 / テスト7日（47 fold）のウォークフォワード分析（1プロセス）
+
+N_BARS = 35_040
+TRAIN_BARS = 2880
+TEST_BARS = 672
+N_FOLDS = (N_BARS - TRAIN_BARS) // TEST_BARS
+GRIDS = {
+    "backtest": {"short_window": [5, 10], "long_window": [20, 50], "rsi_threshold_buy": [40, 50]},
+    "rsi_only_backtest": {"rsi_lower": [25, 30], "rsi_upper": [70, 75], "atr_threshold": [0.5, 1.0]},
+}
+
+
+@pytest.fixture(scope="module")
+def df(candles_df_factory):
+    return candles_df_factory(N_BARS, "15m")
+
+
+def _first_signal_time(module, rows, config):
+    """期間の先頭から見て最初にシグナルが出た足の時刻（売買ループを通さずに求める）"""
+    for idx, curr in enumerate(rows):
+        if module.__name__ == "backtest":
+            signal = idx and module.generate_signal(rows[idx - 1], curr, config.rsi_threshold_buy,
+                                                    config.rsi_threshold_sell)
+        else:
+            signal = module.generate_signal_rsi_atr(curr, rsi_lower=config.rsi_lower, rsi_upper=config.rsi_upper,
+                                                    atr_threshold=config.atr_threshold)
+        if signal:
+            return curr["datetime"]
+    return None
+
+
+def _check_folds(result, df, strategy):
+    """fold の区切りと、各 fold のテスト期間のトレードが全期間で計算した指標を切り出して回した結果と同じこと"""
+    module = importlib.import_module(strategy)
+    folds = result.folds
+    assert len(folds) == N_FOLDS == 47
+    times = df["datetime"].reset_index(drop=True)
+    test_starts = [TRAIN_BARS + i * TEST_BARS for i in range(N_FOLDS)]
+    assert list(folds["train_start"]) == [times[start - TRAIN_BARS] for start in test_starts]
+    assert list(folds["test_start"]) == [times[start] for start in test_starts]
+    assert list(folds["test_end"]) == [times[start + TEST_BARS - 1] for start in test_starts]
+
+    rows_by_params = {}
+    for fold, start in zip(folds.itertuples(), test_starts):
+        params = {name: getattr(fold, name) for name in GRIDS[strategy]}
+        config = module.BacktestConfig(**params)
+        key = tuple(params.items())
+        if key not in rows_by_params:
+            rows_by_params[key] = module.add_indicators(df.copy(), config).to_dict("records")
+        rows = rows_by_params[key][start:start + TEST_BARS]
+        expected = pd.DataFrame(module.simulate_trades(rows, config))
+        actual = result.trades[result.trades["fold"] == fold.fold].drop(columns="fold").reset_index(drop=True)
+        pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+        # 期間の先頭の足も使う（ウォームアップで飛ばさない）
+        first = _first_signal_time(module, rows, config)
+        assert (actual["time"].iloc[0] if len(actual) else None) == first
+
+
+@pytest.mark.parametrize("strategy", list(GRIDS))
+def test_walk_forward(benchmark, df, strategy):
+    def run():
+        return walk_forward(strategy, df, GRIDS[strategy], train_bars=TRAIN_BARS, test_bars=TEST_BARS, max_workers=1)
+
+    _check_folds(benchmark.pedantic(run, rounds=3, iterations=1), df, strategy)
@@ -0,0 +1,44 @@
+import os
+import sys
+
+import pytest
+
+from datasets import load_messages, synthetic_candles_df
+
+
+# 各ディレクトリのスクリプトをパッケージ化せずに import できるようにする
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+BOT_DIR = os.path.join(REPO_ROOT, "my_hyperliquid_bot")
+COLLECTOR_DIR = os.path.join(REPO_ROOT, "Hyperliquid_data_collector")
+for path in (BENCH_DIR, BOT_DIR, COLLECTOR_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+@pytest.fixture(scope="session")
+def messages():
+    return load_messages()
+
+
+@pytest.fixture(scope="session")
+def candles_df_factory():
+    cache = {}
+
+    def make(n_bars, interval="15m"):
+        if (n_bars, interval) not in cache:
+            cache[(n_bars, interval)] = synthetic_candles_df(n_bars, interval)
+        return cache[(n_bars, interval)]
+
+    return make
+
+
+@pytest.fixture
+def collector(tmp_path):
+    """出力先を一時ディレクトリにしたコレクター（import してもファイルは作られない）"""
+    import hyperliquid_data_collector as module
+
+    # デバッグ出力は計測対象外
+    module.configure(module.CollectorConfig(output_dir=str(tmp_path), debug=False))
+    yield module
+    module.config = None
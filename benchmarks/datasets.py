@@ -0,0 +1,99 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+# ベンチマーク用の固定データセット
+#
+# 合成データは乱数のシードを固定して毎回同じものを生成する。
+# data/ に record_messages.py で記録した WebSocket メッセージがあればそちらを使う。
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+RECORDED_MESSAGES = os.path.join(DATA_DIR, "ws_messages.jsonl")
+SEED = 20240101
+INTERVAL_MS = {"1m": 60_000, "5m": 300_000, "15m": 900_000, "30m": 1_800_000, "1h": 3_600_000}
+
+
+def synthetic_candles(n_bars, interval="15m", coin="BTC", start_ms=1_699_920_000_000, seed=SEED):
+    """
+    candles_snapshot と同じ形式（値は文字列）のローソク足リストを生成する関数
+    Args:
+        n_bars (int): 本数
+        interval (str): 時間間隔
+        coin (str): 銘柄
+        start_ms (int): 最初の足の開始時刻（ミリ秒。既定は UTC の0時で、取引所の足と同じく区切りに揃う）
+        seed (int): 乱数シード
+    Returns:
+        list[dict]: ローソク足データ
+    """
+    rng = np.random.default_rng(seed)
+    step = INTERVAL_MS[interval]
+    close = 60000 * np.exp(np.cumsum(rng.normal(0, 0.002, n_bars)))
+    open_ = np.r_[close[0], close[:-1]]
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.001, n_bars)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.001, n_bars)))
+    volume = rng.uniform(1, 100, n_bars)
+    trades = rng.integers(10, 1000, n_bars)
+    t = start_ms + np.arange(n_bars, dtype=np.int64) * step
+    return [
+        {"t": int(t[i]), "T": int(t[i]) + step - 1, "s": coin, "i": interval,
+         "o": f"{open_[i]:.1f}", "c": f"{close[i]:.1f}", "h": f"{high[i]:.1f}", "l": f"{low[i]:.1f}",
+         "v": f"{volume[i]:.5f}", "n": int(trades[i])}
+        for i in range(n_bars)
+    ]
+
+
+def synthetic_candles_df(n_bars, interval="15m", seed=SEED):
+    """fetch_candles が返すのと同じ形式の DataFrame を生成する"""
+    df = pd.DataFrame(synthetic_candles(n_bars, interval, seed=seed))
+    df["datetime"] = pd.to_datetime(df["t"], unit="ms")
+    return df
+
+
+def synthetic_ohlc(n_bars, seed=SEED):
+    """指標計算用の数値 OHLC（h, l, c 列）"""
+    rng = np.random.default_rng(seed)
+    close = 60000 * np.exp(np.cumsum(rng.normal(0, 0.002, n_bars)))
+    spread = np.abs(rng.normal(0, 0.001, n_bars)) * close
+    return pd.DataFrame({"h": close + spread, "l": close - spread, "c": close})
+
+
+def synthetic_messages(n_messages, coin="BTC", seed=SEED):
+    """
+    コレクターが受信するのと同じ形式の WebSocket メッセージを生成する関数
+    Returns:
+        dict: チャンネル名 -> メッセージ（json.loads 済み）のリスト
+    """
+    rng = np.random.default_rng(seed)
+    mids = 60000 + np.cumsum(rng.normal(0, 5, n_messages))
+    trades, books, mids_msgs, all_mids = [], [], [], []
+    for i, mid in enumerate(mids):
+        time_ms = 1_700_000_000_000 + i * 100
+        n_trades = int(rng.integers(1, 4))
+        trades.append({"channel": "trades", "data": [
+            {"coin": coin, "side": "B" if rng.random() < 0.5 else "A", "px": f"{mid:.1f}",
+             "sz": f"{rng.exponential(0.1):.5f}", "hash": "0x0", "time": time_ms, "tid": i * 4 + j,
+             "users": ["0x0", "0x0"]}
+            for j in range(n_trades)
+        ]})
+        books.append({"channel": "l2Book", "data": {"coin": coin, "time": time_ms, "levels": [
+            [{"px": f"{mid - 1 - k:.1f}", "sz": f"{rng.uniform(0.1, 5):.4f}", "n": 3} for k in range(20)],
+            [{"px": f"{mid + 1 + k:.1f}", "sz": f"{rng.uniform(0.1, 5):.4f}", "n": 3} for k in range(20)],
+        ]}})
+        mids_msgs.append({"channel": "mids", "data": {"coin": coin, "mid": f"{mid:.1f}"}})
+        all_mids.append({"channel": "allMids", "data": {"mids": {coin: f"{mid:.1f}", "ETH": "3000.0"}}})
+    return {"trades": trades, "l2Book": books, "mids": mids_msgs, "allMids": all_mids}
+
+
+def load_messages(n_messages=2000):
+    """記録済みのメッセージがあればそれを、なければ合成メッセージをチャンネルごとに返す"""
+    if not os.path.exists(RECORDED_MESSAGES):
+        return synthetic_messages(n_messages)
+    by_channel = {}
+    with open(RECORDED_MESSAGES, encoding="utf-8") as f:
+        for line in f:
+            data = json.loads(line)
+            by_channel.setdefault(data.get("channel"), []).append(data)
+    return by_channel
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import json
+import os
+
+import websockets
+
+from datasets import DATA_DIR, RECORDED_MESSAGES
+
+
+# 本番の WebSocket メッセージを記録してベンチマーク用データセットにする
+
+WS_URL = "wss://api.hyperliquid.xyz/ws"
+
+
+async def record(coin, n_messages, ws_url):
+    os.makedirs(DATA_DIR, exist_ok=True)
+    count = 0
+    async with websockets.connect(ws_url) as websocket:
+        for subscription in ({"type": "trades", "coin": coin}, {"type": "l2Book", "coin": coin},
+                             {"type": "allMids"}):
+            await websocket.send(json.dumps({"method": "subscribe", "subscription": subscription}))
+        with open(RECORDED_MESSAGES, "w", encoding="utf-8") as f:
+            async for message in websocket:
+                if json.loads(message).get("channel") == "subscriptionResponse":
+                    continue
+                f.write(message + "\n")
+                count += 1
+                if count >= n_messages:
+                    break
+    print(f"{count} messages -> {RECORDED_MESSAGES}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WebSocket メッセージを記録する")
+    parser.add_argument("--coin", default="BTC")
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--ws-url", default=WS_URL)
+    args = parser.parse_args()
+    asyncio.run(record(args.coin, args.messages, args.ws_url))
+
+
+if __name__ == "__main__":
+    main()
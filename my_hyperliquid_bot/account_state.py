@@ -0,0 +1,481 @@
+import asyncio
+import json
+import time
+
+import websockets
+
+
+# WebSocket のユーザーイベントで更新されるメモリ上の口座状態
+#
+# userFills / userFundings / orderUpdates を購読してから HTTP で clearinghouseState /
+# spotClearinghouseState / openOrders を取得し、以降はイベントで差分更新する。
+# ポジション・証拠金・残高・未約定注文は dict の参照だけで読める。
+# 口座評価額・使用証拠金・出金可能額は、HTTP の状態の現金部分（口座評価額 - 含み損益）と銘柄ごとの
+# レバレッジを覚えておき、約定（実現損益・手数料と建玉の変化）・資金調達・評価価格の更新のたびに
+# 評価価格（HTTP の状態の positionValue / サイズ、以降は約定価格か update_marks() の価格）で計算し直す。
+# 定期的に（と再接続のたびに）HTTP の状態と突き合わせ、ずれ（ドリフト）があれば記録して置き換える。
+#
+# HTTP の取得中もイベントは反映し続け、同時に記録しておく。取得した状態で置き換えたあと、
+# 記録したイベントのうち状態の時刻（取引所の時刻）より新しいものだけを反映し直すので、
+# 取得中の約定は失われず、状態に含まれている約定が遅れて届いても二重に反映しない。
+#
+# 使用例:
+#     info = Info(base_url=API_URL, skip_ws=True, **meta_cache.sdk_kwargs())
+#     state = AccountState(info, ACCOUNT_ADDRESS, meta_cache=meta_cache, listeners=[tracker])
+#     asyncio.create_task(state.run())
+#     await state.wait_ready()   # 購読してから HTTP の状態を取得し終えるまで待つ
+#     print(state.position("BTC"), state.balance("USDC"), state.account_value)
+#     state.update_marks(mids.mids)   # 評価価格を中値で更新する（任意。MidsFeed など）
+
+WS_URL = "wss://api.hyperliquid.xyz/ws"
+PING_INTERVAL = 30
+RECONCILE_INTERVAL = 60  # HTTP との突き合わせ間隔（秒）
+USER_CHANNELS = ("orderUpdates", "userFills", "userFundings")
+OPEN_STATUSES = {"open", "triggered"}
+EPSILON = 1e-9
+SUBSCRIBE_TIMEOUT = 10  # 購読の応答を待つ時間（秒、過ぎたら応答なしで HTTP の状態を取得する）
+MAX_SEEN_TIDS = 100_000  # 覚えておく約定の tid の上限（通常は HTTP の状態を反映するたびに時刻で忘れる）
+MAX_SEEN_ORDERS = 10_000  # イベントを受け取った注文（oid）を覚えておく数
+
+
+class AccountState:
+    """
+    口座状態エンジン
+    Args:
+        info (Info): 初期化と突き合わせに使う hyperliquid.info.Info
+        user (str): アカウントアドレス
+        meta_cache (MetaCache): スポット約定を残高に反映するためのメタデータ（省略可）
+        listeners (list): 受信メッセージを一緒に渡すオブジェクト（handle_message を持つもの。OrderTracker など）
+        ws_url (str): WebSocket のURL
+        reconcile_interval (float): HTTP との突き合わせ間隔（秒）
+    """
+
+    def __init__(self, info, user, meta_cache=None, listeners=(), ws_url=WS_URL,
+                 reconcile_interval=RECONCILE_INTERVAL):
+        self.info = info
+        self.user = user
+        self.ws_url = ws_url
+        self.reconcile_interval = reconcile_interval
+        self.listeners = list(listeners)
+        self.running = True
+
+        self.positions = {}    # coin -> {"szi": float, "entry_px": float}
+        self.balances = {}     # token -> {"total": float, "hold": float}
+        self.open_orders = {}  # oid -> order
+        self.account_value = 0.0
+        self.total_margin_used = 0.0
+        self.withdrawable = 0.0
+        self.marks = {}        # coin -> 評価価格
+        self.updated_at = None
+        self._cash = 0.0       # 口座評価額のうち含み損益以外（HTTP の状態から、実現損益・手数料・資金調達で更新）
+        self._leverage = {}    # coin -> レバレッジ（HTTP の状態から。わからない銘柄は1倍として証拠金を多めに見る）
+
+        self.snapshot_time = None  # 最後に反映した HTTP の状態の時刻（取引所の時刻、ms）
+
+        self.drift_count = 0
+        self.last_drift = None
+        # tid -> 約定時刻（snapshot_time 以前の約定は時刻で弾けるので、状態を反映するたびに忘れる）
+        self._seen_tids = {}
+        # oid -> {tid: 約定サイズ}（注文の更新か約定を受け取った注文。RiskChecker が発注の反映を確かめるのに使う）
+        self._order_events = {}
+        self._recording = None  # HTTP の取得中に受信したメッセージ
+        self._resync_lock = asyncio.Lock()
+        self._subscribed = 0
+        self._subscribed_event = asyncio.Event()
+        self._ready = asyncio.Event()
+        self._spot_pairs = self._build_spot_pairs(meta_cache)
+
+    @staticmethod
+    def _build_spot_pairs(meta_cache):
+        """スポットの銘柄名 -> (ベーストークン, クオートトークン)"""
+        if meta_cache is None or meta_cache.spot_meta is None:
+            return {}
+        tokens = {token["index"]: token["name"] for token in meta_cache.spot_meta["tokens"]}
+        pairs = {}
+        for spot_info in meta_cache.spot_meta["universe"]:
+            base, quote = tokens[spot_info["tokens"][0]], tokens[spot_info["tokens"][1]]
+            pairs[spot_info["name"]] = (base, quote)
+            pairs[f"{base}/{quote}"] = (base, quote)
+        return pairs
+
+    # --- 読み出し（すべて O(1)） ---
+    def position(self, coin):
+        """ポジションサイズ（ロングは正、ショートは負）"""
+        position = self.positions.get(coin)
+        return position["szi"] if position else 0.0
+
+    def entry_price(self, coin):
+        position = self.positions.get(coin)
+        return position["entry_px"] if position else None
+
+    def balance(self, token):
+        """スポット残高（total）"""
+        balance = self.balances.get(token)
+        return balance["total"] if balance else 0.0
+
+    def available_balance(self, token):
+        """スポット残高のうち注文に拘束されていない分"""
+        balance = self.balances.get(token)
+        return balance["total"] - balance["hold"] if balance else 0.0
+
+    def order(self, oid):
+        return self.open_orders.get(oid)
+
+    def order_reflected(self, oid, filled_sz=0.0, since=None):
+        """
+        発注した注文が状態に反映されたか
+        Args:
+            oid (int): 注文ID
+            filled_sz (float): 発注時に約定したサイズ（その分の約定を受け取るまでは反映されていない）
+            since (float): 取引所の応答を受け取った時刻（ms）。これより後の HTTP の状態を反映していれば反映済み
+        Returns:
+            bool: 板に載っている注文か、注文の更新・約定を受け取っていれば True
+        """
+        if oid in self.open_orders:
+            return True
+        if since is not None and self.snapshot_time is not None and self.snapshot_time >= since:
+            return True
+        fills = self._order_events.get(oid)
+        return fills is not None and sum(fills.values()) >= filled_sz - EPSILON
+
+    def update_marks(self, marks):
+        """
+        評価価格を更新して口座評価額・証拠金を計算し直す
+        Args:
+            marks (dict): coin -> 価格（中値など。文字列でもよい）。ポジションのない銘柄は無視する
+        """
+        changed = False
+        for coin in self.positions:
+            px = marks.get(coin)
+            if px is not None:
+                self.marks[coin] = float(px)
+                changed = True
+        if changed:
+            self._refresh_margin()
+
+    def _refresh_margin(self):
+        """評価価格で口座評価額・使用証拠金・出金可能額を計算し直す（ポジション数に比例）"""
+        unrealized = 0.0
+        margin_used = 0.0
+        for coin, position in self.positions.items():
+            mark = self.marks.get(coin, position["entry_px"])
+            unrealized += position["szi"] * (mark - position["entry_px"])
+            margin_used += abs(position["szi"]) * mark / self._leverage.get(coin, 1.0)
+        self.account_value = self._cash + unrealized
+        self.total_margin_used = margin_used
+        self.withdrawable = max(self.account_value - margin_used, 0.0)
+
+    # --- HTTP からの初期化と突き合わせ ---
+    @staticmethod
+    def _parse_user_state(user_state):
+        positions, marks, leverage = {}, {}, {}
+        unrealized = 0.0
+        for asset_position in user_state.get("assetPositions", []):
+            position = asset_position["position"]
+            szi = float(position["szi"])
+            if abs(szi) > EPSILON:
+                coin = position["coin"]
+                entry_px = float(position.get("entryPx") or 0)
+                positions[coin] = {"szi": szi, "entry_px": entry_px}
+                value = float(position.get("positionValue") or 0)
+                marks[coin] = value / abs(szi) if value else entry_px
+                unrealized += float(position.get("unrealizedPnl") or 0)
+                used = float(position.get("marginUsed") or 0)
+                lev = (position.get("leverage") or {}).get("value")
+                if lev:
+                    leverage[coin] = float(lev)
+                elif used and value:
+                    leverage[coin] = value / used
+        summary = user_state.get("marginSummary", {})
+        margin = (
+            float(summary.get("accountValue", 0)),
+            float(summary.get("totalMarginUsed", 0)),
+            float(user_state.get("withdrawable", 0)),
+            unrealized,
+            marks,
+            leverage,
+        )
+        return positions, margin
+
+    @staticmethod
+    def _parse_spot_state(spot_state):
+        return {
+            balance["coin"]: {"total": float(balance["total"]), "hold": float(balance.get("hold", 0))}
+            for balance in spot_state.get("balances", [])
+        }
+
+    async def _fetch(self):
+        started = int(time.time() * 1000)
+        user_state, spot_state, open_orders = await asyncio.gather(
+            asyncio.to_thread(self.info.user_state, self.user),
+            asyncio.to_thread(self.info.spot_user_state, self.user),
+            asyncio.to_thread(self.info.open_orders, self.user),
+        )
+        positions, margin = self._parse_user_state(user_state)
+        balances = self._parse_spot_state(spot_state)
+        orders = {order["oid"]: order for order in open_orders}
+        # 状態の時刻（ない場合は取得を始めた時刻）
+        snapshot_time = user_state.get("time") or started
+        return positions, margin, balances, orders, snapshot_time
+
+    def _apply_snapshot(self, positions, margin, balances, orders, snapshot_time):
+        self.positions = positions
+        self.account_value, self.total_margin_used, self.withdrawable, unrealized, marks, leverage = margin
+        self._cash = self.account_value - unrealized
+        self.marks.update(marks)
+        self._leverage.update(leverage)
+        self.balances = balances
+        self.open_orders = orders
+        self.snapshot_time = snapshot_time
+        self.updated_at = time.time()
+        # 状態の時刻以前の約定は時刻で弾けるので tid を覚えておく必要がない
+        self._seen_tids = {tid: fill_time for tid, fill_time in self._seen_tids.items() if fill_time > snapshot_time}
+
+    async def _resync(self):
+        """
+        HTTP の状態で置き換え、取得中に受信したイベントのうち状態の時刻より新しいものを反映し直す
+        Returns:
+            tuple: 置き換える前の (positions, balances, open_orders)
+        """
+        async with self._resync_lock:
+            self._recording = []
+            try:
+                positions, margin, balances, orders, snapshot_time = await self._fetch()
+            finally:
+                recorded, self._recording = self._recording, None
+            local = (self.positions, self.balances, self.open_orders)
+            self._apply_snapshot(positions, margin, balances, orders, snapshot_time)
+            # 取得中に反映した約定は置き換えた状態にもう一度反映する
+            for data in recorded:
+                if data.get("channel") == "userFills":
+                    for fill in data.get("data", {}).get("fills", []):
+                        self._seen_tids.pop(fill.get("tid"), None)
+            for data in recorded:
+                self._apply(data)
+            return local
+
+    async def bootstrap(self):
+        """
+        HTTP で口座状態を取得する（run() から購読後に呼ばれる。run() の前に単独で呼ぶと、
+        取得から購読までのイベントは次の突き合わせまで反映されない）
+        """
+        await self._resync()
+        self._ready.set()
+
+    async def wait_ready(self):
+        """run() が購読してから HTTP の状態を取得し終えるまで待つ"""
+        await self._ready.wait()
+
+    def _diff(self, positions, balances, orders):
+        """ローカル状態（引数）と、HTTP の状態に取得後のイベントを反映した状態（self）のずれを列挙する"""
+        drift = []
+        for coin in set(positions) | set(self.positions):
+            local = positions.get(coin, {}).get("szi", 0.0)
+            if abs(local - self.position(coin)) > EPSILON:
+                drift.append(("position", coin, local, self.position(coin)))
+        for token in set(balances) | set(self.balances):
+            local = balances.get(token, {}).get("total", 0.0)
+            if abs(local - self.balance(token)) > 1e-6:
+                drift.append(("balance", token, local, self.balance(token)))
+        if set(orders) != set(self.open_orders):
+            drift.append(("open_orders", None, sorted(orders), sorted(self.open_orders)))
+        return drift
+
+    async def reconcile(self):
+        """
+        HTTP の状態と突き合わせ、ずれがあれば記録して HTTP の状態で置き換える
+        （まだ状態を取得していなければ bootstrap と同じ）
+        Returns:
+            list: 検出したずれ（種類, 銘柄, ローカル値, HTTP の値）
+        """
+        local = await self._resync()
+        if not self._ready.is_set():
+            self._ready.set()
+            return []
+        drift = self._diff(*local)
+        if drift:
+            self.drift_count += 1
+            self.last_drift = drift
+            print("AccountState: HTTP の状態とのずれを検出:", drift)
+        return drift
+
+    async def _reconcile_periodically(self):
+        while self.running:
+            await asyncio.sleep(self.reconcile_interval)
+            try:
+                await self.reconcile()
+            except Exception as e:
+                print("AccountState: 突き合わせ中にエラー:", e)
+
+    # --- WebSocket イベントによる差分更新 ---
+    def handle_message(self, data):
+        """受信したメッセージ（json.loads 済み）で状態を更新する"""
+        if not isinstance(data, dict):
+            return
+        channel = data.get("channel")
+        if channel == "subscriptionResponse":
+            self._subscribed += 1
+            if self._subscribed >= len(USER_CHANNELS):
+                self._subscribed_event.set()
+            return
+        if self._recording is not None and channel in USER_CHANNELS:
+            self._recording.append(data)
+        self._apply(data)
+
+    def _is_new(self, event_time):
+        """HTTP の状態の時刻より後のイベントか（状態に含まれているイベントは反映しない）"""
+        return self.snapshot_time is None or event_time is None or event_time > self.snapshot_time
+
+    def _apply(self, data):
+        channel = data.get("channel")
+        payload = data.get("data")
+        if channel == "userFills":
+            # スナップショットは HTTP で取得した状態に含まれている
+            if not payload.get("isSnapshot"):
+                for fill in payload.get("fills", []):
+                    self._on_fill(fill)
+        elif channel == "userFundings":
+            if not payload.get("isSnapshot"):
+                for funding in payload.get("fundings", []):
+                    if self._is_new(funding.get("time")):
+                        self._cash += float(funding.get("usdc", 0))
+                        self._refresh_margin()
+        elif channel == "orderUpdates":
+            for update in payload:
+                self._note_order(update.get("order", {}).get("oid"))
+                if self._is_new(update.get("statusTimestamp")):
+                    self._on_order_update(update)
+        else:
+            return
+        self.updated_at = time.time()
+
+    def _note_order(self, oid, tid=None, sz=0.0):
+        """注文のイベントを受け取ったことを記録する（HTTP の状態に含まれていて反映しないイベントも）"""
+        if oid is None:
+            return
+        fills = self._order_events.get(oid)
+        if fills is None:
+            fills = self._order_events[oid] = {}
+            if len(self._order_events) > MAX_SEEN_ORDERS:
+                del self._order_events[next(iter(self._order_events))]
+        if tid is not None:
+            fills[tid] = sz
+
+    def _on_fill(self, fill):
+        tid = fill.get("tid")
+        fill_time = fill.get("time")
+        self._note_order(fill.get("oid"), tid, float(fill.get("sz", 0)))
+        if tid in self._seen_tids or not self._is_new(fill_time):
+            return
+        if tid is not None:
+            self._seen_tids[tid] = fill_time if fill_time is not None else float("inf")
+            if len(self._seen_tids) > MAX_SEEN_TIDS:
+                del self._seen_tids[next(iter(self._seen_tids))]
+
+        coin = fill["coin"]
+        px = float(fill["px"])
+        sz = float(fill["sz"])
+        signed = sz if fill["side"] == "B" else -sz
+
+        if coin in self._spot_pairs:
+            base, quote = self._spot_pairs[coin]
+            self._add_balance(base, signed)
+            self._add_balance(quote, -signed * px)
+            self._add_balance(fill.get("feeToken", quote), -float(fill.get("fee", 0)))
+            return
+
+        position = self.positions.get(coin, {"szi": 0.0, "entry_px": 0.0})
+        szi = position["szi"]
+        new_szi = szi + signed
+        if abs(new_szi) < EPSILON:
+            self.positions.pop(coin, None)
+        else:
+            if abs(szi) < EPSILON or (szi > 0) == (signed > 0):
+                # 同じ方向に積み増し: 平均建値を更新
+                entry_px = (abs(szi) * position["entry_px"] + sz * px) / abs(new_szi)
+            elif (new_szi > 0) != (szi > 0):
+                # ドテン: 残りは約定価格で建てたことになる
+                entry_px = px
+            else:
+                entry_px = position["entry_px"]
+            self.positions[coin] = {"szi": new_szi, "entry_px": entry_px}
+        self._cash += float(fill.get("closedPnl", 0)) - float(fill.get("fee", 0))
+        self.marks[coin] = px
+        self._refresh_margin()
+
+    def _add_balance(self, token, amount):
+        balance = self.balances.setdefault(token, {"total": 0.0, "hold": 0.0})
+        balance["total"] += amount
+
+    def _on_order_update(self, update):
+        order = update.get("order", {})
+        oid = order.get("oid")
+        if oid is None:
+            return
+        if update.get("status") in OPEN_STATUSES:
+            self.open_orders[oid] = order
+        else:
+            self.open_orders.pop(oid, None)
+
+    async def _subscribe(self, websocket):
+        for channel in USER_CHANNELS:
+            await websocket.send(json.dumps({
+                "method": "subscribe",
+                "subscription": {"type": channel, "user": self.user}
+            }))
+
+    async def _ping(self, websocket):
+        while True:
+            await asyncio.sleep(PING_INTERVAL)
+            await websocket.send(json.dumps({"method": "ping"}))
+
+    async def _sync_after_subscribe(self):
+        """購読の応答を待ってから HTTP の状態を取得する（初回は bootstrap、再接続後は突き合わせ）"""
+        try:
+            await asyncio.wait_for(self._subscribed_event.wait(), SUBSCRIBE_TIMEOUT)
+        except asyncio.TimeoutError:
+            print("AccountState: 購読の応答がありません。状態の取得を続けます")
+        try:
+            await self.reconcile()
+        except Exception as e:
+            print("AccountState: 状態の取得中にエラー:", e)
+
+    async def run(self):
+        """
+        WebSocket を購読してから HTTP で状態を取得し、以降はイベントで更新し続ける
+        （切断時は再接続し、購読し直してから HTTP で取り直す）
+        """
+        reconcile_task = asyncio.create_task(self._reconcile_periodically())
+        try:
+            while self.running:
+                try:
+                    async with websockets.connect(self.ws_url) as websocket:
+                        self._subscribed = 0
+                        self._subscribed_event.clear()
+                        await self._subscribe(websocket)
+                        ping_task = asyncio.create_task(self._ping(websocket))
+                        # 購読してから取得するので、取得までの間のイベントも取りこぼさない
+                        sync_task = asyncio.create_task(self._sync_after_subscribe())
+                        try:
+                            async for message in websocket:
+                                data = json.loads(message)
+                                self.handle_message(data)
+                                for listener in self.listeners:
+                                    listener.handle_message(data)
+                                if not self.running:
+                                    break
+                        finally:
+                            ping_task.cancel()
+                            sync_task.cancel()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print("AccountState: WebSocket エラー:", e)
+                if self.running:
+                    # 切断中に取りこぼしたイベントは再接続後の突き合わせで取り直す
+                    await asyncio.sleep(1)
+        finally:
+            reconcile_task.cancel()
+
+    def stop(self):
+        self.running = False
@@ -0,0 +1,258 @@
+import numpy as np
+import pandas as pd
+
+
+# バックテスト結果のパフォーマンス分析
+#
+# すべての関数は NumPy のベクトル演算のみで O(n) に計算する。
+# 2次元配列 (バー数 x パラメータ数) を渡すと axis=0 方向に一括で計算するので、
+# パラメータスイープの結果をまとめて評価できる。
+
+_INTERVAL_MINUTES = {
+    "1m": 1, "3m": 3, "5m": 5, "15m": 15, "30m": 30,
+    "1h": 60, "2h": 120, "4h": 240, "8h": 480, "12h": 720,
+    "1d": 1440, "3d": 4320, "1w": 10080, "1M": 43200,
+}
+
+
+def _unwrap(values):
+    """0次元配列をスカラーに戻す（1次元入力の結果を扱いやすくする）"""
+    return {key: np.asarray(value)[()] for key, value in values.items()}
+
+
+def periods_per_year(interval):
+    """
+    ローソク足の間隔から1年あたりのバー数を返す関数（暗号資産は24時間365日取引）
+    Args:
+        interval (str): 時間間隔（例："15m"）
+    Returns:
+        float: 1年あたりのバー数
+    """
+    if interval not in _INTERVAL_MINUTES:
+        raise ValueError(f"Unknown interval: {interval}")
+    return 365 * 24 * 60 / _INTERVAL_MINUTES[interval]
+
+
+def positions_from_trades(bar_times, trades_df):
+    """
+    trades_df（action, time 列）からバーごとのポジション配列を作る関数
+    Args:
+        bar_times (array-like): 各バーの時刻（df['datetime']）
+        trades_df (pd.DataFrame): バックテストのトレード記録
+    Returns:
+        np.ndarray: 各バー終了時点のポジション（1: ロング, -1: ショート, 0: なし）
+    """
+    bar_times = np.asarray(bar_times)
+    positions = np.zeros(len(bar_times))
+    if trades_df is None or len(trades_df) == 0:
+        return positions
+
+    actions = trades_df["action"].to_numpy()
+    state = np.select(
+        [actions == "enter_long", actions == "enter_short"], [1.0, -1.0], default=0.0
+    )
+    bar_idx = np.searchsorted(bar_times, np.asarray(trades_df["time"]), side="left")
+    bar_idx = np.clip(bar_idx, 0, len(bar_times) - 1)
+
+    # 同じバーに複数のイベントがある場合は最後のもの（exit -> enter の順）を採用
+    last = np.r_[bar_idx[1:] != bar_idx[:-1], True]
+    event_state = np.full(len(bar_times), np.nan)
+    event_state[bar_idx[last]] = state[last]
+
+    # 直前のイベントの状態を前方に埋める
+    filled_idx = np.where(np.isnan(event_state), 0, np.arange(len(bar_times)))
+    filled_idx = np.maximum.accumulate(filled_idx)
+    positions = event_state[filled_idx]
+    return np.nan_to_num(positions, nan=0.0)
+
+
+def bar_returns(close, positions):
+    """
+    バーごとの損益と収益率を計算する関数（ポジションは次のバーの値動きに適用）
+    Args:
+        close (array-like): 終値（長さ n）
+        positions (array-like): ポジション（n, または n x k）
+    Returns:
+        tuple: (pnl, returns) いずれも positions と同じ形状、先頭は0
+    """
+    close = np.asarray(close, dtype=float)
+    positions = np.asarray(positions, dtype=float)
+    price_diff = np.diff(close, prepend=close[0])
+    prev_close = np.r_[close[0], close[:-1]]
+    held = np.concatenate([np.zeros((1,) + positions.shape[1:]), positions[:-1]])
+    if positions.ndim == 2:
+        price_diff = price_diff[:, None]
+        prev_close = prev_close[:, None]
+    pnl = held * price_diff
+    returns = held * price_diff / prev_close
+    return pnl, returns
+
+
+def equity_curve(close, positions, initial=0.0):
+    """
+    バーごとの累積損益（エクイティカーブ）を計算する関数
+    Args:
+        close (array-like): 終値
+        positions (array-like): ポジション（n, または n x k）
+        initial (float): 初期資産
+    Returns:
+        np.ndarray: エクイティカーブ
+    """
+    pnl, _ = bar_returns(close, positions)
+    return initial + np.cumsum(pnl, axis=0)
+
+
+def max_drawdown(equity):
+    """
+    最大ドローダウンとその期間（バー数）を計算する関数
+    Args:
+        equity (array-like): エクイティカーブ（n, または n x k）
+    Returns:
+        tuple: (最大ドローダウン（正の値）, 最長ドローダウン期間（バー数）)
+    """
+    equity = np.asarray(equity, dtype=float)
+    running_max = np.maximum.accumulate(equity, axis=0)
+    drawdown = running_max - equity
+
+    # 直近の高値更新バーからの経過本数がドローダウン期間
+    idx = np.arange(len(equity))
+    if equity.ndim == 2:
+        idx = np.broadcast_to(idx[:, None], equity.shape)
+    last_peak = np.maximum.accumulate(np.where(drawdown == 0, idx, 0), axis=0)
+    duration = idx - last_peak
+    return drawdown.max(axis=0), duration.max(axis=0)
+
+
+def sharpe_ratio(returns, periods=1.0):
+    """
+    シャープレシオを計算する関数（無リスク金利は0とする）
+    Args:
+        returns (array-like): バーごとの収益率
+        periods (float): 年率換算用の1年あたりのバー数
+    Returns:
+        float or np.ndarray: シャープレシオ
+    """
+    returns = np.asarray(returns, dtype=float)
+    std = returns.std(axis=0, ddof=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = returns.mean(axis=0) / std * np.sqrt(periods)
+    return np.where(std > 0, ratio, 0.0)
+
+
+def sortino_ratio(returns, periods=1.0):
+    """
+    ソルティノレシオを計算する関数（下方偏差のみでリスクを評価）
+    Args:
+        returns (array-like): バーごとの収益率
+        periods (float): 年率換算用の1年あたりのバー数
+    Returns:
+        float or np.ndarray: ソルティノレシオ
+    """
+    returns = np.asarray(returns, dtype=float)
+    downside = np.sqrt(np.mean(np.minimum(returns, 0.0) ** 2, axis=0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = returns.mean(axis=0) / downside * np.sqrt(periods)
+    return np.where(downside > 0, ratio, 0.0)
+
+
+def exposure(positions):
+    """ポジションを保有していたバーの割合"""
+    return np.mean(np.asarray(positions) != 0, axis=0)
+
+
+def turnover(positions):
+    """ポジション変化量の合計（ドテンは2とカウント）"""
+    positions = np.asarray(positions, dtype=float)
+    return np.abs(np.diff(positions, axis=0, prepend=0.0)).sum(axis=0)
+
+
+def trade_stats(profits):
+    """
+    決済済みトレードの損益からトレード統計を計算する関数
+    Args:
+        profits (array-like): 決済ごとの損益（n, または NaN 埋めの n x k）
+    Returns:
+        dict: total_trades, win_rate, average_win, average_loss, expected_value, profit_factor
+    """
+    profits = np.asarray(profits, dtype=float)
+    valid = ~np.isnan(profits)
+    total = valid.sum(axis=0)
+    wins = np.where(profits > 0, profits, 0.0)
+    losses = np.where(profits < 0, -profits, 0.0)
+    n_win = (profits > 0).sum(axis=0)
+    n_loss = (profits < 0).sum(axis=0)
+    gross_win = wins.sum(axis=0)
+    gross_loss = losses.sum(axis=0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        win_rate = np.where(total > 0, n_win / total, 0.0)
+        loss_rate = np.where(total > 0, n_loss / total, 0.0)
+        average_win = np.where(n_win > 0, gross_win / n_win, 0.0)
+        average_loss = np.where(n_loss > 0, gross_loss / n_loss, 0.0)
+        profit_factor = np.where(gross_loss > 0, gross_win / gross_loss, np.inf)
+
+    return _unwrap({
+        "total_trades": total,
+        "win_rate": win_rate,
+        "average_win": average_win,
+        "average_loss": average_loss,
+        "expected_value": win_rate * average_win - loss_rate * average_loss,
+        "profit_factor": profit_factor,
+    })
+
+
+def closed_profits(trades_df):
+    """trades_df から決済（exit_*）行の損益だけを取り出す"""
+    if trades_df is None or len(trades_df) == 0 or "profit" not in trades_df:
+        return np.empty(0)
+    exits = trades_df["action"].str.startswith("exit").to_numpy()
+    return trades_df["profit"].to_numpy(dtype=float)[exits]
+
+
+def summarize(close, positions, profits=None, interval=None):
+    """
+    エクイティカーブ・ドローダウン・シャープ/ソルティノ・エクスポージャー・
+    回転率・トレード統計をまとめて計算する関数
+    Args:
+        close (array-like): 終値
+        positions (array-like): ポジション（n, または n x k）
+        profits (array-like): 決済ごとの損益（省略可）
+        interval (str): 年率換算に使う時間間隔（省略時は年率換算しない）
+    Returns:
+        dict: 各指標（2次元入力の場合は各値が長さ k の配列）
+    """
+    periods = periods_per_year(interval) if interval else 1.0
+    pnl, returns = bar_returns(close, positions)
+    equity = np.cumsum(pnl, axis=0)
+    mdd, mdd_duration = max_drawdown(equity)
+
+    result = {
+        "total_profit": equity[-1],
+        "max_drawdown": mdd,
+        "max_drawdown_duration": mdd_duration,
+        "sharpe": sharpe_ratio(returns, periods),
+        "sortino": sortino_ratio(returns, periods),
+        "exposure": exposure(positions),
+        "turnover": turnover(positions),
+    }
+    if profits is not None:
+        result.update(trade_stats(profits))
+    return _unwrap(result)
+
+
+def summarize_trades(df, trades_df, interval=None):
+    """
+    バックテストスクリプトの df / trades_df から summarize を呼び出すヘルパー
+    Returns:
+        tuple: (指標の dict, エクイティカーブの pd.Series)
+    """
+    positions = positions_from_trades(df["datetime"], trades_df)
+    stats = summarize(df["c"].to_numpy(dtype=float), positions, closed_profits(trades_df), interval)
+    equity = pd.Series(equity_curve(df["c"].to_numpy(dtype=float), positions), index=df["datetime"])
+    return stats, equity
+
+
+def print_summary(stats):
+    """summarize の結果を表示する"""
+    for key, value in stats.items():
+        print(f"{key}: {value}")
@@ -0,0 +1,378 @@
+import asyncio
+import time
+
+import aiohttp
+from hyperliquid.utils.constants import MAINNET_API_URL
+from hyperliquid.utils.signing import (
+    get_timestamp_ms,
+    order_request_to_order_wire,
+    order_wires_to_order_action,
+    sign_l1_action,
+)
+
+from risk import RiskCheckError
+
+
+# 非同期の注文実行クライアント
+#
+# hyperliquid.exchange.Exchange の署名ロジックをそのまま使い、HTTP 部分だけを
+# aiohttp の常時接続プールに置き換える。短い時間窓に届いた注文/キャンセルは
+# 1つの bulk アクションにまとめて送信し、独立したリクエストは並行して送る。
+#
+# 使用例:
+#     exchange = Exchange(account, base_url=API_URL, account_address=ACCOUNT_ADDRESS)
+#     async with AsyncExchange(exchange) as client:
+#         results = await asyncio.gather(
+#             client.order("BTC", True, 0.001, 60000, {"limit": {"tif": "Gtc"}}),
+#             client.order("ETH", True, 0.01, 3000, {"limit": {"tif": "Gtc"}}),
+#         )
+
+# Hyperliquid の IP 単位のレート制限（重み 1200 / 分）
+RATE_LIMIT_WEIGHT_PER_MIN = 1200
+INFO_WEIGHT = 20
+INFO_LIGHT_WEIGHT = 2
+INFO_LIGHT_TYPES = {"l2Book", "allMids", "clearinghouseState", "orderStatus", "spotClearinghouseState"}
+
+
+def exchange_weight(batch_length):
+    """exchange アクションの重み（1 + floor(バッチ長 / 40)）"""
+    return 1 + batch_length // 40
+
+
+class TokenBucket:
+    """
+    トークンバケット方式のレート制限スケジューラ
+    Args:
+        rate (float): 1秒あたりに補充されるトークン数
+        capacity (float): バケットの最大容量（バースト許容量）
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, weight=1):
+        """トークンが weight 個たまるまで待ってから消費する（先着順）"""
+        async with self._lock:
+            self._refill()
+            while self.tokens < weight:
+                await asyncio.sleep((weight - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= weight
+
+
+class _Batcher:
+    """
+    短い時間窓に届いたリクエストを1つの bulk アクションにまとめるキュー
+    Args:
+        flush (coroutine function): リクエストのリストを受け取り、同じ順序の結果リストを返す
+            （結果が例外オブジェクトのリクエストは、その例外を送出する）
+        window (float): まとめる時間窓（秒）
+        max_size (int): 1回の bulk アクションの最大件数
+    """
+
+    def __init__(self, flush, window, max_size):
+        self._flush = flush
+        self.window = window
+        self.max_size = max_size
+        self._pending = []
+        self._timer = None
+        # 実行中のバッチ（参照を持っておかないと実行途中のタスクが GC されることがある）
+        self._tasks = set()
+
+    async def submit(self, request):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((request, future))
+        if len(self._pending) >= self.max_size:
+            self._flush_pending()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush_pending)
+        return await future
+
+    def _flush_pending(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def drain(self):
+        """保留中のリクエストを送信し、実行中のバッチがすべて終わるまで待つ"""
+        self._flush_pending()
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _run(self, batch):
+        requests = [request for request, _ in batch]
+        try:
+            results = await self._flush(requests)
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+class AsyncExchange:
+    """
+    常時接続プール・注文のバッチ化・レート制限つきの非同期注文クライアント
+    Args:
+        exchange (Exchange): 署名に使う hyperliquid.exchange.Exchange
+        max_connections (int): 接続プールの最大接続数
+        batch_window (float): 注文/キャンセルをまとめる時間窓（秒）
+        max_batch (int): 1回の bulk アクションの最大件数
+        rate_limit (float): 1分あたりの重みの上限
+        risk (RiskChecker): 署名前に実行するリスクチェック（省略可）
+    """
+
+    def __init__(self, exchange, max_connections=8, batch_window=0.002, max_batch=40,
+                 rate_limit=RATE_LIMIT_WEIGHT_PER_MIN, risk=None):
+        self.exchange = exchange
+        self.risk = risk
+        self.base_url = exchange.base_url
+        self.max_connections = max_connections
+        self.bucket = TokenBucket(rate_limit / 60.0, rate_limit)
+        self._order_batcher = _Batcher(self._send_orders, batch_window, max_batch)
+        self._cancel_batcher = _Batcher(self._send_cancels, batch_window, max_batch)
+        self._session = None
+        self._last_nonce = 0
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def open(self):
+        """接続プールを作成する（keep-alive で接続を使い回す）"""
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers={"Content-Type": "application/json"},
+                timeout=aiohttp.ClientTimeout(total=10),
+            )
+
+    async def close(self):
+        """保留中の注文/キャンセルを送信し終えてから接続プールを閉じる"""
+        await self._order_batcher.drain()
+        await self._cancel_batcher.drain()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _post(self, path, payload, weight):
+        await self.bucket.acquire(weight)
+        async with self._session.post(self.base_url + path, json=payload) as response:
+            response.raise_for_status()
+            return await response.json()
+
+    def _next_nonce(self):
+        # 同じミリ秒に複数のアクションを送ってもノンスが重複しないようにする
+        nonce = max(get_timestamp_ms(), self._last_nonce + 1)
+        self._last_nonce = nonce
+        return nonce
+
+    def _sign(self, action, nonce):
+        exchange = self.exchange
+        is_mainnet = exchange.base_url == MAINNET_API_URL
+        # SDK のバージョンによって sign_l1_action に expires_after 引数がある
+        if hasattr(exchange, "expires_after"):
+            return sign_l1_action(exchange.wallet, action, exchange.vault_address, nonce,
+                                  exchange.expires_after, is_mainnet)
+        return sign_l1_action(exchange.wallet, action, exchange.vault_address, nonce, is_mainnet)
+
+    async def post_action(self, action, weight=1):
+        """
+        L1 アクションに署名して /exchange に送信する
+        （署名は CPU 処理なので別スレッドで行い、イベントループを止めない）
+        """
+        nonce = self._next_nonce()
+        signature = await asyncio.to_thread(self._sign, action, nonce)
+        payload = {
+            "action": action,
+            "nonce": nonce,
+            "signature": signature,
+            "vaultAddress": self.exchange.vault_address,
+        }
+        expires_after = getattr(self.exchange, "expires_after", None)
+        if expires_after is not None:
+            payload["expiresAfter"] = expires_after
+        return await self._post("/exchange", payload, weight)
+
+    def _asset(self, coin):
+        info = self.exchange.info
+        if hasattr(info, "name_to_asset"):
+            return info.name_to_asset(coin)
+        return info.coin_to_asset[coin]
+
+    @staticmethod
+    def _statuses(response, count):
+        """bulk アクションのレスポンスを各リクエストの結果に分解する"""
+        if response.get("status") == "ok":
+            statuses = response["response"]["data"]["statuses"]
+            if len(statuses) == count:
+                return statuses
+        return [{"error": response}] * count
+
+    @staticmethod
+    def _build(requests, build, results=None):
+        """
+        リクエストごとに送信する要素を作る（銘柄が不明などで作れないリクエストだけを除く）
+        Args:
+            results (list): すでに結果が決まっている（送信しない）リクエストの結果（それ以外は None）
+        Returns:
+            tuple: (送信する要素, その元のリクエストの番号, 結果のリスト（作れなかったものは例外オブジェクト）)
+        """
+        items, indices = [], []
+        results = [None] * len(requests) if results is None else results
+        for i, request in enumerate(requests):
+            if results[i] is not None:
+                continue
+            try:
+                items.append(build(request))
+            except Exception as e:
+                results[i] = e
+                continue
+            indices.append(i)
+        return items, indices, results
+
+    async def _post_bulk(self, action, indices, results):
+        response = await self.post_action(action, exchange_weight(len(indices)))
+        for i, status in zip(indices, self._statuses(response, len(indices))):
+            results[i] = status
+        return results
+
+    def _check_risk(self, order_requests, atomic):
+        """
+        署名前のリスクチェック（通過した注文のサイズは応答を受け取るまで予約しておく）
+        Args:
+            atomic (bool): 1つでも違反したらすべての注文を送信しない
+        Returns:
+            tuple: (注文の番号 -> 予約, 結果のリスト（違反した注文は {"error": ...}、それ以外は None）)
+        """
+        results = [None] * len(order_requests)
+        if self.risk is None:
+            return {}, results
+        reservations = {}
+        try:
+            for i, order in enumerate(order_requests):
+                try:
+                    reservations[i] = self.risk.check(order["coin"], order["is_buy"], order["sz"], order["limit_px"],
+                                                      order.get("reduce_only", False))
+                except RiskCheckError as e:
+                    results[i] = {"error": str(e)}
+        except BaseException:
+            # チェック自体が失敗したら、それまでの予約を残さない
+            for reservation in reservations.values():
+                self.risk.release(reservation)
+            raise
+        if atomic and any(results):
+            for reservation in reservations.values():
+                self.risk.release(reservation)
+            reservations = {}
+            results = [result or {"error": "同じバッチの注文がリスクチェックに違反したため送信しません"}
+                       for result in results]
+        return reservations, results
+
+    async def _send_orders(self, order_requests, atomic=False):
+        """
+        注文をリスクチェックして1つの bulk アクションとして送信する
+        Args:
+            atomic (bool): 1つでもリスクチェックに違反したらバッチ全体を送信しない
+        Returns:
+            list: 各注文のステータス（リスクチェックに違反した注文は {"error": ...}、
+                wire にできなかった注文は例外オブジェクト）
+        """
+        reservations, results = self._check_risk(order_requests, atomic)
+        statuses = None
+        try:
+            wires, indices, results = self._build(
+                order_requests, lambda order: order_request_to_order_wire(order, self._asset(order["coin"])), results)
+            if not wires:
+                return results
+            statuses = await self._post_bulk(order_wires_to_order_action(wires), indices, results)
+            return statuses
+        finally:
+            # 受理された注文は口座状態に反映される（板に載った注文・約定を受け取る）まで予約を持ち越し、
+            # それ以外（送信しなかった・拒否された・応答がない）はすぐ解除する
+            for i, reservation in reservations.items():
+                self.risk.settle(reservation, statuses[i] if statuses is not None else None)
+
+    async def _send_cancels(self, cancel_requests):
+        cancels, indices, results = self._build(
+            cancel_requests, lambda cancel: {"a": self._asset(cancel["coin"]), "o": cancel["oid"]})
+        if not cancels:
+            return results
+        return await self._post_bulk({"type": "cancel", "cancels": cancels}, indices, results)
+
+    @staticmethod
+    def _errors_to_statuses(results):
+        return [{"error": str(result)} if isinstance(result, Exception) else result for result in results]
+
+    async def order(self, coin, is_buy, sz, limit_px, order_type, reduce_only=False, cloid=None):
+        """
+        注文を発注する（同時に発注された他の注文と1つの bulk アクションにまとめられる）
+        Returns:
+            dict: この注文のステータス（"resting" / "filled" / "error"。リスクチェックに違反した注文は送信せず "error"）
+        """
+        order = {
+            "coin": coin,
+            "is_buy": is_buy,
+            "sz": sz,
+            "limit_px": limit_px,
+            "order_type": order_type,
+            "reduce_only": reduce_only,
+        }
+        if cloid is not None:
+            order["cloid"] = cloid
+        return await self._order_batcher.submit(order)
+
+    async def cancel(self, coin, oid):
+        """注文をキャンセルする（同時に要求された他のキャンセルとまとめて送信される）"""
+        return await self._cancel_batcher.submit({"coin": coin, "oid": oid})
+
+    async def bulk_orders(self, order_requests):
+        """
+        注文のリストをそのまま1つの bulk アクションとして送信する（送信できなかった注文は {"error": ...}）。
+        1つでもリスクチェックに違反したら、署名する前にバッチ全体を拒否する
+        """
+        return self._errors_to_statuses(await self._send_orders(order_requests, atomic=True))
+
+    async def bulk_cancel(self, cancel_requests):
+        """キャンセルのリストをそのまま1つの bulk アクションとして送信する（送信できなかったものは {"error": ...}）"""
+        return self._errors_to_statuses(await self._send_cancels(cancel_requests))
+
+    async def info(self, payload):
+        """/info にリクエストを送る"""
+        weight = INFO_LIGHT_WEIGHT if payload.get("type") in INFO_LIGHT_TYPES else INFO_WEIGHT
+        return await self._post("/info", payload, weight)
+
+    async def query_order_by_oid(self, user, oid):
+        return await self.info({"type": "orderStatus", "user": user, "oid": oid})
+
+    async def open_orders(self, user):
+        return await self.info({"type": "openOrders", "user": user})
@@ -1,11 +1,51 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-from fetch_candles import fetch_candles
-import time
-import datetime
+import argparse
+import math
+import sys
 
 
 # RSI x MA Strategy
+#
+# import しただけではデータ取得やレポート出力は行わない（python backtest.py で main() を実行する）。
+# pandas / matplotlib / SDK は使う関数の中で読み込むので、calculate_rsi などを
+# プロセスプールのワーカーから使っても起動が重くならない。
+
+# add_indicators の結果に影響するパラメータ（walk_forward.py は組み合わせごとに指標を1回だけ計算し、
+# それ以外のパラメータはその指標を使い回して評価する）
+INDICATOR_PARAMS = ("interval", "short_window", "long_window", "rsi_period", "trend_interval", "trend_window")
+
+
+class BacktestConfig:
+    """
+    バックテストの設定
+    Args:
+        symbol (str): 銘柄
+        interval (str): 足の間隔
+        days (int): 取得する日数
+        short_window (int): 短期移動平均の期間
+        long_window (int): 長期移動平均の期間
+        rsi_period (int): RSIの計算期間
+        rsi_threshold_buy (float): 買いシグナルを有効にするRSIの下限
+        rsi_threshold_sell (float): 売りシグナルを有効にするRSIの上限
+        trend_interval (str): 上位足のトレンドフィルターに使う時間軸（None で無効。interval の整数倍）
+        trend_window (int): 上位足の移動平均の期間
+        report_dir (str): レポートの出力先
+    """
+
+    def __init__(self, symbol="BTC", interval="15m", days=100, short_window=5, long_window=20,
+                 rsi_period=14, rsi_threshold_buy=50, rsi_threshold_sell=50, trend_interval=None,
+                 trend_window=20, report_dir="reports"):
+        self.symbol = symbol
+        self.interval = interval
+        self.days = days
+        self.short_window = short_window
+        self.long_window = long_window
+        self.rsi_period = rsi_period
+        self.rsi_threshold_buy = rsi_threshold_buy
+        self.rsi_threshold_sell = rsi_threshold_sell
+        self.trend_interval = trend_interval
+        self.trend_window = trend_window
+        self.report_dir = report_dir
+
 
 def calculate_rsi(series, period=14):
     """
@@ -20,145 +60,233 @@ def calculate_rsi(series, period=14):
     # 利上げと下げを分ける
     gain = delta.where(delta > 0, 0)
     loss = -delta.where(delta < 0, 0)
-    
+
     # 平均上昇・平均下降を計算（単純移動平均の場合）
     avg_gain = gain.rolling(window=period, min_periods=period).mean()
     avg_loss = loss.rolling(window=period, min_periods=period).mean()
-    
+
     # 初期値の計算後、RSIは後続の値に対してEMA的に更新する方法もあるが、ここではシンプルにSMAを使います
     rs = avg_gain / avg_loss
     rsi = 100 - (100 / (1 + rs))
     return rsi
 
 
-# --- データ取得 ---
-symbol = "BTC"
-interval = "15m"
-days = 100
-df = fetch_candles(symbol, interval, days)
-if df is None:
-    raise Exception("Failed to fetch candle data.")
+def add_indicators(df, config):
+    """
+    移動平均とRSIを df に追加する
+    Args:
+        df (pd.DataFrame): fetch_candles の戻り値
+        config (BacktestConfig): 設定
+    Returns:
+        pd.DataFrame: 指標を追加した df（引数と同じオブジェクト）
+    """
+    import pandas as pd
 
-# --- 移動平均計算 ---
-short_window = 5
-long_window = 20
-df['c'] = pd.to_numeric(df['c'])
-df['ma_short'] = df['c'].rolling(window=short_window).mean()
-df['ma_long'] = df['c'].rolling(window=long_window).mean()
+    # --- 移動平均計算 ---
+    df['c'] = pd.to_numeric(df['c'])
+    df['ma_short'] = df['c'].rolling(window=config.short_window).mean()
+    df['ma_long'] = df['c'].rolling(window=config.long_window).mean()
 
-print(df)
+    # 'c' 列は終値なので、そのSeriesからRSIを計算する
+    df['rsi'] = calculate_rsi(df['c'], period=config.rsi_period)
 
-# 'c' 列は終値なので、そのSeriesからRSIを計算する
-df['rsi'] = calculate_rsi(df['c'], period=14)
+    # 上位足の移動平均（同じデータから集約し、各足の時点で確定している上位足の値だけを使う）
+    if config.trend_interval:
+        from timeframes import MultiTimeframe
 
-# 確認用に先頭数行を表示
-print(df[['datetime', 'c', 'rsi']].head(20))
+        mtf = MultiTimeframe(df, config.interval)
+        trend = mtf.get(config.trend_interval)
+        trend['ma'] = trend['c'].rolling(window=config.trend_window).mean()
+        df['trend_ma'] = mtf.aligned(config.trend_interval, ['ma'], suffix='')['ma']
+    return df
 
 
 # --- シグナル生成ロジック---
 def generate_signal(prev, curr, rsi_threshold_buy=50, rsi_threshold_sell=50):
     # MAが計算されているかチェック
-    if pd.isna(prev['ma_short']) or pd.isna(prev['ma_long']) or pd.isna(curr['ma_short']) or pd.isna(curr['ma_long']):
+    if math.isnan(prev['ma_short']) or math.isnan(prev['ma_long']) or math.isnan(curr['ma_short']) or math.isnan(curr['ma_long']):
         return None
-    
+
     # RSIも両期間でチェック（ここでは最新のRSIを使う例）
-    if pd.isna(curr['rsi']):
+    if math.isnan(curr['rsi']):
         return None
-    
+
+    # 上位足のトレンドフィルター（trend_interval を指定したときだけ trend_ma 列がある）
+    trend_ma = curr.get('trend_ma')
+    if trend_ma is not None and math.isnan(trend_ma):
+        return None
+
     # MAクロスのシグナル
     if prev['ma_short'] < prev['ma_long'] and curr['ma_short'] > curr['ma_long']:
-        # 買いシグナルなら、RSIが閾値以上の場合のみ有効
-        if curr['rsi'] >= rsi_threshold_buy:
+        # 買いシグナルなら、RSIが閾値以上（かつ上位足が上昇トレンド）の場合のみ有効
+        if curr['rsi'] >= rsi_threshold_buy and (trend_ma is None or curr['c'] >= trend_ma):
             return "Buy Signal"
     elif prev['ma_short'] > prev['ma_long'] and curr['ma_short'] < curr['ma_long']:
-        # 売りシグナルなら、RSIが閾値以下の場合のみ有効
-        if curr['rsi'] <= rsi_threshold_sell:
+        # 売りシグナルなら、RSIが閾値以下（かつ上位足が下降トレンド）の場合のみ有効
+        if curr['rsi'] <= rsi_threshold_sell and (trend_ma is None or curr['c'] <= trend_ma):
             return "Sell Signal"
     return None
 
 
-    
-# --- バックテストループ ---
-trades = []
-position = None   # 現在のポジション: None, "long", "short"
-entry_price = None
-
-for idx in range(1, len(df)):
-    prev = df.iloc[idx - 1]
-    curr = df.iloc[idx]
-    
-    signal = generate_signal(prev, curr)
-    
-    if signal is None:
-        continue
-    
-    if signal == "Sell Signal":
-        if position == 'long':
-            exit_price = curr['c']
-            profit = exit_price - entry_price
-            trades.append({"action": "exit_long", "price": exit_price, "time": curr['datetime'], "profit": profit})
-            
-            position = 'short'
-            entry_price = exit_price
-            trades.append({"action": "enter_short", "price": entry_price, "time": curr['datetime']})
-            
-        elif position is None:
-            position = 'short'
-            entry_price = curr['c']
-            trades.append({"action": "enter_short", "price": entry_price, "time": curr['datetime']})
-    
-    elif signal == 'Buy Signal':
-        
-        if position == "short":
-            
-            exit_price = curr['c']
-            profit = entry_price - exit_price
-            trades.append({"action": "exit_short", "price": exit_price, "time": curr['datetime'], "profit": profit})
-            
-            # 同時にロングポジションを開始
-            position = "long"
-            entry_price = exit_price
-            trades.append({"action": "enter_long", "price": entry_price, "time": curr['datetime']})
-            
-        elif position is None:
-            
-            position = "long"
-            entry_price = curr['c']
-            trades.append({"action": "enter_long", "price": entry_price, "time": curr['datetime']})
-            
-if position is not None:
-    final_price = df.iloc[-1]['c']
-    
-    if position == "long":
-        profit = final_price - entry_price
-        trades.append({"action": "exit_long", "price": final_price, "time": df.iloc[-1]['datetime'], "profit": profit})
-        
-    elif position == "short":
-        profit = entry_price - final_price
-        trades.append({"action": "exit_short", "price": final_price, "time": df.iloc[-1]['datetime'], "profit": profit})
-    position = None
-
-
-# --- 結果の表示 ---
-trades_df = pd.DataFrame(trades)
-print(trades_df)
-total_profit = trades_df[trades_df["action"].str.contains("exit")]["profit"].sum()
-print("Total Profit:", total_profit)
-
-
-# --- グラフ表示 ---
-plt.figure(figsize=(12,6))
-plt.plot(df['datetime'], df['c'], label='Close Price')
-for _, trade in trades_df.iterrows():
-    if "enter" in trade["action"]:
-        plt.scatter(trade["time"], trade["price"], color='yellow', marker='v', label=trade["action"])
-    elif "exit" in trade["action"]:
-        plt.scatter(trade["time"], trade["price"], color='red', marker='o', label=trade["action"])
-plt.xlabel("Time")
-plt.ylabel("Price")
-plt.title("Backtest: Trade Entries and Exits")
-plt.show()
-
-
-
-            
\ No newline at end of file
+def run_backtest(df, config):
+    """
+    指標計算済みの df でバックテストを実行する
+    Args:
+        df (pd.DataFrame): add_indicators 済みのデータ
+        config (BacktestConfig): 設定
+    Returns:
+        pd.DataFrame: トレード履歴
+    """
+    import pandas as pd
+
+    # df.iloc で1行ずつ取り出すと遅いので、dict のリストにしてからループする
+    return pd.DataFrame(simulate_trades(df.to_dict("records"), config))
+
+
+def simulate_trades(rows, config):
+    """
+    バックテストループ本体
+    Args:
+        rows (list): add_indicators 済みの df の各行の dict（df.to_dict("records") またはその一部）
+        config (BacktestConfig): 設定
+    Returns:
+        list: トレード履歴（1トレード1つの dict）
+    """
+    # --- バックテストループ ---
+    trades = []
+    position = None   # 現在のポジション: None, "long", "short"
+    entry_price = None
+
+    for idx in range(1, len(rows)):
+        prev = rows[idx - 1]
+        curr = rows[idx]
+
+        signal = generate_signal(prev, curr, config.rsi_threshold_buy, config.rsi_threshold_sell)
+
+        if signal is None:
+            continue
+
+        if signal == "Sell Signal":
+            if position == 'long':
+                exit_price = curr['c']
+                profit = exit_price - entry_price
+                trades.append({"action": "exit_long", "price": exit_price, "time": curr['datetime'], "profit": profit})
+
+                position = 'short'
+                entry_price = exit_price
+                trades.append({"action": "enter_short", "price": entry_price, "time": curr['datetime']})
+
+            elif position is None:
+                position = 'short'
+                entry_price = curr['c']
+                trades.append({"action": "enter_short", "price": entry_price, "time": curr['datetime']})
+
+        elif signal == 'Buy Signal':
+
+            if position == "short":
+
+                exit_price = curr['c']
+                profit = entry_price - exit_price
+                trades.append({"action": "exit_short", "price": exit_price, "time": curr['datetime'], "profit": profit})
+
+                # 同時にロングポジションを開始
+                position = "long"
+                entry_price = exit_price
+                trades.append({"action": "enter_long", "price": entry_price, "time": curr['datetime']})
+
+            elif position is None:
+
+                position = "long"
+                entry_price = curr['c']
+                trades.append({"action": "enter_long", "price": entry_price, "time": curr['datetime']})
+
+    if position is not None:
+        final_price = rows[-1]['c']
+
+        if position == "long":
+            profit = final_price - entry_price
+            trades.append({"action": "exit_long", "price": final_price, "time": rows[-1]['datetime'], "profit": profit})
+
+        elif position == "short":
+            profit = entry_price - final_price
+            trades.append({"action": "exit_short", "price": final_price, "time": rows[-1]['datetime'], "profit": profit})
+        position = None
+
+    return trades
+
+
+def parse_args(argv=None):
+    from profiling import add_profile_arguments
+    from result_cache import add_cache_arguments
+    from robustness import add_robustness_arguments
+
+    defaults = BacktestConfig()
+    parser = argparse.ArgumentParser(description="RSI x MA バックテスト")
+    parser.add_argument("--symbol", default=defaults.symbol)
+    parser.add_argument("--interval", default=defaults.interval)
+    parser.add_argument("--days", type=int, default=defaults.days)
+    parser.add_argument("--short-window", type=int, default=defaults.short_window)
+    parser.add_argument("--long-window", type=int, default=defaults.long_window)
+    parser.add_argument("--trend-interval", default=defaults.trend_interval,
+                        help="上位足のトレンドフィルターの時間軸（例: 1h。--interval の足から集約する）")
+    parser.add_argument("--trend-window", type=int, default=defaults.trend_window)
+    parser.add_argument("--report-dir", default=defaults.report_dir)
+    add_profile_arguments(parser)
+    add_cache_arguments(parser)
+    add_robustness_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    from fetch_candles import fetch_candles
+    from analytics import print_summary
+    from report import plot_backtest
+    from profiling import profiler_from_args
+    from result_cache import cache_from_args, evaluate
+    from robustness import robustness_from_args
+
+    args = parse_args(argv)
+    config = BacktestConfig(symbol=args.symbol, interval=args.interval, days=args.days,
+                            short_window=args.short_window, long_window=args.long_window,
+                            trend_interval=args.trend_interval, trend_window=args.trend_window,
+                            report_dir=args.report_dir)
+    # --profile 指定時のみプロファイリングを有効にする
+    profiler = profiler_from_args("backtest", args)
+
+    # --- データ取得 ---
+    df = fetch_candles(config.symbol, config.interval, config.days)
+    if df is None:
+        raise Exception("Failed to fetch candle data.")
+
+    # --- バックテスト（データ・パラメータ・コードが前回と同じならキャッシュから読む） ---
+    result = evaluate(sys.modules[__name__], df, config, cache_from_args(args))
+    print(df)
+    # 確認用に先頭数行を表示
+    print(df[['datetime', 'c', 'rsi']].head(20))
+
+    # --- 結果の表示 ---
+    trades_df = result.trades
+    print("Cache:", "hit" if result.cached else "miss")
+    print(trades_df)
+    total_profit = trades_df[trades_df["action"].str.contains("exit")]["profit"].sum()
+    print("Total Profit:", total_profit)
+
+    # --- パフォーマンス分析 ---
+    stats = result.stats
+    print_summary(stats)
+    # --robustness 指定時のみ、損益・最大ドローダウンの分布を表示する
+    robustness_from_args(df, trades_df, args)
+
+    # --- レポート出力 ---
+    # plt.show() はブロックしてしまうので、ファイルに書き出す
+    report_base = f"{config.report_dir}/backtest_{config.symbol}_{config.interval}"
+    report_paths = plot_backtest(df, trades_df, [report_base + ".png", report_base + ".html"],
+                                 title="Backtest: Trade Entries and Exits", stats=stats)
+    print("Report:", report_paths)
+
+    if profiler is not None:
+        profiler.stop()
+
+
+if __name__ == "__main__":
+    main()
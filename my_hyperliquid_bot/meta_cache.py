@@ -0,0 +1,176 @@
+import json
+import os
+import threading
+import time
+import urllib.request
+from urllib.parse import urlparse
+
+
+# 取引所メタデータ（銘柄一覧・szDecimals・asset id）のディスクキャッシュ
+#
+# Info / Exchange は生成時に perp と spot の meta をネットワークから取得するが、
+# このキャッシュが温まっていれば meta / spot_meta をそのまま渡せるので、
+# 起動から最初の注文までネットワークアクセスなしで進められる。
+#
+# 使用例:
+#     cache = MetaCache(API_URL)
+#     info = Info(base_url=API_URL, skip_ws=True, **cache.sdk_kwargs())
+#     exchange = Exchange(account, base_url=API_URL, account_address=ACCOUNT_ADDRESS, **cache.sdk_kwargs())
+#     px = cache.round_price("BTC", 60123.456)
+
+DEFAULT_API_URL = "https://api.hyperliquid.xyz"
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+DEFAULT_TTL = 6 * 60 * 60  # キャッシュの有効期限（秒）
+SPOT_ASSET_OFFSET = 10000
+MAX_DECIMALS_PERP = 6
+MAX_DECIMALS_SPOT = 8
+MAX_SIG_FIGS = 5
+
+
+def _post_info(base_url, payload, timeout=10):
+    request = urllib.request.Request(
+        base_url + "/info",
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+class MetaCache:
+    """
+    perp / spot のメタデータを TTL つきでディスクに保存し、O(1) で引けるようにするクラス
+    Args:
+        base_url (str): APIエンドポイント
+        cache_dir (str): キャッシュファイルを置くディレクトリ
+        ttl (float): キャッシュの有効期限（秒）。期限切れでも読み込みは行い、裏で更新する
+    """
+
+    def __init__(self, base_url=DEFAULT_API_URL, cache_dir=DEFAULT_CACHE_DIR, ttl=DEFAULT_TTL):
+        self.base_url = base_url
+        self.ttl = ttl
+        host = urlparse(base_url).hostname or "default"
+        self.path = os.path.join(cache_dir, f"meta_{host}.json")
+        self.meta = None
+        self.spot_meta = None
+        self.fetched_at = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.coin_to_asset = {}
+        self.coin_to_sz_decimals = {}
+        self._spot_coins = set()
+
+        if not self._load():
+            self.refresh()
+        elif self.is_stale():
+            # 古いキャッシュで起動を続け、更新はバックグラウンドで行う
+            threading.Thread(target=self._refresh_quietly, daemon=True).start()
+
+    def is_stale(self):
+        return time.time() - self.fetched_at > self.ttl
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return False
+        self._apply(cached["meta"], cached["spot_meta"], cached["fetched_at"])
+        return True
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"meta": self.meta, "spot_meta": self.spot_meta, "fetched_at": self.fetched_at}, f)
+        # 書き込み途中のファイルを他のプロセスが読まないように置き換える
+        os.replace(tmp_path, self.path)
+
+    def _apply(self, meta, spot_meta, fetched_at):
+        coin_to_asset = {}
+        coin_to_sz_decimals = {}
+        spot_coins = set()
+
+        for asset, asset_info in enumerate(meta["universe"]):
+            coin_to_asset[asset_info["name"]] = asset
+            coin_to_sz_decimals[asset_info["name"]] = asset_info["szDecimals"]
+
+        tokens = {token["index"]: token for token in spot_meta["tokens"]}
+        for spot_info in spot_meta["universe"]:
+            asset = spot_info["index"] + SPOT_ASSET_OFFSET
+            base = tokens[spot_info["tokens"][0]]
+            quote = tokens[spot_info["tokens"][1]]
+            # SDK と同じく "PURR/USDC" 形式と "@index" 形式の両方で引けるようにする
+            for name in (spot_info["name"], f"{base['name']}/{quote['name']}"):
+                coin_to_asset.setdefault(name, asset)
+                coin_to_sz_decimals.setdefault(name, base["szDecimals"])
+                spot_coins.add(name)
+
+        with self._lock:
+            self.meta = meta
+            self.spot_meta = spot_meta
+            self.fetched_at = fetched_at
+            self.coin_to_asset = coin_to_asset
+            self.coin_to_sz_decimals = coin_to_sz_decimals
+            self._spot_coins = spot_coins
+
+    def refresh(self):
+        """ネットワークから最新のメタデータを取得してキャッシュを更新する"""
+        meta = _post_info(self.base_url, {"type": "meta"})
+        spot_meta = _post_info(self.base_url, {"type": "spotMeta"})
+        self._apply(meta, spot_meta, time.time())
+        self._save()
+
+    def _refresh_quietly(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            print("メタデータの更新中にエラー:", e)
+
+    def start_background_refresh(self, interval=None):
+        """interval 秒ごとにバックグラウンドでキャッシュを更新する"""
+        if self._thread is not None:
+            return
+        interval = interval or self.ttl
+
+        def loop():
+            while not self._stop.wait(interval):
+                self._refresh_quietly()
+
+        self._thread = threading.Thread(target=loop, daemon=True)
+        self._thread.start()
+
+    def stop_background_refresh(self):
+        self._stop.set()
+        self._thread = None
+
+    def sdk_kwargs(self):
+        """Info / Exchange のコンストラクタに渡す meta と spot_meta"""
+        return {"meta": self.meta, "spot_meta": self.spot_meta}
+
+    def asset(self, coin):
+        """銘柄名から asset id を返す"""
+        return self.coin_to_asset[coin]
+
+    def sz_decimals(self, coin):
+        """銘柄名から数量の小数桁数を返す"""
+        return self.coin_to_sz_decimals[coin]
+
+    def is_spot(self, coin):
+        return coin in self._spot_coins
+
+    def round_size(self, coin, sz):
+        """数量を szDecimals 桁に丸める"""
+        return round(sz, self.coin_to_sz_decimals[coin])
+
+    def round_price(self, coin, px):
+        """
+        価格を取引所のルール（有効数字5桁、小数は最大 6 (spotは8) - szDecimals 桁）に丸める
+        """
+        max_decimals = MAX_DECIMALS_SPOT if coin in self._spot_coins else MAX_DECIMALS_PERP
+        decimals = max_decimals - self.coin_to_sz_decimals[coin]
+        # 整数の価格は有効数字の制限を受けない
+        if px >= 10 ** MAX_SIG_FIGS:
+            return float(round(px))
+        return round(float(f"{px:.{MAX_SIG_FIGS}g}"), decimals)
@@ -0,0 +1,242 @@
+import asyncio
+import json
+import time
+
+import websockets
+
+
+# WebSocket の orderUpdates / userFills チャンネルによる注文・約定の追跡
+#
+# 発注後に query_order_by_oid で HTTP ポーリングする代わりに、取引所からの
+# プッシュで oid ごとの状態をメモリ上に保持し、呼び出し側は約定を await できる。
+#
+# 使用例:
+#     tracker = OrderTracker(ACCOUNT_ADDRESS)
+#     task = asyncio.create_task(tracker.run())
+#     await tracker.wait_ready()
+#     sent_at = time.time()
+#     status = await client.order("BTC", True, 0.001, 60000, {"limit": {"tif": "Ioc"}})
+#     oid = oid_from_status(status)
+#     tracker.register(oid, sent_at)
+#     state = await tracker.wait_for_fill(oid, timeout=5.0)
+#     print(state.fill_latency)
+
+WS_URL = "wss://api.hyperliquid.xyz/ws"
+PING_INTERVAL = 30  # 接続維持のための ping 間隔（秒）
+TERMINAL_STATUSES = {"filled", "canceled", "rejected", "marginCanceled", "triggered"}
+
+
+def oid_from_status(status):
+    """
+    注文レスポンスの statuses の要素から oid を取り出す
+    Args:
+        status (dict): {"resting": {"oid": ...}} または {"filled": {"oid": ...}}
+    Returns:
+        int or None: 注文ID
+    """
+    for key in ("resting", "filled"):
+        if key in status:
+            return status[key].get("oid")
+    return None
+
+
+class OrderState:
+    """1つの注文の状態（orderUpdates と userFills から更新される）"""
+
+    def __init__(self, oid):
+        self.oid = oid
+        self.coin = None
+        self.side = None
+        self.status = None
+        self.orig_sz = None
+        self.filled_sz = 0.0
+        self.fills = []
+        self.sent_at = None        # 発注時刻（ローカル、秒）
+        self.first_fill_at = None  # 最初の約定を受信した時刻（ローカル、秒）
+        self.updated_at = None
+
+    @property
+    def is_filled(self):
+        if self.status == "filled":
+            return True
+        return self.orig_sz is not None and self.filled_sz >= self.orig_sz > 0
+
+    @property
+    def is_done(self):
+        return self.is_filled or self.status in TERMINAL_STATUSES
+
+    @property
+    def fill_latency(self):
+        """発注から最初の約定通知を受け取るまでの時間（秒）"""
+        if self.sent_at is None or self.first_fill_at is None:
+            return None
+        return self.first_fill_at - self.sent_at
+
+    def __repr__(self):
+        return (f"OrderState(oid={self.oid}, coin={self.coin}, status={self.status}, "
+                f"filled_sz={self.filled_sz}, orig_sz={self.orig_sz})")
+
+
+class OrderTracker:
+    """
+    ユーザーの注文状態を WebSocket で追跡するクラス
+    Args:
+        user (str): アカウントアドレス
+        ws_url (str): WebSocket のURL
+    """
+
+    def __init__(self, user, ws_url=WS_URL):
+        self.user = user
+        self.ws_url = ws_url
+        self.orders = {}
+        self.running = True
+        self._waiters = {}
+        self._ready = asyncio.Event()
+        self._subscribed = 0
+
+    def _state(self, oid):
+        state = self.orders.get(oid)
+        if state is None:
+            state = self.orders[oid] = OrderState(oid)
+        return state
+
+    def register(self, oid, sent_at=None):
+        """発注した注文を登録し、レイテンシ計測用に発注時刻を記録する"""
+        state = self._state(oid)
+        if state.sent_at is None:
+            state.sent_at = sent_at if sent_at is not None else time.time()
+        return state
+
+    def get(self, oid):
+        return self.orders.get(oid)
+
+    async def wait_ready(self):
+        """サブスクリプションが完了するまで待つ"""
+        await self._ready.wait()
+
+    async def wait_for(self, oid, predicate, timeout=None):
+        """
+        注文の状態が条件を満たすまで待つ
+        Args:
+            oid (int): 注文ID
+            predicate (callable): OrderState を受け取り bool を返す関数
+            timeout (float): タイムアウト（秒）
+        Returns:
+            OrderState: 条件を満たした時点の状態
+        Raises:
+            asyncio.TimeoutError: タイムアウトした場合
+        """
+        state = self._state(oid)
+        if predicate(state):
+            return state
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(oid, []).append((predicate, future))
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            waiters = self._waiters.get(oid, [])
+            if (predicate, future) in waiters:
+                waiters.remove((predicate, future))
+            if not waiters:
+                self._waiters.pop(oid, None)
+
+    async def wait_for_fill(self, oid, timeout=None):
+        """全量約定するまで待つ"""
+        return await self.wait_for(oid, lambda s: s.is_filled, timeout)
+
+    async def wait_for_done(self, oid, timeout=None):
+        """約定・キャンセルなど最終状態になるまで待つ"""
+        return await self.wait_for(oid, lambda s: s.is_done, timeout)
+
+    def _notify(self, state):
+        for predicate, future in list(self._waiters.get(state.oid, [])):
+            if not future.done() and predicate(state):
+                future.set_result(state)
+
+    def handle_message(self, data):
+        """受信したメッセージ（json.loads 済み）で状態を更新する"""
+        if not isinstance(data, dict):
+            return
+        channel = data.get("channel")
+        if channel == "orderUpdates":
+            for update in data.get("data", []):
+                self._on_order_update(update)
+        elif channel == "userFills":
+            fills_data = data.get("data", {})
+            # スナップショットは過去の約定なのでレイテンシ計測には使わない
+            is_snapshot = fills_data.get("isSnapshot", False)
+            for fill in fills_data.get("fills", []):
+                self._on_fill(fill, is_snapshot)
+        elif channel == "subscriptionResponse":
+            self._subscribed += 1
+            if self._subscribed >= 2:
+                self._ready.set()
+
+    def _on_order_update(self, update):
+        order = update.get("order", {})
+        oid = order.get("oid")
+        if oid is None:
+            return
+        state = self._state(oid)
+        state.coin = order.get("coin", state.coin)
+        state.side = order.get("side", state.side)
+        if order.get("origSz") is not None:
+            state.orig_sz = float(order["origSz"])
+        state.status = update.get("status", state.status)
+        state.updated_at = time.time()
+        self._notify(state)
+
+    def _on_fill(self, fill, is_snapshot):
+        oid = fill.get("oid")
+        if oid is None:
+            return
+        state = self._state(oid)
+        # 再接続時のスナップショットで同じ約定を二重に数えない
+        if any(f.get("tid") == fill.get("tid") for f in state.fills):
+            return
+        now = time.time()
+        state.fills.append(fill)
+        state.coin = fill.get("coin", state.coin)
+        state.filled_sz += float(fill.get("sz", 0))
+        if state.first_fill_at is None and not is_snapshot:
+            state.first_fill_at = now
+        state.updated_at = now
+        self._notify(state)
+
+    async def _subscribe(self, websocket):
+        for channel in ("orderUpdates", "userFills"):
+            await websocket.send(json.dumps({
+                "method": "subscribe",
+                "subscription": {"type": channel, "user": self.user}
+            }))
+
+    async def _ping(self, websocket):
+        while True:
+            await asyncio.sleep(PING_INTERVAL)
+            await websocket.send(json.dumps({"method": "ping"}))
+
+    async def run(self):
+        """WebSocket に接続して状態を更新し続ける（切断時は再接続）"""
+        while self.running:
+            try:
+                async with websockets.connect(self.ws_url) as websocket:
+                    await self._subscribe(websocket)
+                    ping_task = asyncio.create_task(self._ping(websocket))
+                    try:
+                        async for message in websocket:
+                            self.handle_message(json.loads(message))
+                            if not self.running:
+                                break
+                    finally:
+                        ping_task.cancel()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print("OrderTracker: WebSocket エラー:", e)
+            self._ready.clear()
+            self._subscribed = 0
+            if self.running:
+                await asyncio.sleep(1)
+
+    def stop(self):
+        self.running = False
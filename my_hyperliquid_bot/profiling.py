@@ -0,0 +1,199 @@
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+
+# 組み込みのプロファイリングモード（--profile 指定時のみ有効）
+#
+# - サンプリングプロファイラ: 一定間隔で全スレッドのスタックを取得し、
+#   flamegraph.pl / speedscope で読める folded 形式（"a;b;c 回数"）で出力する
+# - イベントループ監視: ループが N ms 以上止まったら、その時に実行中だったハンドラのスタックを記録する
+# - tracemalloc: 一定間隔でメモリスナップショットを取り、前回からの増加分の上位を出力する
+#
+# --profile を付けない場合はこのモジュールの機能は何も動かない。
+#
+# 標準ライブラリだけで動くので、my_hyperliquid_bot/ と Hyperliquid_data_collector/ に同じファイルを置いている
+# （どちらも単独で動かせるようにするため。変更したら両方に反映する）。
+
+DEFAULT_PROFILE_DIR = "profile"
+DEFAULT_SAMPLE_INTERVAL = 0.005    # サンプリング間隔（秒）
+DEFAULT_SLOW_CALLBACK_MS = 100     # イベントループの停止とみなす時間（ミリ秒）
+DEFAULT_MEMORY_INTERVAL = 60       # tracemalloc スナップショットの間隔（秒）
+TRACEMALLOC_TOP = 30
+
+
+def add_profile_arguments(parser, profile_dir=DEFAULT_PROFILE_DIR, profile_dir_help="プロファイル結果の出力先"):
+    """argparse にプロファイリング用のオプションを追加する"""
+    group = parser.add_argument_group("profiling")
+    group.add_argument("--profile", action="store_true", help="プロファイリングを有効にする")
+    group.add_argument("--profile-dir", default=profile_dir, help=profile_dir_help)
+    group.add_argument("--profile-interval", type=float, default=DEFAULT_SAMPLE_INTERVAL,
+                       help="サンプリング間隔（秒）")
+    group.add_argument("--slow-callback-ms", type=float, default=DEFAULT_SLOW_CALLBACK_MS,
+                       help="この時間以上イベントループが止まったら記録する（ミリ秒）")
+    group.add_argument("--memory-interval", type=float, default=DEFAULT_MEMORY_INTERVAL,
+                       help="tracemalloc スナップショットの間隔（秒、0で無効）")
+    return parser
+
+
+def profiler_from_args(name, args):
+    """--profile が指定されていれば Profiler を作って開始する（なければ None）"""
+    if not getattr(args, "profile", False):
+        return None
+    profiler = Profiler(name, args.profile_dir, args.profile_interval,
+                        args.slow_callback_ms, args.memory_interval)
+    profiler.start()
+    return profiler
+
+
+def profiler_from_argv(name, argv=None):
+    """スクリプト用: sys.argv に --profile があれば Profiler を開始する（他の引数は無視する）"""
+    parser = add_profile_arguments(argparse.ArgumentParser(add_help=False))
+    args, _ = parser.parse_known_args(sys.argv[1:] if argv is None else argv)
+    return profiler_from_args(name, args)
+
+
+def _format_stack(frame):
+    """フレームを外側から内側の順に "file:func:line" をつなげた folded 形式にする"""
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+class Profiler:
+    """
+    サンプリングプロファイラ + イベントループ監視 + tracemalloc スナップショット
+    Args:
+        name (str): 出力ファイル名の接頭辞
+        output_dir (str): 出力先ディレクトリ
+        sample_interval (float): サンプリング間隔（秒）
+        slow_callback_ms (float): イベントループの停止とみなす時間（ミリ秒）
+        memory_interval (float): tracemalloc スナップショットの間隔（秒、0で無効）
+    """
+
+    def __init__(self, name, output_dir=DEFAULT_PROFILE_DIR, sample_interval=DEFAULT_SAMPLE_INTERVAL,
+                 slow_callback_ms=DEFAULT_SLOW_CALLBACK_MS, memory_interval=DEFAULT_MEMORY_INTERVAL):
+        self.output_dir = output_dir
+        self.sample_interval = sample_interval
+        self.slow_callback = slow_callback_ms / 1000
+        self.memory_interval = memory_interval
+        self.prefix = os.path.join(output_dir, f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+        self.samples = Counter()
+        self.slow_callbacks = 0
+        self._stop = threading.Event()
+        self._threads = []
+        self._loop_thread_id = None
+        self._heartbeat = None
+        self._heartbeat_task = None
+        self._last_snapshot = None
+        self._snapshot_count = 0
+
+    def start(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._start_thread(self._sample_loop, "profiler-sampler")
+        if self.memory_interval > 0:
+            tracemalloc.start()
+            self._start_thread(self._memory_loop, "profiler-tracemalloc")
+        print(f"プロファイリング開始: {self.prefix}*")
+
+    def _start_thread(self, target, name):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def stop(self):
+        """すべての計測を止めて結果を書き出す"""
+        self._stop.set()
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+        for thread in self._threads:
+            thread.join(timeout=2)
+        if tracemalloc.is_tracing():
+            self._take_snapshot()
+            tracemalloc.stop()
+        self._write_samples()
+        print(f"プロファイル出力: {self.prefix}.folded "
+              f"(サンプル {sum(self.samples.values())}, イベントループ停止 {self.slow_callbacks} 回)")
+
+    # --- サンプリングプロファイラ ---
+    def _sample_loop(self):
+        while not self._stop.wait(self.sample_interval):
+            # プロファイラ自身のスレッドは除外する
+            own_ids = {thread.ident for thread in self._threads}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id in own_ids:
+                    continue
+                self.samples[_format_stack(frame)] += 1
+
+    def _write_samples(self):
+        with open(self.prefix + ".folded", "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+    # --- イベントループ監視 ---
+    def watch_event_loop(self):
+        """
+        実行中のイベントループの停止を監視する（ループ内から呼ぶ）
+        ループ側はハートビートを刻むだけで、判定とスタック取得は別スレッドで行う
+        """
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.perf_counter()
+        self._heartbeat_task = asyncio.get_running_loop().create_task(self._beat())
+        self._start_thread(self._watchdog, "profiler-watchdog")
+
+    async def _beat(self):
+        while True:
+            self._heartbeat = time.perf_counter()
+            await asyncio.sleep(self.slow_callback / 4)
+
+    def _watchdog(self):
+        reported_beat = None
+        with open(self.prefix + "_slow_callbacks.log", "w", encoding="utf-8") as log:
+            while not self._stop.wait(self.slow_callback / 4):
+                beat = self._heartbeat
+                blocked = time.perf_counter() - beat
+                # 1回の停止につき1回だけ、停止中に実行されていたスタックを記録する
+                if blocked < self.slow_callback or beat == reported_beat:
+                    continue
+                reported_beat = beat
+                self.slow_callbacks += 1
+                frame = sys._current_frames().get(self._loop_thread_id)
+                stack = "".join(traceback.format_stack(frame)) if frame is not None else "(unknown)\n"
+                log.write(f"[{datetime.now().isoformat()}] イベントループが {blocked * 1000:.0f}ms 以上停止\n")
+                log.write(stack + "\n")
+                log.flush()
+
+    # --- tracemalloc ---
+    def _memory_loop(self):
+        while not self._stop.wait(self.memory_interval):
+            self._take_snapshot()
+
+    def _take_snapshot(self):
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ])
+        self._snapshot_count += 1
+        path = f"{self.prefix}_tracemalloc_{self._snapshot_count:03d}.txt"
+        current, peak = tracemalloc.get_traced_memory()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"current={current / 1e6:.1f}MB peak={peak / 1e6:.1f}MB\n")
+            if self._last_snapshot is None:
+                f.write("\n[top allocations]\n")
+                for stat in snapshot.statistics("lineno")[:TRACEMALLOC_TOP]:
+                    f.write(f"{stat}\n")
+            else:
+                f.write("\n[growth since previous snapshot]\n")
+                for stat in snapshot.compare_to(self._last_snapshot, "lineno")[:TRACEMALLOC_TOP]:
+                    f.write(f"{stat}\n")
+        self._last_snapshot = snapshot
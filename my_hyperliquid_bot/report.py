@@ -0,0 +1,166 @@
+import base64
+import html
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import matplotlib
+
+# サーバー上でも動くように非対話型バックエンドを使う（plt.show() は呼ばない）
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+
+# バックテスト結果のレポート出力（PNG / HTML）
+
+DEFAULT_WIDTH_PX = 1200
+DEFAULT_HEIGHT_PX = 600
+DPI = 100
+
+_MARKERS = {
+    "enter_long": {"color": "green", "marker": "^"},
+    "enter_short": {"color": "orange", "marker": "v"},
+    "exit_long": {"color": "red", "marker": "o"},
+    "exit_short": {"color": "purple", "marker": "o"},
+}
+
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets で折れ線を n_out 点に間引く関数
+    Args:
+        x (np.ndarray): X座標（数値）
+        y (np.ndarray): Y座標
+        n_out (int): 出力点数
+    Returns:
+        np.ndarray: 採用した点のインデックス
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # 先頭と末尾を除いた点を n_out - 2 個のバケットに分割
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    prev = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # 次のバケットの平均点
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        # 前の採用点・次バケット平均点と作る三角形の面積が最大の点を採用
+        area = np.abs(
+            (x[prev] - avg_x) * (y[start:end] - y[prev])
+            - (x[prev] - x[start:end]) * (avg_y - y[prev])
+        )
+        prev = start + int(np.argmax(area))
+        selected[i + 1] = prev
+    return selected
+
+
+def _to_numeric_time(times):
+    """datetime64 の配列を LTTB 用の数値に変換する"""
+    times = np.asarray(times)
+    if np.issubdtype(times.dtype, np.datetime64):
+        return times.astype("datetime64[ns]").astype(np.int64).astype(float)
+    return times.astype(float)
+
+
+def plot_backtest(df, trades_df, path, title="Backtest", stats=None,
+                  width_px=DEFAULT_WIDTH_PX, height_px=DEFAULT_HEIGHT_PX):
+    """
+    価格とエントリー/エグジットをプロットしてファイルに保存する関数
+    Args:
+        df (pd.DataFrame): 'datetime' と 'c' を含むローソク足データ
+        trades_df (pd.DataFrame): バックテストのトレード記録（action, time, price）
+        path (str or list[str]): 出力先（.png または .html、複数指定可）
+        title (str): グラフのタイトル
+        stats (dict): HTMLに表として載せる指標（省略可）
+        width_px (int): 画像の幅（価格線はこのピクセル数まで間引く）
+        height_px (int): 画像の高さ
+    Returns:
+        list[str]: 出力したファイルパス
+    """
+    paths = [path] if isinstance(path, str) else list(path)
+    times = df["datetime"].to_numpy()
+    close = df["c"].to_numpy(dtype=float)
+    # 1ピクセルに2点あれば見た目は変わらない
+    keep = lttb(_to_numeric_time(times), close, 2 * width_px)
+
+    fig, ax = plt.subplots(figsize=(width_px / DPI, height_px / DPI), dpi=DPI)
+    ax.plot(times[keep], close[keep], label="Close Price", linewidth=0.8)
+
+    # マーカー種類ごとに1回だけ scatter を呼ぶ
+    if trades_df is not None and len(trades_df) > 0:
+        for action, group in trades_df.groupby("action", sort=False):
+            style = _MARKERS.get(action, {"color": "gray", "marker": "x"})
+            ax.scatter(group["time"].to_numpy(), group["price"].to_numpy(dtype=float),
+                       label=action, s=20, zorder=3, **style)
+
+    ax.set_xlabel("Time")
+    ax.set_ylabel("Price")
+    ax.set_title(title)
+    ax.legend(loc="best")
+    fig.tight_layout()
+
+    # 描画は1回だけ行い、同じPNGを各出力先に使う
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png")
+    plt.close(fig)
+    png_bytes = buffer.getvalue()
+
+    for out in paths:
+        directory = os.path.dirname(out)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if out.endswith(".html"):
+            _write_html(out, title, png_bytes, stats)
+        else:
+            with open(out, "wb") as f:
+                f.write(png_bytes)
+    return paths
+
+
+def _write_html(path, title, png_bytes, stats):
+    """PNG を埋め込んだ単一ファイルの HTML レポートを書き出す"""
+    image = base64.b64encode(png_bytes).decode("ascii")
+    rows = ""
+    if stats:
+        rows = "".join(
+            f"<tr><th>{html.escape(str(k))}</th><td>{html.escape(str(v))}</td></tr>"
+            for k, v in stats.items()
+        )
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(
+            "<!DOCTYPE html><html><head><meta charset='utf-8'>"
+            f"<title>{html.escape(title)}</title></head><body>"
+            f"<h1>{html.escape(title)}</h1>"
+            f"<img src='data:image/png;base64,{image}'>"
+            f"<table>{rows}</table></body></html>"
+        )
+
+
+def _render_one(job):
+    return plot_backtest(**job)
+
+
+def render_reports(jobs, max_workers=None):
+    """
+    パラメータスイープの結果をまとめてレポート出力する関数
+    Args:
+        jobs (list[dict]): plot_backtest の引数の dict のリスト
+        max_workers (int): プロセス数（1ならプロセスプールを使わない）
+    Returns:
+        list[list[str]]: 各ジョブで出力したファイルパス
+    """
+    if max_workers == 1 or len(jobs) <= 1:
+        return [plot_backtest(**job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(_render_one, jobs))
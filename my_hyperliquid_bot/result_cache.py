@@ -0,0 +1,296 @@
+import hashlib
+import importlib.util
+import json
+import os
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+
+# バックテスト結果のディスクキャッシュ（内容アドレス）
+#
+# キーは「入力データ（t, o, h, l, c, v 列の値）」「戦略パラメータ（BacktestConfig）」
+# 「戦略のコード（スクリプトと analytics.py などのソース）」のハッシュ。どれかが変われば
+# キーが変わるので、明示的に無効化する必要はない。
+# 値は指標の列・トレード履歴・エクイティカーブ・統計を1つの .npz にまとめたもの（pickle は使わない）。
+#
+# ファイルの更新時刻を最終利用時刻として使い、合計サイズが max_bytes を超えたら
+# 古いものから消す（LRU）。複数プロセスのスイープから同時に使っても壊れないよう、
+# 書き込みは一時ファイルからの置き換えで行う。
+#
+# 使用例:
+#     cache = BacktestCache()
+#     result = evaluate(backtest, df, config, cache)   # 2回目以降はディスクから読むだけ
+#     result.trades, result.stats, result.equity       # df には指標の列が追加される
+
+# ソースツリーではなくユーザーのキャッシュディレクトリ（$XDG_CACHE_HOME、なければ ~/.cache）に置く
+DEFAULT_CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser(os.path.join("~", ".cache")),
+                                 "hyperliquid_bot", "backtests")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+CACHE_VERSION = 1  # 保存形式を変えたら上げる
+DATA_COLUMNS = ("t", "o", "h", "l", "c", "v")
+# キーに含めないパラメータ（結果に影響しない）
+IGNORED_PARAMS = ("report_dir",)
+# 戦略スクリプト以外で結果に影響するモジュール
+CODE_DEPENDENCIES = ("analytics", "timeframes")
+
+_source_hashes = {}
+
+
+def _file_hash(path):
+    """ソースファイルのハッシュ（更新時刻とサイズが同じ間はメモリに持つ）"""
+    stat = os.stat(path)
+    cached = _source_hashes.get(path)
+    if cached is not None and cached[0] == (stat.st_mtime_ns, stat.st_size):
+        return cached[1]
+    with open(path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    _source_hashes[path] = ((stat.st_mtime_ns, stat.st_size), digest)
+    return digest
+
+
+def code_version(module):
+    """
+    戦略モジュールと CODE_DEPENDENCIES のソースのハッシュ
+    Args:
+        module: add_indicators / run_backtest を持つモジュール（backtest, rsi_only_backtest）
+    Returns:
+        str: ハッシュ（16進）
+    """
+    h = hashlib.sha256(f"v{CACHE_VERSION}".encode())
+    h.update(_file_hash(module.__file__).encode())
+    for name in CODE_DEPENDENCIES:
+        spec = importlib.util.find_spec(name)
+        if spec is not None and spec.origin:
+            h.update(_file_hash(spec.origin).encode())
+    return h.hexdigest()
+
+
+def data_hash(df, columns=DATA_COLUMNS):
+    """
+    入力データの列の値のハッシュ
+    （candles_snapshot の文字列の列は数値に変換せずそのまま使う。変換は数万行で数十msかかる）
+    """
+    h = hashlib.sha256(str(len(df)).encode())
+    for column in columns:
+        if column not in df:
+            continue
+        series = df[column]
+        h.update(f"{column}:{series.dtype}".encode())
+        if series.dtype == object:
+            h.update("\x00".join(map(str, series.tolist())).encode())
+        else:
+            h.update(np.ascontiguousarray(series.to_numpy()).tobytes())
+    return h.hexdigest()
+
+
+def params_hash(config):
+    """BacktestConfig の属性のハッシュ"""
+    params = {key: value for key, value in vars(config).items() if key not in IGNORED_PARAMS}
+    return hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class BacktestResult:
+    """
+    キャッシュする1回分のバックテスト結果
+    Args:
+        indicators (dict): add_indicators が追加した列（列名 → 配列）
+        trades (pd.DataFrame): run_backtest の戻り値
+        equity (np.ndarray): エクイティカーブ
+        stats (dict): summarize_trades の統計
+        cached (bool): キャッシュから読んだものか
+    """
+
+    def __init__(self, indicators, trades, equity, stats, cached=False):
+        self.indicators = indicators
+        self.trades = trades
+        self.equity = equity
+        self.stats = stats
+        self.cached = cached
+
+    def apply(self, df):
+        """指標の列を df に追加する（キャッシュから読んだ場合のレポート出力用）"""
+        for column, values in self.indicators.items():
+            df[column] = values
+        return df
+
+    def _to_arrays(self):
+        arrays = {f"ind_{column}": np.asarray(values) for column, values in self.indicators.items()}
+        for column in self.trades.columns:
+            values = self.trades[column].to_numpy()
+            if values.dtype == object:
+                values = values.astype(str)
+            arrays[f"trade_{column}"] = values
+        arrays["equity"] = np.asarray(self.equity, dtype=np.float64)
+        stats = {key: float(value) for key, value in self.stats.items()}
+        arrays["stats"] = np.array(json.dumps(stats))
+        return arrays
+
+    @classmethod
+    def _from_arrays(cls, arrays):
+        indicators, trades = {}, {}
+        for name in arrays.files:
+            if name.startswith("ind_"):
+                indicators[name[len("ind_"):]] = arrays[name]
+            elif name.startswith("trade_"):
+                trades[name[len("trade_"):]] = arrays[name]
+        stats = json.loads(str(arrays["stats"]))
+        return cls(indicators, pd.DataFrame(trades), arrays["equity"], stats, cached=True)
+
+
+class BacktestCache:
+    """
+    バックテスト結果のキャッシュ
+    Args:
+        cache_dir (str): 保存先ディレクトリ
+        max_bytes (int): 合計サイズの上限（超えたら最終利用が古いものから消す）
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, module, df, config):
+        """データ・パラメータ・コードから決まるキー"""
+        h = hashlib.sha256()
+        for part in (code_version(module), data_hash(df), params_hash(config)):
+            h.update(part.encode())
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".npz")
+
+    def get(self, key):
+        """
+        キャッシュを読む（なければ None）
+        Returns:
+            BacktestResult: 保存した結果
+        """
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as arrays:
+                result = BacktestResult._from_arrays(arrays)
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            # ないか、他のプロセスの追い出しと重なった
+            self.misses += 1
+            return None
+        # 最終利用時刻を更新する（LRU の順番）
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return result
+
+    def put(self, key, result):
+        """結果を保存し、上限を超えていれば古いものから消す"""
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **result._to_arrays())
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def entries(self):
+        """
+        保存されている結果
+        Returns:
+            list: (最終利用時刻, サイズ, パス) の最終利用が古い順のリスト
+        """
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if not entry.name.endswith(".npz"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        return entries
+
+    def evict(self):
+        """合計サイズが max_bytes 以下になるまで最終利用が古いものから消す"""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            os.remove(path)
+
+    def run(self, module, df, config):
+        """
+        キャッシュがあれば読み、なければバックテストを実行して保存する
+        Args:
+            module: backtest / rsi_only_backtest（add_indicators, run_backtest を持つモジュール）
+            df (pd.DataFrame): fetch_candles の戻り値（変更しない）
+            config: module.BacktestConfig
+        Returns:
+            BacktestResult: 結果（result.cached でキャッシュから読んだかわかる）
+        """
+        key = self.key(module, df, config)
+        result = self.get(key)
+        if result is None:
+            result = compute(module, df, config)
+            self.put(key, result)
+        return result
+
+
+def compute(module, df, config):
+    """
+    指標計算・売買ループ・統計をキャッシュなしで実行する
+    Returns:
+        BacktestResult: 結果（df は変更しない）
+    """
+    from analytics import summarize_trades
+
+    work = module.add_indicators(df.copy(), config)
+    trades = module.run_backtest(work, config)
+    stats, equity = summarize_trades(work, trades, config.interval)
+    indicators = {column: work[column].to_numpy() for column in work.columns
+                  if column not in df.columns and work[column].dtype.kind in "biuf"}
+    return BacktestResult(indicators, trades, equity.to_numpy(), stats)
+
+
+def evaluate(module, df, config, cache=None):
+    """
+    バックテストを実行し（cache があればキャッシュを使い）、指標の列を df に追加する
+    Args:
+        module: backtest / rsi_only_backtest
+        df (pd.DataFrame): fetch_candles の戻り値
+        config: module.BacktestConfig
+        cache (BacktestCache): None ならキャッシュを使わない
+    Returns:
+        BacktestResult: 結果
+    """
+    result = compute(module, df, config) if cache is None else cache.run(module, df, config)
+    result.apply(df)
+    return result
+
+
+def add_cache_arguments(parser):
+    """バックテストスクリプトの argparse にキャッシュのオプションを追加する"""
+    parser.add_argument("--no-cache", action="store_true", help="結果のキャッシュを使わない")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="結果のキャッシュの保存先")
+    parser.add_argument("--cache-max-mb", type=float, default=DEFAULT_MAX_BYTES / 2**20,
+                        help="キャッシュの合計サイズの上限（MB、超えたら最終利用が古いものから消す）")
+
+
+def cache_from_args(args):
+    """--no-cache なら None"""
+    if args.no_cache:
+        return None
+    return BacktestCache(args.cache_dir, int(args.cache_max_mb * 2**20))
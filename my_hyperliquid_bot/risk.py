@@ -0,0 +1,279 @@
+import asyncio
+import json
+import time
+from collections import deque
+
+import websockets
+
+
+# 発注前のリスクチェック（ローカルの状態だけで判定する）
+#
+# 取引所に拒否される注文を送ると、往復のレイテンシとレート制限の枠を無駄にするので、
+# 署名する前にメモリ上の口座状態と中値で判定して弾く。各チェックの所要時間を記録する。
+# ポジションの上限は、建玉に加えて板に載っている注文と送信中の注文（check() を通過して、
+# まだ口座状態に反映されていないもの）が同じ方向にすべて約定した場合で判定する。
+# 受理された注文は、板に載ったことか約定を口座状態が WebSocket で受け取るまで予約しておく。
+#
+# 使用例:
+#     mids = MidsFeed()
+#     asyncio.create_task(mids.run())
+#     risk = RiskChecker(RiskLimits(max_position={"BTC": 0.1}, max_notional=10000,
+#                                   max_price_deviation=0.02, max_orders_per_sec=5),
+#                        account_state=state, mids=mids)
+#     async with AsyncExchange(exchange, risk=risk) as client:
+#         await client.order(...)   # 違反した注文は {"error": "..."} を返し、送信しない
+
+WS_URL = "wss://api.hyperliquid.xyz/ws"
+EPSILON = 1e-12
+
+
+class RiskCheckError(Exception):
+    """リスクチェックに違反した注文"""
+
+    def __init__(self, check, message):
+        super().__init__(f"{check}: {message}")
+        self.check = check
+
+
+class RiskLimits:
+    """
+    リスク上限の設定（None のものはチェックしない）
+    Args:
+        max_position (float or dict): 銘柄ごとの最大ポジションサイズ（絶対値）
+        max_notional (float or dict): 1注文あたりの最大想定元本（USD）
+        max_leverage (float): 発注後の総建玉 / 口座評価額の上限
+        max_price_deviation (float): 中値からの許容乖離率（0.02 なら ±2%）
+        max_orders_per_sec (float): 1秒あたりの最大発注数
+    """
+
+    def __init__(self, max_position=None, max_notional=None, max_leverage=None,
+                 max_price_deviation=None, max_orders_per_sec=None):
+        self.max_position = max_position
+        self.max_notional = max_notional
+        self.max_leverage = max_leverage
+        self.max_price_deviation = max_price_deviation
+        self.max_orders_per_sec = max_orders_per_sec
+
+    @staticmethod
+    def for_coin(limit, coin):
+        if isinstance(limit, dict):
+            return limit.get(coin)
+        return limit
+
+
+class MidsFeed:
+    """allMids チャンネルで全銘柄の中値を保持する"""
+
+    def __init__(self, ws_url=WS_URL):
+        self.ws_url = ws_url
+        self.mids = {}
+        self.updated_at = None
+        self.running = True
+
+    def get(self, coin):
+        return self.mids.get(coin)
+
+    def handle_message(self, data):
+        if isinstance(data, dict) and data.get("channel") == "allMids":
+            for coin, mid in data.get("data", {}).get("mids", {}).items():
+                self.mids[coin] = float(mid)
+            self.updated_at = time.time()
+
+    async def run(self):
+        while self.running:
+            try:
+                async with websockets.connect(self.ws_url) as websocket:
+                    await websocket.send(json.dumps({"method": "subscribe", "subscription": {"type": "allMids"}}))
+                    async for message in websocket:
+                        self.handle_message(json.loads(message))
+                        if not self.running:
+                            break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print("MidsFeed: WebSocket エラー:", e)
+            if self.running:
+                await asyncio.sleep(1)
+
+    def stop(self):
+        self.running = False
+
+
+class CheckTimer:
+    """チェックごとの実行回数・違反回数・所要時間（ナノ秒）"""
+
+    def __init__(self):
+        self.count = 0
+        self.rejected = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    @property
+    def mean_us(self):
+        return self.total_ns / self.count / 1000 if self.count else 0.0
+
+    def __repr__(self):
+        return (f"count={self.count} rejected={self.rejected} "
+                f"mean={self.mean_us:.2f}us max={self.max_ns / 1000:.2f}us")
+
+
+class RiskChecker:
+    """
+    発注前のリスクチェック
+    Args:
+        limits (RiskLimits): リスク上限
+        account_state (AccountState): 現在のポジションと口座評価額（省略時はポジション系のチェックをしない）
+        mids (MidsFeed or dict): 銘柄ごとの中値（省略時は乖離チェックをしない）
+    """
+
+    def __init__(self, limits, account_state=None, mids=None):
+        self.limits = limits
+        self.account_state = account_state
+        self.mids = mids
+        self.timers = {}
+        self._order_times = deque()
+        # 送信中の注文のサイズ（coin -> [買い, 売り]）
+        self._pending = {}
+        # 受理されて口座状態への反映を待っている注文（予約, oid, 約定したサイズ, 応答の時刻（ms））
+        self._held = []
+        self._checks = [
+            ("max_position", self._check_position),
+            ("max_notional", self._check_notional),
+            ("max_leverage", self._check_leverage),
+            ("price_deviation", self._check_price_deviation),
+            ("order_rate", self._check_rate),
+        ]
+
+    def _mid(self, coin):
+        if self.mids is None:
+            return None
+        return self.mids.get(coin)
+
+    def _check_position(self, coin, is_buy, sz, px, reduce_only):
+        limit = RiskLimits.for_coin(self.limits.max_position, coin)
+        if limit is None or self.account_state is None or reduce_only:
+            return
+        # 同じ方向の未約定注文と送信中の注文がすべて約定した場合のポジション
+        side = "B" if is_buy else "A"
+        open_sz = sum(float(order.get("sz", 0)) for order in self.account_state.open_orders.values()
+                      if order.get("coin") == coin and order.get("side") == side)
+        pending = self._pending.get(coin, (0.0, 0.0))[0 if is_buy else 1]
+        exposure = open_sz + pending + sz
+        new_position = self.account_state.position(coin) + (exposure if is_buy else -exposure)
+        if abs(new_position) > limit:
+            raise RiskCheckError("max_position", f"{coin} の発注後ポジション {new_position} が上限 {limit} を超えます")
+
+    def _check_notional(self, coin, is_buy, sz, px, reduce_only):
+        limit = RiskLimits.for_coin(self.limits.max_notional, coin)
+        if limit is not None and sz * px > limit:
+            raise RiskCheckError("max_notional", f"{coin} の想定元本 {sz * px:.2f} が上限 {limit} を超えます")
+
+    def _check_leverage(self, coin, is_buy, sz, px, reduce_only):
+        limit = self.limits.max_leverage
+        state = self.account_state
+        if limit is None or state is None or reduce_only:
+            return
+        if state.account_value <= 0:
+            raise RiskCheckError("max_leverage", "口座評価額が0以下です")
+        notional = 0.0
+        for position_coin, position in state.positions.items():
+            mark = self._mid(position_coin) or position["entry_px"]
+            notional += abs(position["szi"]) * mark
+        notional += sz * px
+        leverage = notional / state.account_value
+        if leverage > limit:
+            raise RiskCheckError("max_leverage", f"発注後のレバレッジ {leverage:.2f} が上限 {limit} を超えます")
+
+    def _check_price_deviation(self, coin, is_buy, sz, px, reduce_only):
+        limit = self.limits.max_price_deviation
+        if limit is None or self.mids is None:
+            return
+        mid = self._mid(coin)
+        if mid is None:
+            # 中値の配信はあるがこの銘柄の中値がまだ届いていない
+            raise RiskCheckError("price_deviation", f"{coin} の中値がありません")
+        deviation = abs(px - mid) / mid
+        if deviation > limit:
+            raise RiskCheckError("price_deviation", f"{coin} の価格 {px} が中値 {mid} から {deviation:.2%} 乖離しています")
+
+    def _check_rate(self, coin, is_buy, sz, px, reduce_only):
+        limit = self.limits.max_orders_per_sec
+        if limit is None:
+            return
+        now = time.monotonic()
+        while self._order_times and now - self._order_times[0] > 1.0:
+            self._order_times.popleft()
+        if len(self._order_times) >= limit:
+            raise RiskCheckError("order_rate", f"1秒あたりの発注数が上限 {limit} に達しています")
+
+    def check(self, coin, is_buy, sz, px, reduce_only=False):
+        """
+        すべてのチェックを実行する（通過した注文は発注レートのカウントに加え、サイズを送信中として予約する）
+        Returns:
+            tuple: 予約（取引所の応答を受け取ったら settle() に、送信しなかったら release() に渡す）
+        Raises:
+            RiskCheckError: いずれかのチェックに違反した場合
+        """
+        self._release_reflected()
+        for name, check in self._checks:
+            timer = self.timers.get(name)
+            if timer is None:
+                timer = self.timers[name] = CheckTimer()
+            start = time.perf_counter_ns()
+            try:
+                check(coin, is_buy, sz, px, reduce_only)
+            except RiskCheckError:
+                timer.rejected += 1
+                raise
+            finally:
+                elapsed = time.perf_counter_ns() - start
+                timer.count += 1
+                timer.total_ns += elapsed
+                if elapsed > timer.max_ns:
+                    timer.max_ns = elapsed
+        self._order_times.append(time.monotonic())
+        pending = self._pending.setdefault(coin, [0.0, 0.0])
+        pending[0 if is_buy else 1] += sz
+        return coin, is_buy, sz
+
+    def settle(self, reservation, status=None):
+        """
+        取引所の応答を受け取った注文の予約を、口座状態に反映されるまで持ち越す
+        Args:
+            reservation (tuple): check() の予約
+            status (dict): 注文のステータス（"resting" / "filled" 以外なら受理されていないのですぐ解除する）
+        """
+        order = None
+        if self.account_state is not None and isinstance(status, dict):
+            order = status.get("resting") or status.get("filled")
+        if not isinstance(order, dict) or order.get("oid") is None:
+            self.release(reservation)
+            return
+        filled_sz = float(order.get("totalSz", 0)) if "filled" in status else 0.0
+        self._held.append((reservation, order["oid"], filled_sz, time.time() * 1000))
+
+    def _release_reflected(self):
+        """口座状態に反映された注文の予約を解除する"""
+        if not self._held:
+            return
+        held = []
+        for entry in self._held:
+            reservation, oid, filled_sz, acked = entry
+            if self.account_state.order_reflected(oid, filled_sz, since=acked):
+                self.release(reservation)
+            else:
+                held.append(entry)
+        self._held = held
+
+    def release(self, reservation):
+        """check() の予約を解除する"""
+        coin, is_buy, sz = reservation
+        pending = self._pending[coin]
+        pending[0 if is_buy else 1] -= sz
+        if pending[0] <= EPSILON and pending[1] <= EPSILON:
+            del self._pending[coin]
+
+    def report(self):
+        """チェックごとの所要時間を表示する"""
+        for name, timer in self.timers.items():
+            print(f"{name}: {timer}")
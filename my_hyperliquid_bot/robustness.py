@@ -0,0 +1,315 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from analytics import bar_returns, closed_profits, positions_from_trades
+
+
+# バックテスト結果の頑健性分析（ブートストラップ / モンテカルロ）
+#
+# 1回のバックテストの総損益は、トレードの順番やエントリーのタイミング、約定価格の
+# わずかな違いでどれだけ変わるかがわからない。ここでは次の3つで損益と最大ドローダウンの分布を作る。
+#
+#   trades    決済済みトレードの損益を復元抽出で並べ直す（トレード列のブートストラップ）
+#   blocks    バーごとの損益をブロック単位で復元抽出する（自己相関を残したブートストラップ）
+#   execution ポジション変化を 0〜max_delay 本ランダムに遅らせ、変化量に比例したスリッページを引く
+#
+# 1バッチ分のサンプルは2次元配列でまとめて計算する。blocks と execution はバーごとのエクイティカーブを
+# 作らず、区間ごとの統計（合計・最大・最小・最大ドローダウン）を合成するので、1年分の15分足でも
+# 1万サンプルが数秒で終わる（バーごとに計算した場合と同じ値）。バッチはプロセスプールで並列に処理する。
+# 乱数は SeedSequence からバッチごとに分けるので、seed が同じならプロセス数に関係なく同じ結果になる。
+#
+# 使用例:
+#     results = analyze(df, trades_df, n_samples=10000)
+#     print_robustness(results)
+#     results["trades"].total_profit   # サンプルごとの総損益（長さ n_samples）
+
+METHODS = ("trades", "blocks", "execution")
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+# 1バッチの配列の要素数の目安（サンプル数 x 列数。メモリはこの8バイト倍の数倍）
+BATCH_ELEMENTS = 4_000_000
+
+
+class RobustnessResult:
+    """
+    1つの手法のサンプルごとの結果
+    Args:
+        method (str): "trades" / "blocks" / "execution"
+        total_profit (np.ndarray): サンプルごとの総損益
+        max_drawdown (np.ndarray): サンプルごとの最大ドローダウン（正の値）
+        expected_value (np.ndarray): サンプルごとの1トレードあたりの平均損益（trades のみ）
+    """
+
+    def __init__(self, method, total_profit, max_drawdown, expected_value=None):
+        self.method = method
+        self.total_profit = total_profit
+        self.max_drawdown = max_drawdown
+        self.expected_value = expected_value
+
+    def summary(self, quantiles=QUANTILES):
+        """
+        分布の要約
+        Returns:
+            dict: 各指標の分位点と平均、損失になる確率
+        """
+        result = {"samples": len(self.total_profit),
+                  "probability_of_loss": float(np.mean(self.total_profit < 0))}
+        metrics = {"total_profit": self.total_profit, "max_drawdown": self.max_drawdown}
+        if self.expected_value is not None:
+            metrics["expected_value"] = self.expected_value
+        for name, values in metrics.items():
+            result[f"{name}_mean"] = float(np.mean(values))
+            for q, value in zip(quantiles, np.quantile(values, quantiles)):
+                result[f"{name}_p{int(round(q * 100))}"] = float(value)
+        return result
+
+
+def _max_drawdown(equity):
+    """
+    (k x n) のエクイティカーブ（0 から始まる）の行ごとの最大ドローダウン
+    （期間は計算しない分 analytics.max_drawdown より軽い）
+    """
+    peak = np.maximum(np.maximum.accumulate(equity, axis=1), 0.0)
+    return (peak - equity).max(axis=1)
+
+
+def _trade_batch(profits, k, rng):
+    sampled = profits[rng.integers(0, len(profits), size=(k, len(profits)))]
+    equity = np.cumsum(sampled, axis=1)
+    return equity[:, -1].copy(), _max_drawdown(equity), sampled.mean(axis=1)
+
+
+def _window_stats(pnl, length):
+    """
+    pnl[s:s + length] を1区間としたときの区間ごとの統計（すべての開始位置 s について）
+    Returns:
+        tuple: (合計, 区間内の累積損益の最大値, 最小値, 区間内の最大ドローダウン)。各配列の長さは n - length + 1
+    """
+    n_windows = len(pnl) - length + 1
+    total = np.zeros(n_windows)
+    high = np.zeros(n_windows)
+    low = np.zeros(n_windows)
+    drawdown = np.zeros(n_windows)
+    for offset in range(length):
+        total += pnl[offset:offset + n_windows]
+        np.maximum(high, total, out=high)
+        np.minimum(low, total, out=low)
+        np.maximum(drawdown, high - total, out=drawdown)
+    return total, high, low, drawdown
+
+
+def _block_batch(stats, last_stats, n_blocks, k, rng):
+    """
+    ブロックを並べたエクイティカーブの総損益と最大ドローダウン。
+    バーごとの曲線は作らず、ブロックごとの統計（_window_stats）を順に合成する（バーごとに計算した場合と同じ値）
+    """
+    n_windows = len(stats[0])
+    starts = rng.integers(0, n_windows, size=(n_blocks, k))
+    equity = np.zeros(k)
+    peak = np.zeros(k)
+    drawdown = np.zeros(k)
+    for i in range(n_blocks):
+        # 最後のブロックはバー数に合わせて短くしたもの（開始位置の数は短いほうが多いのでそのまま使える）
+        total, high, low, inner = last_stats if i == n_blocks - 1 else stats
+        block = starts[i]
+        np.maximum(drawdown, inner[block], out=drawdown)
+        np.maximum(drawdown, peak - (equity + low[block]), out=drawdown)
+        np.maximum(peak, equity + high[block], out=peak)
+        equity += total[block]
+    return equity, drawdown, None
+
+
+def _execution_pieces(close, positions, pnl, max_delay):
+    """
+    execution の計算に使う区間分け。
+    遅延でポジションが変わりうるバー（変化から max_delay 本以内）だけをサンプルごとに計算し、
+    その間のバーは元のポジションのままなので、区間ごとの統計を1回だけ計算しておく
+    Returns:
+        dict: 変化したバーと変化量、サンプルごとに計算するバー（zone）、区間ごとの統計
+    """
+    n = len(close)
+    changes = np.flatnonzero(np.diff(positions, prepend=0.0))
+    deltas = np.diff(positions[changes], prepend=0.0)
+    zone = np.unique((changes[:, None] + np.arange(max_delay + 1)).ravel())
+    zone = zone[zone < n]
+    is_zone = np.zeros(n, dtype=bool)
+    is_zone[zone] = True
+    # zone のバーは1本ずつ、それ以外は連続する範囲を1区間にする
+    starts = np.flatnonzero(is_zone | np.r_[True, is_zone[:-1]])
+    ends = np.r_[starts[1:], n]
+    total = np.add.reduceat(pnl, starts)
+    high = np.zeros(len(starts))
+    low = np.zeros(len(starts))
+    drawdown = 0.0
+    for i in np.flatnonzero(~is_zone[starts]):
+        equity = np.cumsum(pnl[starts[i]:ends[i]])
+        peak = np.maximum(np.maximum.accumulate(equity), 0.0)
+        high[i], low[i] = max(peak[-1], 0.0), min(equity.min(), 0.0)
+        drawdown = max(drawdown, (peak - equity).max())
+    return {"n": n, "close": close, "changes": changes, "deltas": deltas, "zone": zone,
+            "zone_price_diff": np.diff(close, prepend=close[0])[zone],
+            "zone_pieces": np.flatnonzero(is_zone[starts]), "total": total, "high": high, "low": low,
+            "drawdown": drawdown}
+
+
+def _execution_batch(pieces, k, rng, max_delay, max_slippage_bps):
+    """
+    ポジション変化をサンプルごと・変化ごとに 0〜max_delay 本遅らせ（順番は入れ替わらない）、
+    変化したバーの終値に対する一様分布のスリッページを引いた総損益と最大ドローダウン
+    """
+    n, zone, deltas = pieces["n"], pieces["zone"], pieces["deltas"]
+    effective = np.maximum.accumulate(
+        pieces["changes"] + rng.integers(0, max_delay + 1, size=(k, len(deltas))), axis=1)
+    width = len(zone) + 1
+    offsets = (np.arange(k) * width)[:, None]
+
+    # zone の各バーの直前のバーで持っているポジション（変化量を遅らせた位置に置いて累積する）
+    slots = np.searchsorted(zone - 1, effective) + offsets
+    steps = np.bincount(slots.ravel(), weights=np.tile(deltas, k), minlength=k * width)
+    held = np.cumsum(steps.reshape(k, width)[:, :-1], axis=1)
+    zone_pnl = held * pieces["zone_price_diff"]
+    if max_slippage_bps > 0 and len(deltas):
+        slippage = rng.uniform(0, max_slippage_bps / 10000, size=effective.shape)
+        costs = np.abs(deltas) * pieces["close"][np.minimum(effective, n - 1)] * slippage
+        # データの終わりまで遅れた変化（effective == n）は最後の列に入れて捨てる
+        slots = np.searchsorted(zone, effective) + offsets
+        zone_pnl -= np.bincount(slots.ravel(), weights=costs.ravel(), minlength=k * width).reshape(k, width)[:, :-1]
+
+    increments = np.tile(pieces["total"], (k, 1))
+    increments[:, pieces["zone_pieces"]] = zone_pnl
+    ends = np.cumsum(increments, axis=1)
+    begins = ends - increments
+    # 区間ごとに「最小値」「最大値」「終わり」の3点を並べる（区間内の順番は最小 → 最大でよい。
+    # 最大のほうが後ならそこからの下落は後の点で数え、前なら区間内の最大ドローダウンに含まれる）
+    points = np.empty(ends.shape + (3,))
+    np.add(begins, pieces["low"], out=points[:, :, 0])
+    np.add(begins, pieces["high"], out=points[:, :, 1])
+    points[:, :, 2] = ends
+    max_dd = np.maximum(_max_drawdown(points.reshape(k, -1)), pieces["drawdown"])
+    return ends[:, -1].copy(), max_dd, None
+
+
+# ワーカープロセスごとに1回だけ受け取る入力（バッチごとに配列を送らない）
+_worker_data = None
+
+
+def _init_worker(data):
+    global _worker_data
+    _worker_data = data
+
+
+def _run_batch(task):
+    method, k, seed = task
+    data = _worker_data
+    rng = np.random.default_rng(seed)
+    if method == "trades":
+        return _trade_batch(data["profits"], k, rng)
+    if method == "blocks":
+        return _block_batch(data["block_stats"], data["last_block_stats"], data["n_blocks"], k, rng)
+    return _execution_batch(data["pieces"], k, rng, data["max_delay"], data["max_slippage_bps"])
+
+
+def _batch_size(length):
+    return max(1, BATCH_ELEMENTS // max(length, 1))
+
+
+def analyze(df, trades_df, n_samples=10000, methods=METHODS, block_length=None, max_delay=3,
+            max_slippage_bps=5.0, seed=0, max_workers=None):
+    """
+    バックテスト結果の損益・最大ドローダウンの分布を作る
+    Args:
+        df (pd.DataFrame): バックテストに使ったデータ（datetime, c 列）
+        trades_df (pd.DataFrame): run_backtest の戻り値
+        n_samples (int): 手法ごとのサンプル数
+        methods (tuple): 実行する手法（METHODS のうち）
+        block_length (int): blocks のブロックの長さ（バー数、省略時は n^(1/3)）
+        max_delay (int): execution でポジション変化を遅らせる最大のバー数
+        max_slippage_bps (float): execution のスリッページの上限（bps、変化ごとに一様分布）
+        seed (int): 乱数シード
+        max_workers (int): プロセス数（1ならプロセスプールを使わない、None なら CPU 数）
+    Returns:
+        dict: 手法 → RobustnessResult
+    """
+    for method in methods:
+        if method not in METHODS:
+            raise ValueError(f"method は {METHODS} のいずれかです: {method}")
+    close = df["c"].to_numpy(dtype=float)
+    positions = positions_from_trades(df["datetime"], trades_df)
+    pnl, _ = bar_returns(close, positions)
+    profits = closed_profits(trades_df)
+    if block_length is None:
+        block_length = max(1, int(round(len(close) ** (1 / 3))))
+    block_length = min(block_length, len(close))
+    n_blocks = -(-len(close) // block_length)
+    last_length = len(close) - (n_blocks - 1) * block_length
+    pieces = _execution_pieces(close, positions, pnl, max_delay)
+    data = {"pieces": pieces, "profits": profits, "n_blocks": n_blocks,
+            "block_stats": _window_stats(pnl, block_length), "last_block_stats": _window_stats(pnl, last_length),
+            "max_delay": max_delay, "max_slippage_bps": max_slippage_bps}
+
+    tasks = []
+    seed_sequence = np.random.SeedSequence(seed)
+    for method in methods:
+        if method == "trades" and len(profits) == 0:
+            continue
+        size = _batch_size({"trades": len(profits), "blocks": n_blocks, "execution": 3 * len(pieces["total"])}[method])
+        done = 0
+        while done < n_samples:
+            k = min(size, n_samples - done)
+            tasks.append((method, k, seed_sequence.spawn(1)[0]))
+            done += k
+
+    if max_workers == 1 or len(tasks) <= 1:
+        _init_worker(data)
+        outputs = [_run_batch(task) for task in tasks]
+    else:
+        max_workers = max_workers or os.cpu_count()
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(data,)) as executor:
+            outputs = list(executor.map(_run_batch, tasks))
+
+    results = {}
+    for method in methods:
+        batches = [output for task, output in zip(tasks, outputs) if task[0] == method]
+        if not batches:
+            continue
+        total_profit = np.concatenate([batch[0] for batch in batches])
+        max_dd = np.concatenate([batch[1] for batch in batches])
+        expected_value = np.concatenate([batch[2] for batch in batches]) if batches[0][2] is not None else None
+        results[method] = RobustnessResult(method, total_profit, max_dd, expected_value)
+    return results
+
+
+def print_robustness(results):
+    """analyze の結果を手法ごとに表示する"""
+    for method, result in results.items():
+        summary = result.summary()
+        print(f"--- {method} ({summary.pop('samples')} samples) ---")
+        for key, value in summary.items():
+            print(f"{key}: {value:.4f}")
+
+
+def add_robustness_arguments(parser):
+    """バックテストスクリプトの argparse に頑健性分析のオプションを追加する"""
+    group = parser.add_argument_group("robustness")
+    group.add_argument("--robustness", type=int, default=0, metavar="N",
+                       help="ブートストラップ / モンテカルロのサンプル数（0で実行しない）")
+    group.add_argument("--robustness-methods", default=",".join(METHODS),
+                       help=f"実行する手法（カンマ区切り: {','.join(METHODS)}）")
+    group.add_argument("--max-delay", type=int, default=3, help="execution で遅らせる最大のバー数")
+    group.add_argument("--max-slippage-bps", type=float, default=5.0, help="execution のスリッページの上限（bps）")
+    group.add_argument("--robustness-workers", type=int, default=None, help="プロセス数（省略時は CPU 数）")
+    group.add_argument("--seed", type=int, default=0)
+    return parser
+
+
+def robustness_from_args(df, trades_df, args):
+    """--robustness が指定されていれば分析して表示する（なければ None）"""
+    if args.robustness <= 0:
+        return None
+    results = analyze(df, trades_df, n_samples=args.robustness,
+                      methods=tuple(m.strip() for m in args.robustness_methods.split(",") if m.strip()),
+                      max_delay=args.max_delay, max_slippage_bps=args.max_slippage_bps,
+                      seed=args.seed, max_workers=args.robustness_workers)
+    print_robustness(results)
+    return results
@@ -1,21 +1,44 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-from fetch_candles import fetch_candles
-import time
-import datetime
-
-# --- データ取得 ---
-symbol = "BTC"
-interval = "30m"
-days = 5
-df = fetch_candles(symbol, interval, days)
-if df is None:
-    raise Exception("Failed to fetch candle data.")
-
-# 数値型への変換
-df['h'] = pd.to_numeric(df['h'], errors='coerce')
-df['l'] = pd.to_numeric(df['l'], errors='coerce')
-df['c'] = pd.to_numeric(df['c'], errors='coerce')
+import argparse
+import math
+import sys
+
+
+# RSI + ATR Strategy
+#
+# import しただけではデータ取得やレポート出力は行わない（python rsi_only_backtest.py で main() を実行する）。
+# pandas / matplotlib / SDK は使う関数の中で読み込む。
+
+# add_indicators の結果に影響するパラメータ（walk_forward.py は組み合わせごとに指標を1回だけ計算し、
+# それ以外のパラメータはその指標を使い回して評価する）
+INDICATOR_PARAMS = ("interval", "rsi_period", "atr_period")
+
+class BacktestConfig:
+    """
+    バックテストの設定
+    Args:
+        symbol (str): 銘柄
+        interval (str): 足の間隔
+        days (int): 取得する日数
+        rsi_period (int): RSIの計算期間
+        atr_period (int): ATRの計算期間
+        rsi_lower (float): RSIがこの値以下なら買いシグナル
+        rsi_upper (float): RSIがこの値以上なら売りシグナル
+        atr_threshold (float): ATRがこの値未満の場合はシグナルを無視する
+        report_dir (str): レポートの出力先
+    """
+
+    def __init__(self, symbol="BTC", interval="30m", days=5, rsi_period=14, atr_period=14,
+                 rsi_lower=30, rsi_upper=70, atr_threshold=1.0, report_dir="reports"):
+        self.symbol = symbol
+        self.interval = interval
+        self.days = days
+        self.rsi_period = rsi_period
+        self.atr_period = atr_period
+        self.rsi_lower = rsi_lower
+        self.rsi_upper = rsi_upper
+        self.atr_threshold = atr_threshold
+        self.report_dir = report_dir
+
 
 # --- RSIの計算 ---
 def calculate_rsi(series, period=14):
@@ -30,20 +53,39 @@ def calculate_rsi(series, period=14):
 
 # --- ATRの計算 ---
 def calculate_atr(df, period=14):
+    import pandas as pd
+
     df['prev_close'] = df['c'].shift(1)
-    
+
     tr1 = df['h'] - df['l']
     tr2 = (df['h'] - df['prev_close']).abs()
     tr3 = (df['l'] - df['prev_close']).abs()
-    
+
     df['tr'] = pd.concat([tr1, tr2, tr3], axis=1).max(axis=1)
-    
+
     atr = df['tr'].rolling(window=period, min_periods=period).mean()
     return atr
 
-# RSIとATRを計算
-df['rsi'] = calculate_rsi(df['c'], period=14)
-df['atr'] = calculate_atr(df, period=14)
+def add_indicators(df, config):
+    """
+    数値型への変換とRSI・ATRの計算（df に列を追加する）
+    Args:
+        df (pd.DataFrame): fetch_candles の戻り値
+        config (BacktestConfig): 設定
+    Returns:
+        pd.DataFrame: 指標を追加した df（引数と同じオブジェクト）
+    """
+    import pandas as pd
+
+    # 数値型への変換
+    df['h'] = pd.to_numeric(df['h'], errors='coerce')
+    df['l'] = pd.to_numeric(df['l'], errors='coerce')
+    df['c'] = pd.to_numeric(df['c'], errors='coerce')
+
+    # RSIとATRを計算
+    df['rsi'] = calculate_rsi(df['c'], period=config.rsi_period)
+    df['atr'] = calculate_atr(df, period=config.atr_period)
+    return df
 
 # --- シグナル生成（RSI + ATR） ---
 def generate_signal_rsi_atr(row, rsi_lower=30, rsi_upper=70, atr_threshold=1.0):
@@ -53,11 +95,11 @@ def generate_signal_rsi_atr(row, rsi_lower=30, rsi_upper=70, atr_threshold=1.0):
     rsi_upper: RSIがこの値以上なら「買われすぎ」と判断（売りシグナル）
     atr_threshold: ATRがこの値未満の場合、シグナルを無視する（ボラティリティが低い）
     """
-    if pd.isna(row['rsi']) or pd.isna(row['atr']):
+    if math.isnan(row['rsi']) or math.isnan(row['atr']):
         return None
     if row['atr'] < atr_threshold:
         return None
-    
+
     # シンプルに、RSIがrsi_lower以下で買い、rsi_upper以上で売り
     if row['rsi'] <= rsi_lower:
         return "Buy Signal"
@@ -66,146 +108,195 @@ def generate_signal_rsi_atr(row, rsi_lower=30, rsi_upper=70, atr_threshold=1.0):
     else:
         return None
 
-# バックテストパラメータ
-rsi_lower = 30
-rsi_upper = 70
-atr_threshold = 1.0
-
-# --- バックテストループ ---
-trades = []
-position = None   # "long" or "short" or None
-entry_price = None
-
-# RSI, ATR共に計算に最低14本必要なので14行目以降からスタート
-for idx in range(14, len(df)):
-    curr = df.iloc[idx]
-
-        
-    signal = generate_signal_rsi_atr(
-        curr,
-        rsi_lower=rsi_lower,
-        rsi_upper=rsi_upper,
-        atr_threshold=atr_threshold
-    )
-    
-    if signal is None:
-        continue
-    
-    if signal == "Sell Signal":
+def run_backtest(df, config):
+    """
+    指標計算済みの df でバックテストを実行する
+    Args:
+        df (pd.DataFrame): add_indicators 済みのデータ
+        config (BacktestConfig): 設定
+    Returns:
+        pd.DataFrame: トレード履歴
+    """
+    import pandas as pd
+
+    # df.iloc で1行ずつ取り出すと遅いので、dict のリストにしてからループする
+    # 全期間の先頭は指標のウォームアップ分を飛ばす
+    warmup = max(config.rsi_period, config.atr_period)
+    return pd.DataFrame(simulate_trades(df.to_dict("records"), config, warmup=warmup))
+
+def simulate_trades(rows, config, warmup=0):
+    """
+    バックテストループ本体
+    Args:
+        rows (list): add_indicators 済みの df の各行の dict（df.to_dict("records") またはその一部）
+        config (BacktestConfig): 設定
+        warmup (int): 先頭で飛ばす行数（全期間なら指標のウォームアップ分。切り出した期間は
+            前の足で指標が計算済みなので 0。未計算の NaN は generate_signal_rsi_atr が None を返す）
+    Returns:
+        list: トレード履歴（1トレード1つの dict）
+    """
+    # --- バックテストループ ---
+    trades = []
+    position = None   # "long" or "short" or None
+    entry_price = None
+
+    for idx in range(warmup, len(rows)):
+        curr = rows[idx]
+
+        signal = generate_signal_rsi_atr(
+            curr,
+            rsi_lower=config.rsi_lower,
+            rsi_upper=config.rsi_upper,
+            atr_threshold=config.atr_threshold
+        )
+
+        if signal is None:
+            continue
+
+        if signal == "Sell Signal":
+            if position == "long":
+                # ロングをクローズ
+                exit_price = curr['c']
+                profit = exit_price - entry_price
+                trades.append({
+                    "action": "exit_long",
+                    "price": exit_price,
+                    "time": curr['datetime'],
+                    "profit": profit
+                })
+                # ショートに転換
+                position = "short"
+                entry_price = exit_price
+                trades.append({
+                    "action": "enter_short",
+                    "price": entry_price,
+                    "time": curr['datetime']
+                })
+            elif position is None:
+                position = "short"
+                entry_price = curr['c']
+                trades.append({
+                    "action": "enter_short",
+                    "price": entry_price,
+                    "time": curr['datetime']
+                })
+
+        elif signal == "Buy Signal":
+            if position == "short":
+                # ショートをクローズ
+                exit_price = curr['c']
+                profit = entry_price - exit_price
+                trades.append({
+                    "action": "exit_short",
+                    "price": exit_price,
+                    "time": curr['datetime'],
+                    "profit": profit
+                })
+                # ロングに転換
+                position = "long"
+                entry_price = exit_price
+                trades.append({
+                    "action": "enter_long",
+                    "price": entry_price,
+                    "time": curr['datetime']
+                })
+            elif position is None:
+                position = "long"
+                entry_price = curr['c']
+                trades.append({
+                    "action": "enter_long",
+                    "price": entry_price,
+                    "time": curr['datetime']
+                })
+
+    # 最終行でポジションをクローズ（任意）
+    if position is not None:
+        final_price = rows[-1]['c']
         if position == "long":
-            # ロングをクローズ
-            exit_price = curr['c']
-            profit = exit_price - entry_price
+            profit = final_price - entry_price
             trades.append({
                 "action": "exit_long",
-                "price": exit_price,
-                "time": curr['datetime'],
+                "price": final_price,
+                "time": rows[-1]['datetime'],
                 "profit": profit
             })
-            # ショートに転換
-            position = "short"
-            entry_price = exit_price
-            trades.append({
-                "action": "enter_short",
-                "price": entry_price,
-                "time": curr['datetime']
-            })
-        elif position is None:
-            position = "short"
-            entry_price = curr['c']
-            trades.append({
-                "action": "enter_short",
-                "price": entry_price,
-                "time": curr['datetime']
-            })
-    
-    elif signal == "Buy Signal":
-        if position == "short":
-            # ショートをクローズ
-            exit_price = curr['c']
-            profit = entry_price - exit_price
+        elif position == "short":
+            profit = entry_price - final_price
             trades.append({
                 "action": "exit_short",
-                "price": exit_price,
-                "time": curr['datetime'],
+                "price": final_price,
+                "time": rows[-1]['datetime'],
                 "profit": profit
             })
-            # ロングに転換
-            position = "long"
-            entry_price = exit_price
-            trades.append({
-                "action": "enter_long",
-                "price": entry_price,
-                "time": curr['datetime']
-            })
-        elif position is None:
-            position = "long"
-            entry_price = curr['c']
-            trades.append({
-                "action": "enter_long",
-                "price": entry_price,
-                "time": curr['datetime']
-            })
+        position = None
+
+    return trades
+
+def parse_args(argv=None):
+    from profiling import add_profile_arguments
+    from result_cache import add_cache_arguments
+    from robustness import add_robustness_arguments
+
+    defaults = BacktestConfig()
+    parser = argparse.ArgumentParser(description="RSI + ATR バックテスト")
+    parser.add_argument("--symbol", default=defaults.symbol)
+    parser.add_argument("--interval", default=defaults.interval)
+    parser.add_argument("--days", type=int, default=defaults.days)
+    parser.add_argument("--rsi-lower", type=float, default=defaults.rsi_lower)
+    parser.add_argument("--rsi-upper", type=float, default=defaults.rsi_upper)
+    parser.add_argument("--atr-threshold", type=float, default=defaults.atr_threshold)
+    parser.add_argument("--report-dir", default=defaults.report_dir)
+    add_profile_arguments(parser)
+    add_cache_arguments(parser)
+    add_robustness_arguments(parser)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    from fetch_candles import fetch_candles
+    from analytics import print_summary
+    from report import plot_backtest
+    from profiling import profiler_from_args
+    from result_cache import cache_from_args, evaluate
+    from robustness import robustness_from_args
+
+    args = parse_args(argv)
+    config = BacktestConfig(symbol=args.symbol, interval=args.interval, days=args.days,
+                            rsi_lower=args.rsi_lower, rsi_upper=args.rsi_upper,
+                            atr_threshold=args.atr_threshold, report_dir=args.report_dir)
+    # --profile 指定時のみプロファイリングを有効にする
+    profiler = profiler_from_args("rsi_only_backtest", args)
+
+    # --- データ取得 ---
+    df = fetch_candles(config.symbol, config.interval, config.days)
+    if df is None:
+        raise Exception("Failed to fetch candle data.")
+
+    # --- バックテスト（データ・パラメータ・コードが前回と同じならキャッシュから読む） ---
+    result = evaluate(sys.modules[__name__], df, config, cache_from_args(args))
+
+    # --- 結果の表示 ---
+    trades_df = result.trades
+    print("Cache:", "hit" if result.cached else "miss")
+    print(trades_df)
+    total_profit = trades_df[trades_df["action"].str.contains("exit")]["profit"].sum()
+    print("Total Profit:", total_profit)
+
+    # --- パフォーマンス分析 ---
+    # エントリー行はトレード数に含めず、決済済みトレードのみで統計を計算する
+    stats = result.stats
+    print_summary(stats)
+    # --robustness 指定時のみ、損益・最大ドローダウンの分布を表示する
+    robustness_from_args(df, trades_df, args)
+
+    # --- レポート出力 ---
+    # plt.show() はブロックしてしまうので、ファイルに書き出す
+    report_base = f"{config.report_dir}/rsi_only_backtest_{config.symbol}_{config.interval}"
+    report_paths = plot_backtest(df, trades_df, [report_base + ".png", report_base + ".html"],
+                                 title="RSI + ATR Backtest", stats=stats)
+    print("Report:", report_paths)
+
+    if profiler is not None:
+        profiler.stop()
 
-# 最終行でポジションをクローズ（任意）
-if position is not None:
-    final_price = df.iloc[-1]['c']
-    if position == "long":
-        profit = final_price - entry_price
-        trades.append({
-            "action": "exit_long",
-            "price": final_price,
-            "time": df.iloc[-1]['datetime'],
-            "profit": profit
-        })
-    elif position == "short":
-        profit = entry_price - final_price
-        trades.append({
-            "action": "exit_short",
-            "price": final_price,
-            "time": df.iloc[-1]['datetime'],
-            "profit": profit
-        })
-    position = None
-
-# --- 結果の表示 ---
-trades_df = pd.DataFrame(trades)
-print(trades_df)
-total_profit = trades_df[trades_df["action"].str.contains("exit")]["profit"].sum()
-print("Total Profit:", total_profit)
-
-# trades_df: 各トレードの 'profit' が記録されている DataFrame
-# 'profit' は正なら勝ち、負なら負け
-
-total_trades = len(trades_df)
-winning_trades = trades_df[trades_df['profit'] > 0]
-losing_trades = trades_df[trades_df['profit'] < 0]
-
-win_rate = len(winning_trades) / total_trades if total_trades > 0 else 0
-loss_rate = len(losing_trades) / total_trades if total_trades > 0 else 0
-
-# 平均勝ちと平均負け（金額の絶対値で）
-average_win = winning_trades['profit'].mean() if not winning_trades.empty else 0
-average_loss = abs(losing_trades['profit'].mean()) if not losing_trades.empty else 0
-
-expected_value = (win_rate * average_win) - (loss_rate * average_loss)
-
-print("Total Trades:", total_trades)
-print("Win Rate:", win_rate)
-print("Average Win:", average_win)
-print("Average Loss:", average_loss)
-print("Expected Value per Trade:", expected_value)
-
-
-# --- グラフ表示 ---
-plt.figure(figsize=(12,6))
-plt.plot(df['datetime'], df['c'], label='Close Price')
-for _, trade in trades_df.iterrows():
-    if "enter" in trade["action"]:
-        plt.scatter(trade["time"], trade["price"], color='green', marker='^', label=trade["action"])
-    elif "exit" in trade["action"]:
-        plt.scatter(trade["time"], trade["price"], color='red', marker='v', label=trade["action"])
-plt.xlabel("Time")
-plt.ylabel("Price")
-plt.title("RSI + ATR Backtest")
-plt.show()
+if __name__ == "__main__":
+    main()
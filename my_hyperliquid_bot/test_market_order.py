@@ -1,6 +1,7 @@
 from eth_account import Account
 from hyperliquid.exchange import Exchange
 from hyperliquid.info import Info
+from meta_cache import MetaCache
 from hyperliquid.utils.constants import MAINNET_API_URL
 from dotenv import load_dotenv
 import os
@@ -23,10 +24,12 @@ def main():
     
     # ウォレットの初期化
     account = Account.from_key(SECRET_KEY)
+    # メタデータはディスクキャッシュから読み込む（温まっていればネットワークアクセスなし）
+    meta_cache = MetaCache(API_URL)
     # Infoクラスのインスタンス作成（口座情報確認用）
-    info = Info(base_url=API_URL, skip_ws=True)
+    info = Info(base_url=API_URL, skip_ws=True, **meta_cache.sdk_kwargs())
     # Exchangeクラスのインスタンス作成（注文発注用）
-    exchange = Exchange(account, base_url=API_URL, account_address=ACCOUNT_ADDRESS)
+    exchange = Exchange(account, base_url=API_URL, account_address=ACCOUNT_ADDRESS, **meta_cache.sdk_kwargs())
     
     # ユーザーのスポット口座の状態を確認
     spot_state = info.spot_user_state(ACCOUNT_ADDRESS)
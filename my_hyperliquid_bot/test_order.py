@@ -3,6 +3,7 @@ from dotenv import load_dotenv
 from eth_account import Account
 from hyperliquid.exchange import Exchange
 from hyperliquid.info import Info
+from meta_cache import MetaCache
 from hyperliquid.utils.constants import MAINNET_API_URL
 
 # 環境変数を読み込み
@@ -22,10 +23,12 @@ def main():
 
     # ウォレットの初期化
     account = Account.from_key(SECRET_KEY)
+    # メタデータはディスクキャッシュから読み込む（温まっていればネットワークアクセスなし）
+    meta_cache = MetaCache(API_URL)
     # Infoクラスのインスタンス作成
-    info = Info(base_url=API_URL, skip_ws=True)
+    info = Info(base_url=API_URL, skip_ws=True, **meta_cache.sdk_kwargs())
     # Exchangeクラスのインスタンス作成
-    exchange = Exchange(account, base_url=API_URL, account_address=ACCOUNT_ADDRESS)
+    exchange = Exchange(account, base_url=API_URL, account_address=ACCOUNT_ADDRESS, **meta_cache.sdk_kwargs())
 
     # ユーザーのスポット残高を確認
     spot_user_state = info.spot_user_state(ACCOUNT_ADDRESS)
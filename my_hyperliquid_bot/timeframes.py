@@ -0,0 +1,169 @@
+import numpy as np
+import pandas as pd
+
+
+# 1本の細かい足から複数の時間軸の足を作るデータ層
+#
+# 一番細かい間隔のローソク足を1回だけ取得し、粗い時間軸（15m → 1h, 4h など）は
+# NumPy の reduceat でまとめて集約する。集約した足は時間軸ごとにキャッシュする。
+#
+# 粗い足は UTC のエポックから区切る（Hyperliquid の candleSnapshot と同じ区切り）。
+# 基準の足に揃えるときは「その足の確定時点で確定している粗い足」だけを参照するので、
+# 15m の足から見た 1h の足は、1時間が終わる最後の 15m 足で初めて更新される（先読みしない）。
+# データの先頭が粗い足の途中から始まる場合など、期間の最初か最後の足がない粗い足は確定扱いせず参照しない。
+#
+# 使用例:
+#     mtf = MultiTimeframe(fetch_candles("BTC", "5m", 30), "5m")
+#     hourly = mtf.get("1h")                      # 集約済みの 1h 足（キャッシュされる）
+#     hourly["ma"] = hourly["c"].rolling(20).mean()
+#     df = mtf.base.join(mtf.aligned("1h", ["c", "ma"]))   # 列名は c_1h, ma_1h
+
+INTERVAL_MS = {
+    "1m": 60_000, "3m": 180_000, "5m": 300_000, "15m": 900_000, "30m": 1_800_000,
+    "1h": 3_600_000, "2h": 7_200_000, "4h": 14_400_000, "8h": 28_800_000,
+    "12h": 43_200_000, "1d": 86_400_000,
+}
+NUMERIC_COLUMNS = ("o", "h", "l", "c", "v", "n")
+
+
+def interval_ms(interval):
+    """
+    時間間隔をミリ秒にする関数（週足・月足はエポックから区切れないので扱わない）
+    Args:
+        interval (str): 時間間隔（例："15m"）
+    Returns:
+        int: ミリ秒
+    """
+    if interval not in INTERVAL_MS:
+        raise ValueError(f"Unsupported interval: {interval} (対応: {', '.join(INTERVAL_MS)})")
+    return INTERVAL_MS[interval]
+
+
+def resample_candles(base, base_interval, interval):
+    """
+    細かい足を粗い時間軸の足に集約する関数
+    Args:
+        base (pd.DataFrame): fetch_candles の戻り値（t 列と数値の o, h, l, c, v 列。t の昇順）
+        base_interval (str): base の時間間隔
+        interval (str): 集約先の時間間隔（base_interval の整数倍）
+    Returns:
+        pd.DataFrame: 集約した足（t: 開始時刻, T: 終了時刻（次の足の開始時刻 - 1）, o, h, l, c, v, n,
+            datetime, bars: 含まれる base の本数, complete: 足の期間の最初と最後の base の足を含むか）
+    """
+    step = interval_ms(interval)
+    base_step = interval_ms(base_interval)
+    if step % base_step:
+        raise ValueError(f"{interval} は {base_interval} の整数倍ではありません")
+
+    t = base["t"].to_numpy(np.int64)
+    if len(t) == 0:
+        return pd.DataFrame(columns=["t", "T", *NUMERIC_COLUMNS, "datetime", "bars", "complete"])
+    bucket = t // step * step
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], len(t)] - 1
+
+    result = {"t": bucket[starts], "T": bucket[starts] + step - 1}
+    result["o"] = base["o"].to_numpy(np.float64)[starts]
+    result["h"] = np.maximum.reduceat(base["h"].to_numpy(np.float64), starts)
+    result["l"] = np.minimum.reduceat(base["l"].to_numpy(np.float64), starts)
+    result["c"] = base["c"].to_numpy(np.float64)[ends]
+    result["v"] = np.add.reduceat(base["v"].to_numpy(np.float64), starts)
+    if "n" in base:
+        result["n"] = np.add.reduceat(base["n"].to_numpy(np.int64), starts)
+    df = pd.DataFrame(result)
+    df["datetime"] = pd.to_datetime(df["t"], unit="ms")
+    df["bars"] = ends - starts + 1
+    # 最初の base の足が粗い足の始まりにあり、最後の足が終わりまで届いていれば確定
+    # （途中の欠損した足は数えない。データが粗い足の途中から始まる先頭の足は未確定）
+    df["complete"] = (t[starts] == bucket[starts]) & (t[ends] + base_step >= df["T"].to_numpy() + 1)
+    return df
+
+
+class MultiTimeframe:
+    """
+    基準の足と、そこから集約した粗い時間軸の足のキャッシュ
+    Args:
+        base (pd.DataFrame): 一番細かい間隔の足（fetch_candles の戻り値）。数値列は float に変換して保持する
+        base_interval (str): base の時間間隔
+    """
+
+    def __init__(self, base, base_interval):
+        # インデックスは元の DataFrame のまま残す（aligned() の結果をそのまま元の df に代入できる）
+        base = base.sort_values("t", kind="stable")
+        for column in NUMERIC_COLUMNS:
+            if column in base:
+                base[column] = pd.to_numeric(base[column])
+        if "datetime" not in base:
+            base["datetime"] = pd.to_datetime(base["t"], unit="ms")
+        self.base = base
+        self.base_interval = base_interval
+        self._frames = {base_interval: base}
+        self._positions = {}
+
+    @classmethod
+    def fetch(cls, symbol, base_interval, days, **kwargs):
+        """fetch_candles で基準の足を1回だけ取得して作る"""
+        from fetch_candles import fetch_candles
+
+        df = fetch_candles(symbol, base_interval, days, **kwargs)
+        if df is None:
+            raise Exception("Failed to fetch candle data.")
+        return cls(df, base_interval)
+
+    def get(self, interval):
+        """
+        時間軸 interval の足を返す（初回だけ集約し、以降は同じ DataFrame を返す）。
+        返した DataFrame に追加した指標の列は aligned() で参照できる
+        """
+        frame = self._frames.get(interval)
+        if frame is None:
+            frame = self._frames[interval] = resample_candles(self.base, self.base_interval, interval)
+        return frame
+
+    def positions(self, interval):
+        """
+        基準の各足の確定時点で最後に確定している interval の足の行番号（なければ -1）。
+        complete でない足は参照しない
+        """
+        positions = self._positions.get(interval)
+        if positions is None:
+            frame = self.get(interval)
+            if interval == self.base_interval:
+                positions = np.arange(len(frame))
+            else:
+                # complete な粗い足のうち、期間が基準の足の確定時刻までに終わっているもの
+                rows = np.flatnonzero(frame["complete"].to_numpy(bool))
+                closes = self.base["t"].to_numpy(np.int64) + interval_ms(self.base_interval)
+                ends = frame["T"].to_numpy(np.int64)[rows] + 1
+                k = np.searchsorted(ends, closes, side="right") - 1
+                positions = np.where(k >= 0, rows[np.maximum(k, 0)], -1) if len(rows) else np.full(len(closes), -1)
+            self._positions[interval] = positions
+        return positions
+
+    def aligned(self, interval, columns=None, suffix=None):
+        """
+        interval の足の列を基準の足に揃える（先読みなし）
+        Args:
+            interval (str): 時間軸
+            columns (list): 揃える列（省略時は o, h, l, c, v）
+            suffix (str): 列名の接尾辞（省略時は "_" + interval）
+        Returns:
+            pd.DataFrame: base と同じ行数・インデックスの DataFrame（確定した足がまだない行は NaN）
+        """
+        frame = self.get(interval)
+        columns = list(columns or ["o", "h", "l", "c", "v"])
+        suffix = f"_{interval}" if suffix is None else suffix
+        positions = self.positions(interval)
+        valid = positions >= 0
+        if len(frame) == 0:
+            taken = pd.DataFrame(np.nan, index=self.base.index, columns=columns)
+        else:
+            taken = frame[columns].iloc[np.maximum(positions, 0)].set_axis(self.base.index)
+            # bool などの列にも NaN を入れられるように where を使う（その列は object になる）
+            taken = taken.where(pd.Series(valid, index=taken.index), axis=0)
+        return taken.add_suffix(suffix)
+
+    def clear(self):
+        """集約した足のキャッシュを捨てる（base は残す）"""
+        self._frames = {self.base_interval: self.base}
+        self._positions.clear()
@@ -0,0 +1,317 @@
+import argparse
+import importlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+
+import numpy as np
+import pandas as pd
+
+from analytics import closed_profits, positions_from_trades, summarize
+
+
+# ウォークフォワード分析（アウトオブサンプル検証）
+#
+# 学習期間とテスト期間をずらしながら、学習期間でパラメータをグリッドサーチし、
+# 一番よかったパラメータを直後のテスト期間で評価する。テスト期間の結果をつなげたものが
+# アウトオブサンプルの成績になる。
+#
+# 指標（add_indicators）は INDICATOR_PARAMS の組み合わせごとに全期間で1回だけ計算し、
+# 各期間はその行を切り出して売買ループ（simulate_trades）だけを回す。ローリング計算の指標は
+# 過去の足しか使わないので、切り出しても期間の先頭から計算し直した場合と違うのはウォームアップだけ
+# （期間の先頭でも前の足を使って計算済みになる）。学習期間の評価は fold と指標の組み合わせごとに
+# 1タスクにまとめ、パラメータの組み合わせ分のポジションを (バー数 x 組み合わせ数) で
+# analytics.summarize に渡して一括で計算する。タスクはプロセスプールで並列に処理する。
+#
+# 使用例:
+#     python walk_forward.py --strategy rsi_only_backtest --interval 15m --days 365 \
+#         --train-days 30 --test-days 7 --param rsi_lower=20,25,30 --param rsi_upper=70,75,80
+
+STRATEGIES = ("backtest", "rsi_only_backtest")
+# --param を指定しないときのグリッド
+DEFAULT_GRIDS = {
+    "backtest": {"short_window": [5, 10, 20], "long_window": [20, 50, 100],
+                 "rsi_threshold_buy": [40, 50, 60], "rsi_threshold_sell": [40, 50, 60]},
+    "rsi_only_backtest": {"rsi_lower": [20, 25, 30, 35], "rsi_upper": [65, 70, 75, 80],
+                          "atr_threshold": [0.5, 1.0, 2.0]},
+}
+OBJECTIVES = ("total_profit", "sharpe", "sortino", "expected_value", "profit_factor")
+# fold ごとに残すテスト期間の統計
+FOLD_STATS = ("total_profit", "max_drawdown", "sharpe", "total_trades", "win_rate")
+
+
+def walk_forward_windows(n_bars, train_bars, test_bars, step_bars=None, anchored=False):
+    """
+    学習期間とテスト期間の区切り（最後の半端なテスト期間は使わない）
+    Args:
+        n_bars (int): データの本数
+        train_bars (int): 学習期間の本数（anchored なら最初の学習期間の本数）
+        test_bars (int): テスト期間の本数
+        step_bars (int): 次の fold までずらす本数（省略時は test_bars。テスト期間が重ならないよう test_bars 以上）
+        anchored (bool): True なら学習期間の始まりを先頭に固定する（学習期間が伸びていく）
+    Returns:
+        list: (学習開始, テスト開始, テスト終了) の行番号のリスト（学習期間は [学習開始, テスト開始)）
+    """
+    step_bars = step_bars or test_bars
+    if train_bars <= 0 or test_bars <= 0:
+        raise ValueError("train_bars と test_bars は1以上です")
+    if step_bars < test_bars:
+        raise ValueError(f"step_bars ({step_bars}) は test_bars ({test_bars}) 以上にしてください")
+    windows = []
+    test_start = train_bars
+    while test_start + test_bars <= n_bars:
+        windows.append((0 if anchored else test_start - train_bars, test_start, test_start + test_bars))
+        test_start += step_bars
+    return windows
+
+
+def parameter_grid(grid):
+    """
+    {パラメータ名: 値のリスト} のすべての組み合わせ
+    Returns:
+        list: パラメータの dict のリスト
+    """
+    names = list(grid)
+    return [dict(zip(names, values)) for values in product(*(grid[name] for name in names))]
+
+
+class WalkForwardResult:
+    """
+    ウォークフォワード分析の結果
+    Args:
+        folds (pd.DataFrame): fold ごとの期間・選んだパラメータ・学習期間のスコア・テスト期間の統計
+        trades (pd.DataFrame): テスト期間のトレード履歴をつなげたもの（fold 列つき）
+        stats (dict): テスト期間をつなげたアウトオブサンプルの統計（summarize の結果）
+    """
+
+    def __init__(self, folds, trades, stats):
+        self.folds = folds
+        self.trades = trades
+        self.stats = stats
+
+
+# ワーカープロセスごとに1回だけ受け取る入力（タスクごとに DataFrame を送らない）
+_worker_data = None
+# 指標の組み合わせごとの df.to_dict("records")（ワーカー内で最初に使うときに作る）
+_worker_rows = {}
+
+
+def _init_worker(data):
+    global _worker_data
+    _worker_data = data
+    _worker_rows.clear()
+
+
+def _simulate(key, params, start, end):
+    """指標の組み合わせ key の行 [start, end) で売買ループを回す"""
+    data = _worker_data
+    rows = _worker_rows.get(key)
+    if rows is None:
+        rows = _worker_rows[key] = data["frames"][key].to_dict("records")
+    module = importlib.import_module(data["strategy"])
+    config = module.BacktestConfig(**{**data["base"], **dict(key), **params})
+    return pd.DataFrame(module.simulate_trades(rows[start:end], config))
+
+
+def _train_task(task):
+    """学習期間で key の指標を使うパラメータの組み合わせをすべて評価し、目的関数の値を返す"""
+    key, combos, start, end = task
+    data = _worker_data
+    close = data["close"][start:end]
+    times = data["times"][start:end]
+    positions = np.empty((end - start, len(combos)))
+    profits = []
+    for i, params in enumerate(combos):
+        trades = _simulate(key, params, start, end)
+        positions[:, i] = positions_from_trades(times, trades)
+        profits.append(closed_profits(trades))
+    padded = np.full((max(len(p) for p in profits), len(combos)), np.nan)
+    for i, p in enumerate(profits):
+        padded[:len(p), i] = p
+    stats = summarize(close, positions, padded, data["interval"])
+    return np.atleast_1d(np.asarray(stats[data["objective"]], dtype=float))
+
+
+def _test_task(task):
+    """テスト期間で1つのパラメータを評価する"""
+    key, params, start, end = task
+    data = _worker_data
+    trades = _simulate(key, params, start, end)
+    positions = positions_from_trades(data["times"][start:end], trades)
+    stats = summarize(data["close"][start:end], positions, closed_profits(trades), data["interval"])
+    return trades, stats
+
+
+def _map(executor, function, tasks, max_workers):
+    if executor is None:
+        return [function(task) for task in tasks]
+    chunksize = max(1, len(tasks) // (max_workers * 4))
+    return list(executor.map(function, tasks, chunksize=chunksize))
+
+
+def walk_forward(strategy, df, grid=None, base_params=None, train_bars=2880, test_bars=672, step_bars=None,
+                 anchored=False, objective="sharpe", max_workers=None):
+    """
+    ウォークフォワード分析を実行する
+    Args:
+        strategy (str): 戦略スクリプトのモジュール名（STRATEGIES のうち）
+        df (pd.DataFrame): fetch_candles の戻り値（t の昇順）
+        grid (dict): {パラメータ名: 値のリスト}（省略時は DEFAULT_GRIDS）
+        base_params (dict): グリッド以外の BacktestConfig の引数（interval など）
+        train_bars (int): 学習期間の本数
+        test_bars (int): テスト期間の本数
+        step_bars (int): 次の fold までずらす本数（省略時は test_bars）
+        anchored (bool): 学習期間の始まりを先頭に固定する
+        objective (str): 学習期間で最大化する統計（OBJECTIVES のうち）
+        max_workers (int): プロセス数（1ならプロセスプールを使わない、None なら CPU 数）
+    Returns:
+        WalkForwardResult: 結果
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"objective は {OBJECTIVES} のいずれかです: {objective}")
+    module = importlib.import_module(strategy)
+    base = dict(base_params or {})
+    grid = grid or DEFAULT_GRIDS[strategy]
+    windows = walk_forward_windows(len(df), train_bars, test_bars, step_bars, anchored)
+    if not windows:
+        raise ValueError(f"データ（{len(df)} 本）が学習期間 + テスト期間（{train_bars + test_bars} 本）より短い")
+
+    # 指標に影響するパラメータの組み合わせ（key）ごとに、それを使うパラメータをまとめる
+    groups = {}
+    for params in parameter_grid(grid):
+        key = tuple(sorted((name, value) for name, value in params.items() if name in module.INDICATOR_PARAMS))
+        groups.setdefault(key, []).append({name: value for name, value in params.items()
+                                           if name not in module.INDICATOR_PARAMS})
+    frames = {key: module.add_indicators(df.copy(), module.BacktestConfig(**{**base, **dict(key)}))
+              for key in groups}
+    first = next(iter(frames.values()))
+    data = {"strategy": strategy, "base": base, "frames": frames, "objective": objective,
+            "close": first["c"].to_numpy(dtype=float), "times": first["datetime"].to_numpy(),
+            "interval": module.BacktestConfig(**base).interval}
+
+    train_tasks = [(key, combos, train_start, test_start)
+                   for train_start, test_start, _ in windows for key, combos in groups.items()]
+    executor = None
+    if max_workers != 1 and len(train_tasks) > 1:
+        max_workers = max_workers or os.cpu_count()
+        executor = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(data,))
+    else:
+        _init_worker(data)
+    try:
+        scores = _map(executor, _train_task, train_tasks, max_workers)
+        # fold ごとにすべての組み合わせの中から一番よいものを選ぶ（NaN は選ばない、同点は先のもの）
+        candidates = [(key, params) for key, combos in groups.items() for params in combos]
+        best = []
+        for i in range(len(windows)):
+            fold_scores = np.concatenate(scores[i * len(groups):(i + 1) * len(groups)])
+            index = int(np.argmax(np.where(np.isnan(fold_scores), -np.inf, fold_scores)))
+            best.append((candidates[index], fold_scores[index]))
+        test_tasks = [(key, params, test_start, test_end)
+                      for ((key, params), _), (_, test_start, test_end) in zip(best, windows)]
+        tests = _map(executor, _test_task, test_tasks, max_workers)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    times = data["times"]
+    rows, fold_trades = [], []
+    for i, (((key, params), score), (train_start, test_start, test_end), (trades, stats)) in enumerate(
+            zip(best, windows, tests)):
+        row = {"fold": i, "train_start": times[train_start], "test_start": times[test_start],
+               "test_end": times[test_end - 1], **dict(key), **params, f"train_{objective}": score}
+        row.update({f"test_{name}": stats[name] for name in FOLD_STATS})
+        rows.append(row)
+        if len(trades):
+            fold_trades.append(trades.assign(fold=i))
+    trades = pd.concat(fold_trades, ignore_index=True) if fold_trades else pd.DataFrame()
+
+    # テスト期間をつなげたアウトオブサンプルの成績（fold の間の使わない足はポジションなし）
+    start, end = windows[0][1], windows[-1][2]
+    positions = positions_from_trades(times[start:end], trades)
+    stats = summarize(data["close"][start:end], positions, closed_profits(trades), data["interval"])
+    return WalkForwardResult(pd.DataFrame(rows), trades, stats)
+
+
+def parse_param(text, module):
+    """
+    "name=v1,v2,..." をパラメータ名と値のリストにする（既定値が数値のパラメータは int / float にする）
+    """
+    name, sep, values = text.partition("=")
+    defaults = vars(module.BacktestConfig())
+    if not sep or name not in defaults:
+        raise ValueError(f"--param は name=v1,v2,... の形式で、name は BacktestConfig の引数です: {text}")
+    numeric = isinstance(defaults[name], (int, float))
+
+    def cast(value):
+        if not numeric:
+            return value
+        try:
+            return int(value)
+        except ValueError:
+            return float(value)
+
+    return name, [cast(value) for value in values.split(",") if value != ""]
+
+
+def print_walk_forward(result):
+    """walk_forward の結果を表示する"""
+    from analytics import print_summary
+
+    print(result.folds.to_string(index=False))
+    print("--- Out-of-sample ---")
+    print_summary(result.stats)
+
+
+def main(argv=None):
+    from fetch_candles import fetch_candles
+    from profiling import add_profile_arguments, profiler_from_args
+    from timeframes import interval_ms
+
+    parser = argparse.ArgumentParser(description="ウォークフォワード分析")
+    parser.add_argument("--strategy", choices=STRATEGIES, default="rsi_only_backtest")
+    parser.add_argument("--symbol", default="BTC")
+    parser.add_argument("--interval", default="15m")
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--train-days", type=float, default=30)
+    parser.add_argument("--test-days", type=float, default=7)
+    parser.add_argument("--step-days", type=float, default=None, help="省略時は --test-days")
+    parser.add_argument("--anchored", action="store_true", help="学習期間の始まりを先頭に固定する")
+    parser.add_argument("--objective", choices=OBJECTIVES, default="sharpe")
+    parser.add_argument("--param", action="append", default=[], metavar="NAME=V1,V2",
+                        help="グリッドサーチするパラメータ（複数指定可。省略時は戦略ごとの既定のグリッド）")
+    parser.add_argument("--workers", type=int, default=None, help="プロセス数（省略時は CPU 数）")
+    parser.add_argument("--report-dir", default="reports")
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+
+    module = importlib.import_module(args.strategy)
+    grid = dict(parse_param(text, module) for text in args.param) or None
+    bars_per_day = 86_400_000 / interval_ms(args.interval)
+
+    def to_bars(days):
+        return None if days is None else max(1, int(round(days * bars_per_day)))
+
+    # --profile 指定時のみプロファイリングを有効にする
+    profiler = profiler_from_args("walk_forward", args)
+
+    df = fetch_candles(args.symbol, args.interval, args.days)
+    if df is None:
+        raise Exception("Failed to fetch candle data.")
+
+    result = walk_forward(args.strategy, df, grid, {"symbol": args.symbol, "interval": args.interval},
+                          train_bars=to_bars(args.train_days), test_bars=to_bars(args.test_days),
+                          step_bars=to_bars(args.step_days), anchored=args.anchored,
+                          objective=args.objective, max_workers=args.workers)
+    print_walk_forward(result)
+
+    os.makedirs(args.report_dir, exist_ok=True)
+    path = os.path.join(args.report_dir, f"walk_forward_{args.strategy}_{args.symbol}_{args.interval}.csv")
+    result.folds.to_csv(path, index=False)
+    print("Report:", path)
+
+    if profiler is not None:
+        profiler.stop()
+
+
+if __name__ == "__main__":
+    main()